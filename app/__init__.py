@@ -1,8 +1,11 @@
 from flask import Flask
-from .routes import tagging, scans, run_scan, core, compare, my_network
+from .routes import tagging, scans, run_scan, core, compare, my_network, api, schedules
 import app.config as config
 from app.utils.db_utils import init_db
 from app.utils import custom_logging
+from app.utils.scan_jobs import start_dispatcher
+from app.utils.scan_schedules import start_scheduler
+from app.utils.host_risk import backfill_host_risk
 import os
 from app.utils.db_utils import init_db
 
@@ -10,6 +13,7 @@ def create_app():
     app = Flask(__name__)
 
     init_db()
+    backfill_host_risk()
 
     # Configuration
     app.config["SECRET_KEY"] = config.SECRET_KEY
@@ -23,6 +27,8 @@ def create_app():
     app.register_blueprint(tagging.bp)
     app.register_blueprint(run_scan.bp)
     app.register_blueprint(my_network.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(schedules.bp)
 
     # ✅ Add security headers to every response
     @app.after_request
@@ -38,6 +44,10 @@ def create_app():
         response.headers["X-Frame-Options"] = "DENY"
         response.headers["X-Content-Type-Options"] = "nosniff"
         response.headers["Referrer-Policy"] = "no-referrer"
+
+        # Versioned session views carry an ETag: let clients keep them but revalidate each time
+        if "ETag" in response.headers and "Cache-Control" not in response.headers:
+            response.headers["Cache-Control"] = "private, no-cache"
         return response
 
 
@@ -49,5 +59,11 @@ def create_app():
     else:
         print("✅ Using existing database.")
 
+    # Start this worker's scan job dispatcher (queued scans survive restarts)
+    if config.SCAN_DISPATCHER_ENABLED:
+        start_dispatcher()
+    if config.SCAN_SCHEDULER_ENABLED:
+        start_scheduler()
+
     return app
 
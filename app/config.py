@@ -10,12 +10,63 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 # Project root (nmap_dashboard/)
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))
 
-# Database path (used by db_utils and app)
-DB_PATH = os.path.join(PROJECT_ROOT, "nmap_results.db")
+# Database path (used by db_utils and app); NMAP_DB_PATH points benchmarks and tools at a scratch copy
+DB_PATH = os.environ.get("NMAP_DB_PATH", os.path.join(PROJECT_ROOT, "nmap_results.db"))
 
 # Upload folder for imported XML files
 UPLOAD_FOLDER = os.path.join(PROJECT_ROOT, "scans", "imports")
 
+# Cached PDF exports (served as static files once rendered)
+EXPORT_CACHE_DIR = os.path.join(PROJECT_ROOT, "scans", "exports")
+EXPORT_CACHE_MAX_MB = int(os.environ.get("EXPORT_CACHE_MAX_MB", "500"))
+PDF_EXPORT_WORKERS = int(os.environ.get("PDF_EXPORT_WORKERS", "2"))
+PDF_EXPORT_TIMEOUT = int(os.environ.get("PDF_EXPORT_TIMEOUT", "900"))  # seconds before a stuck job is retried
+
+# Scan job queue: concurrent nmap processes across all web workers
+SCAN_MAX_CONCURRENT = int(os.environ.get("SCAN_MAX_CONCURRENT", "2"))
+SCAN_DISPATCH_INTERVAL = float(os.environ.get("SCAN_DISPATCH_INTERVAL", "2"))
+SCAN_DISPATCHER_ENABLED = os.environ.get("SCAN_DISPATCHER_ENABLED", "1") == "1"
+SCAN_HEARTBEAT_TIMEOUT = float(os.environ.get("SCAN_HEARTBEAT_TIMEOUT", "60"))  # running job with no heartbeat = interrupted
+SCAN_RESUME_MAX = int(os.environ.get("SCAN_RESUME_MAX", "3"))  # resume attempts before an interrupted job fails
+
+# Recurring scan schedules: how often each worker checks for due schedules
+SCAN_SCHEDULER_INTERVAL = float(os.environ.get("SCAN_SCHEDULER_INTERVAL", "15"))
+SCAN_SCHEDULER_ENABLED = os.environ.get("SCAN_SCHEDULER_ENABLED", "1") == "1"
+
+# Scan presets (nmap args + resource limits); edited file is picked up without a restart
+SCAN_PRESETS_FILE = os.environ.get("SCAN_PRESETS_FILE", os.path.join(PROJECT_ROOT, "config", "scan_presets.json"))
+
+# Risk rules (extra score for conditions like "telnet on a gateway"); edited file is picked up without a restart
+RISK_RULES_FILE = os.environ.get("RISK_RULES_FILE", os.path.join(PROJECT_ROOT, "config", "risk_rules.json"))
+
+# Tag suggestion rules (IP suffix, port/service, MAC vendor and OS heuristics); edited file is picked up without a restart
+TAG_RULES_FILE = os.environ.get("TAG_RULES_FILE", os.path.join(PROJECT_ROOT, "config", "tag_rules.json"))
+
+# Learned tag suggestions: nearest already-tagged hosts by open ports/services ("jaccard" or "cosine")
+TAG_NEIGHBOR_METRIC = os.environ.get("TAG_NEIGHBOR_METRIC", "jaccard")
+TAG_NEIGHBOR_K = int(os.environ.get("TAG_NEIGHBOR_K", "5"))
+TAG_NEIGHBOR_MIN_CONFIDENCE = float(os.environ.get("TAG_NEIGHBOR_MIN_CONFIDENCE", "0.6"))  # used when no rule matches
+
+# IEEE OUI blocks (MAC prefix -> vendor) written by scripts/update_oui.py; fills vendors nmap did not report
+OUI_FILE = os.environ.get("OUI_FILE", os.path.join(PROJECT_ROOT, "config", "oui.tsv.gz"))
+
+# nmap executable (command line allowed); scripts/fake_nmap.py stands in for offline testing and benchmarks
+NMAP_BINARY = os.environ.get("NMAP_BINARY", "nmap")
+
+# Target for the dashboard scan buttons (nmap target spec: CIDRs, hosts or ranges, space separated)
+SCAN_TARGET = os.environ.get("SCAN_TARGET", "10.0.0.0/24")
+
+# Large targets are split into shards scanned by parallel nmap processes, then merged
+SCAN_SHARDS = int(os.environ.get("SCAN_SHARDS", str(min(4, os.cpu_count() or 1))))
+SCAN_SHARD_MIN_ADDRESSES = int(os.environ.get("SCAN_SHARD_MIN_ADDRESSES", "256"))  # smallest shard worth its own nmap
+
+# How often nmap prints Stats/Timing lines used for live progress and ETA
+NMAP_STATS_EVERY = os.environ.get("NMAP_STATS_EVERY", "5s")
+
+# Log viewer: default tail size and maximum page size (KB)
+LOG_VIEW_TAIL_KB = int(os.environ.get("LOG_VIEW_TAIL_KB", "256"))
+LOG_VIEW_MAX_KB = int(os.environ.get("LOG_VIEW_MAX_KB", "2048"))
+
 # Logs
 LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
 LOG_FILE = os.path.join(LOG_DIR, "nmap_dashboard.log")
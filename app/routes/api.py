@@ -0,0 +1,348 @@
+# app/routes/api.py
+# ---------------------
+#  Versioned JSON API for scan sessions, results and hosts
+# ---------------------
+
+from flask import Blueprint, request, jsonify
+from app.utils.db_utils import (
+    get_sessions_page, get_results_page, get_hosts_page, session_exists,
+    RESULT_API_FIELDS, HOST_API_FIELDS, RESULT_SORT_KEYS, HOST_SORT_KEYS
+)
+from app.utils.scan_jobs import list_jobs, get_job, queue_position
+from app.utils.scan_schedules import list_schedules
+from app.utils.scan_estimates import estimate_duration
+from app.utils.scanner_presets import get_presets, preset_status
+from app.utils.risk_rules import get_rule_engine, rule_status
+from app.utils.host_risk import get_host_risk_history, get_top_risers
+from app.utils.vuln_index import vuln_status
+from app.utils.tag_suggestions import tag_rule_status
+from app.utils.oui_vendors import oui_status, lookup_vendor
+from app.utils.tag_neighbors import get_neighbor_index
+from app.config import SCAN_TARGET
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class ApiError(Exception):
+    """Raised for bad request parameters; rendered as a JSON error body."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
+
+# ---------------------
+#  Query-string helpers
+# ---------------------
+def _int_arg(name, default=None, minimum=None, maximum=None):
+    """Read an optional integer query arg, rejecting junk instead of ignoring it."""
+    raw = request.args.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ApiError(f"'{name}' must be an integer")
+    if minimum is not None and value < minimum:
+        raise ApiError(f"'{name}' must be >= {minimum}")
+    if maximum is not None and value > maximum:
+        value = maximum
+    return value
+
+
+def _page_args():
+    """Return (limit, cursor) from the query string."""
+    limit = _int_arg("limit", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    return limit, request.args.get("cursor") or None
+
+
+def _fields_arg(allowed):
+    """Parse ?fields=a,b,c against a whitelist of column names."""
+    raw = request.args.get("fields")
+    if not raw:
+        return allowed
+    fields = tuple(f.strip() for f in raw.split(",") if f.strip())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or allowed
+
+
+def _sort_arg(allowed, default):
+    """Parse ?sort=field or ?sort=-field (descending)."""
+    raw = request.args.get("sort", default)
+    descending = raw.startswith("-")
+    key = raw.lstrip("-")
+    if key not in allowed:
+        raise ApiError(f"Cannot sort by '{key}'. Allowed: {', '.join(allowed)}")
+    return key, descending
+
+
+def _filter_args():
+    """Collect the server-side filters shared by /results and /hosts."""
+    return {
+        "ip": request.args.get("ip"),
+        "port": _int_arg("port", minimum=0),
+        "service": request.args.get("service"),
+        "state": request.args.get("state"),
+        "tag": request.args.get("tag"),
+        "min_risk": _int_arg("min_risk"),
+        "max_risk": _int_arg("max_risk"),
+    }
+
+
+def _page_response(items, next_cursor, **extra):
+    """Uniform envelope for paginated responses."""
+    return jsonify({**extra, "items": items, "count": len(items), "next_cursor": next_cursor})
+
+
+def _run_page(fetch, *args, **kwargs):
+    """Call a db_utils page function, mapping bad cursors to 400s."""
+    try:
+        return fetch(*args, **kwargs)
+    except ValueError as e:
+        raise ApiError(str(e))
+
+
+# ---------------------
+#  Sessions
+# ---------------------
+@bp.route("/sessions")
+def list_sessions():
+    """
+    List scan sessions newest first.
+    Query: scan_type, timestamp, limit, cursor
+    """
+    limit, cursor = _page_args()
+    items, next_cursor = _run_page(
+        get_sessions_page,
+        scan_type=request.args.get("scan_type"),
+        timestamp=request.args.get("timestamp"),
+        cursor=cursor,
+        limit=limit,
+    )
+    return _page_response(items, next_cursor)
+
+
+# ---------------------
+#  Session Results (one row per host/port)
+# ---------------------
+@bp.route("/sessions/<int:session_id>/results")
+def session_results(session_id):
+    """
+    Page through scan results for a session.
+    Query: ip, port, service, state, tag, min_risk, max_risk,
+           fields, sort (id|ip|port|risk_score, prefix '-' for desc), limit, cursor
+    """
+    if not session_exists(session_id):
+        raise ApiError(f"Session {session_id} not found", 404)
+
+    limit, cursor = _page_args()
+    sort, descending = _sort_arg(RESULT_SORT_KEYS, "id")
+    items, next_cursor = _run_page(
+        get_results_page,
+        session_id,
+        filters=_filter_args(),
+        fields=_fields_arg(RESULT_API_FIELDS),
+        sort=sort,
+        descending=descending,
+        cursor=cursor,
+        limit=limit,
+    )
+    return _page_response(items, next_cursor, session_id=session_id)
+
+
+# ---------------------
+#  Session Hosts (aggregated per IP)
+# ---------------------
+@bp.route("/sessions/<int:session_id>/hosts")
+def session_hosts(session_id):
+    """
+    Page through per-host aggregates for a session.
+    Query: ip, port, service, tag, min_risk, max_risk,
+           fields, sort (ip|total_risk|open_ports, prefix '-' for desc), limit, cursor
+    """
+    if not session_exists(session_id):
+        raise ApiError(f"Session {session_id} not found", 404)
+
+    limit, cursor = _page_args()
+    sort, descending = _sort_arg(HOST_SORT_KEYS, "ip")
+    items, next_cursor = _run_page(
+        get_hosts_page,
+        session_id,
+        filters=_filter_args(),
+        fields=_fields_arg(HOST_API_FIELDS),
+        sort=sort,
+        descending=descending,
+        cursor=cursor,
+        limit=limit,
+    )
+    return _page_response(items, next_cursor, session_id=session_id)
+
+
+# ---------------------
+#  Scan jobs
+# ---------------------
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+
+@bp.route("/jobs")
+def jobs():
+    """Recent scan jobs, newest first. Optional ?status=queued,running filter."""
+    statuses = [s for s in (request.args.get("status") or "").split(",") if s]
+    unknown = [s for s in statuses if s not in JOB_STATUSES]
+    if unknown:
+        raise ApiError(f"Unknown status: {', '.join(unknown)}")
+    limit = _int_arg("limit", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    items = list_jobs(limit=limit, statuses=statuses or None)
+    return jsonify({"items": items, "count": len(items)})
+
+
+@bp.route("/jobs/<int:job_id>")
+def job(job_id):
+    item = get_job(job_id)
+    if item is None:
+        raise ApiError(f"Job {job_id} not found", status=404)
+    return jsonify({**item, "queue_position": queue_position(job_id)})
+
+
+# ---------------------
+#  Scan schedules
+# ---------------------
+@bp.route("/schedules")
+def schedules():
+    """Schedules with run latency stats (seconds late vs. due time, recent skips)."""
+    items = list_schedules()
+    return jsonify({"items": items, "count": len(items)})
+
+
+# ---------------------
+#  Duration estimates
+# ---------------------
+@bp.route("/estimates")
+def estimates():
+    """Expected scan duration per preset (?category=...&target=...; defaults: all presets, SCAN_TARGET)."""
+    target = request.args.get("target") or SCAN_TARGET
+    category = request.args.get("category")
+    presets = get_presets()
+    if category and category not in presets:
+        raise ApiError(f"Unknown scan category: {category}")
+    categories = [category] if category else list(presets)
+    return jsonify({"target": target, "items": {name: estimate_duration(name, target) for name in categories}})
+
+
+# ---------------------
+#  Scan presets
+# ---------------------
+@bp.route("/presets")
+def presets():
+    """Loaded scan presets with their resource limits, plus the preset file's load status."""
+    return jsonify({"status": preset_status(), "items": get_presets()})
+
+
+# ---------------------
+#  Risk rules
+# ---------------------
+@bp.route("/risk_rules")
+def risk_rules():
+    """Loaded risk rules, the rule file's load status and rule evaluation timing (per row)."""
+    engine = get_rule_engine()
+    items = [
+        {"id": rule.id, "description": rule.description, "score": rule.score}
+        for rule in engine.rules
+    ]
+    return jsonify({"status": rule_status(), "items": items})
+
+
+# ---------------------
+#  Tag rules
+# ---------------------
+@bp.route("/tag_rules")
+def tag_rules():
+    """The tag suggestion rule file's load status and rule count."""
+    return jsonify({"status": tag_rule_status()})
+
+
+# ---------------------
+#  Vulnerability index
+# ---------------------
+@bp.route("/vuln_index")
+def vuln_index():
+    """Imported NVD feeds, CVE/range counts and CVE lookup timing (per lookup)."""
+    return jsonify({"status": vuln_status()})
+
+
+# ---------------------
+#  MAC vendors (OUI)
+# ---------------------
+@bp.route("/oui")
+def oui():
+    """OUI file load status and block counts. Query: mac (look up one address)"""
+    body = {"status": oui_status()}
+    mac = request.args.get("mac")
+    if mac is not None:
+        body["mac"], body["vendor"] = mac, lookup_vendor(mac)
+    return jsonify(body)
+
+
+# ---------------------
+#  Learned tag suggestions
+# ---------------------
+@bp.route("/hosts/<ip>/tag_suggestions")
+def host_tag_suggestions(ip):
+    """
+    Device/service tags of the nearest already-tagged hosts, with confidence and the neighbours used.
+    Query: session_id (default: the host's latest scan)
+    """
+    session_id = _int_arg("session_id", minimum=1)
+    if session_id is None:
+        latest = get_host_risk_history(ip, limit=1)
+        if not latest:
+            raise ApiError(f"No scans of {ip}", 404)
+        session_id = latest[0]["session_id"]
+    elif not session_exists(session_id):
+        raise ApiError(f"Session {session_id} not found", 404)
+
+    index = get_neighbor_index()
+    learned = index.suggest_session(session_id, ips={ip}).get(ip)
+    if learned is None:
+        learned = {"device": "", "device_confidence": 0.0, "service": "", "service_confidence": 0.0, "neighbors": []}
+    neighbors = [{"ip": neighbor, "similarity": similarity} for neighbor, similarity in learned.pop("neighbors")]
+    return jsonify({"ip": ip, "session_id": session_id, **learned, "neighbors": neighbors, "index": index.stats()})
+
+
+# ---------------------
+#  Host risk history
+# ---------------------
+@bp.route("/hosts/<ip>/risk_history")
+def host_risk_history(ip):
+    """Total risk of one host in each session that saw it, oldest first. Query: limit (most recent N)"""
+    limit = _int_arg("limit", minimum=1, maximum=MAX_PAGE_SIZE)
+    items = get_host_risk_history(ip, limit=limit)
+    if not items:
+        raise ApiError(f"No risk history for {ip}", 404)
+    return jsonify({"ip": ip, "items": items, "count": len(items)})
+
+
+@bp.route("/risk/top_risers")
+def top_risers():
+    """
+    Hosts whose risk grew most since their previous scan (each host's latest scan).
+    Query: limit, min_delta (default 1), session_id (rank one session's hosts instead)
+    """
+    limit = _int_arg("limit", 20, minimum=1, maximum=MAX_PAGE_SIZE)
+    min_delta = _int_arg("min_delta", 1)
+    session_id = _int_arg("session_id", minimum=1)
+    if session_id is not None and not session_exists(session_id):
+        raise ApiError(f"Session {session_id} not found", 404)
+    items = get_top_risers(limit=limit, min_delta=min_delta, session_id=session_id)
+    return jsonify({"items": items, "count": len(items)})
@@ -3,9 +3,10 @@
 # Handles scan comparison routes
 # ---------------------
 
-from flask import Blueprint, request, render_template, flash, redirect, url_for
+from flask import Blueprint, request, render_template, flash, redirect, url_for, make_response
 from app.utils.db_utils import get_scan_summaries, get_session_info, compute_diff
 from app.utils.db_utils import get_detailed_port_info
+from app.utils.http_cache import session_validators, is_not_modified, not_modified_response, apply_validators
 
 #  Define a Flask Blueprint for scan comparison
 bp = Blueprint("compare", __name__)
@@ -47,6 +48,11 @@ def compare_view():
         flash("⚠️ Please select two different scans for comparison.", "warning")
         return redirect(url_for("compare.compare_form"))
 
+    #  Serve 304 if neither session changed since the client's copy
+    validators = session_validators(old_id, new_id)
+    if is_not_modified(validators):
+        return not_modified_response(validators)
+
     try:
         #  Compute the diff between scans
         diff = compute_diff(old_id, new_id)
@@ -56,7 +62,7 @@ def compare_view():
         new_info = get_session_info(new_id)
 
         #  Render comparison template with all data
-        return render_template(
+        rendered = render_template(
             "compare.html",
             old_id=old_id,
             new_id=new_id,
@@ -64,6 +70,7 @@ def compare_view():
             new_info=new_info,
             diff=diff,
         )
+        return apply_validators(make_response(rendered), validators)
 
     except Exception as e:
         # ❌ Error during comparison process
@@ -5,8 +5,11 @@
 
 from flask import Blueprint, render_template, request, redirect, flash, session, url_for
 from werkzeug.utils import secure_filename
-from app.utils.db_utils import get_scan_summaries, delete_orphaned_results
-from app.utils.scanner_presets import SCAN_CATEGORIES
+from app.utils.db_utils import get_scan_summaries, delete_orphaned_results, bump_session_versions
+from app.utils.host_risk import record_session_risk, drop_session_risk
+from app.utils.scanner_presets import get_presets, preset_status
+from app.utils.scan_estimates import estimate_all
+from app.config import DB_PATH, SCAN_TARGET
 import sys
 import os, sqlite3, subprocess
 from datetime import datetime
@@ -31,8 +34,16 @@ def index():
     #  Get filtered or all scan summaries
     scans = get_scan_summaries(scan_type=scan_type, timestamp=timestamp)
 
+    #  Expected duration of each preset on the scan target, from past runs
+    presets = get_presets()
+    estimates = estimate_all(presets, SCAN_TARGET)
+    status = preset_status()
+
     #  Render main dashboard view
-    return render_template("index.html", scans=scans, scan_categories=SCAN_CATEGORIES)
+    return render_template(
+        "index.html", scans=scans, scan_categories=presets, estimates=estimates, scan_target=SCAN_TARGET,
+        preset_error=status["error"], preset_builtin=status["builtin"]
+    )
 
 
 # ---------------------
@@ -43,20 +54,27 @@ def delete_scan(session_id):
     """
     Delete a scan session and store it in session for undo capability.
     """
-    conn = sqlite3.connect("nmap_results.db")
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     #  Save session and results before deletion
     cursor.execute("SELECT timestamp, scan_type, xml_path, log_path FROM scan_sessions WHERE id = ?", (session_id,))
     session_data = cursor.fetchone()
 
-    cursor.execute("SELECT * FROM scan_results WHERE session_id = ?", (session_id,))
+    cursor.execute("""
+        SELECT session_id, ip, hostname, mac_addr, vendor,
+               protocol, port, state, service, product,
+               version, os, cpe, uptime, last_boot, script, risk_score, risk_version,
+               service_cpe, cve_ids, vuln_score
+        FROM scan_results WHERE session_id = ?
+    """, (session_id,))
     results_data = cursor.fetchall()
 
     #  Store deleted data in Flask session for undo
     session["last_deleted"] = {"session": session_data, "results": results_data}
 
-    #  Delete from database
+    #  Delete from database (missing sessions never get cache validators)
+    drop_session_risk(cursor, session_id)
     cursor.execute("DELETE FROM scan_sessions WHERE id = ?", (session_id,))
     conn.commit()
     conn.close()
@@ -79,25 +97,28 @@ def undo_delete():
         return redirect(url_for("core.index"))
 
     try:
-        conn = sqlite3.connect("nmap_results.db")
+        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
 
-        #  Re-insert session info
+        #  Re-insert session info (fresh updated_at so no stale cached copy can match)
         cursor.execute("""
-            INSERT INTO scan_sessions (timestamp, scan_type, xml_path, log_path)
-            VALUES (?, ?, ?, ?)
-        """, deleted["session"])
+            INSERT INTO scan_sessions (timestamp, scan_type, xml_path, log_path, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, tuple(deleted["session"]) + (datetime.now().isoformat(timespec="seconds"),))
         new_session_id = cursor.lastrowid
+        bump_session_versions(cursor, session_id=new_session_id)
 
         #  Re-insert results under new session_id
-        updated_results = [(new_session_id,) + row[2:] for row in deleted["results"]]
+        updated_results = [(new_session_id,) + tuple(row[1:]) for row in deleted["results"]]
         cursor.executemany("""
             INSERT INTO scan_results (
                 session_id, ip, hostname, mac_addr, vendor,
                 protocol, port, state, service, product,
-                version, os, cpe, uptime, last_boot, script, risk_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                version, os, cpe, uptime, last_boot, script, risk_score, risk_version,
+                service_cpe, cve_ids, vuln_score
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, updated_results)
+        record_session_risk(cursor, new_session_id)
 
         conn.commit()
         conn.close()
@@ -206,8 +227,7 @@ def upload_xml():
         return redirect(url_for("core.index"))
 
     #  Track upload in uploads table
-    db_path = os.path.join(base_dir, "nmap_results.db")
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
         "INSERT INTO uploads (filename, upload_time, session_id) VALUES (?, ?, ?)",
@@ -5,6 +5,7 @@
 
 from flask import Blueprint, render_template, request, redirect, flash, url_for
 from app.config import DB_PATH
+from app.utils.db_utils import bump_session_versions
 import sqlite3
 import logging
 import ipaddress
@@ -74,6 +75,10 @@ def my_network():
                 VALUES (?, ?, ?, ?)
             """, inserts)
 
+        #  Trusted status is shown on every scan detail page
+        if updates or inserts:
+            bump_session_versions(cursor)
+
         conn.commit()
         conn.close()
 
@@ -117,8 +122,10 @@ def delete_device():
         conn.close()
         return "No valid identifier", 400
 
-    conn.commit()
     deleted_count = cursor.rowcount
+    if deleted_count:
+        bump_session_versions(cursor)
+    conn.commit()
     conn.close()
 
     if deleted_count == 0:
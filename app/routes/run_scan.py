@@ -3,149 +3,122 @@
 #  Scan execution and real-time progress streaming
 # ---------------------
 
-from flask import Blueprint, request, redirect, flash, url_for, jsonify, Response
-from app.utils.scanner_presets import SCAN_CATEGORIES  
-from app.utils.parse2_nmap import parse_and_insert     
-
-import os
-import time
+from flask import Blueprint, request, redirect, flash, url_for, jsonify, Response, render_template
+from app.utils.scanner_presets import get_presets
+from app.utils.scan_progress import get_watcher, is_valid_log_name
+from app.utils.scan_jobs import enqueue_job, cancel_job, list_jobs, queue_position
+from app.utils.scan_estimates import format_duration
+from app.config import SCAN_MAX_CONCURRENT, SCAN_TARGET
+
+import json
+import queue
 import logging
-import subprocess
-import shutil
-from threading import Thread
-from datetime import datetime
-import xml.etree.ElementTree as ET
 
 bp = Blueprint("run_scan", __name__)  # 📍 Blueprint for routing scan-related endpoints
 
 
 # ---------------------
-#  Run Scan (Background Thread)
+#  Run Scan (Queued Job)
 # ---------------------
 @bp.route("/run_scan", methods=["POST"])
 def run_scan():
     """
-    Starts a background scan using selected category's Nmap arguments.
-    Returns log filename for real-time progress tracking.
+    Queues a scan using selected category's Nmap arguments.
+    The dispatcher starts it as soon as a scan slot is free.
+    Returns log filename for real-time progress tracking and the job id.
     """
 
     #  Fetch scan category and set scan target range
     category = request.form.get("category")
-    target = "10.0.0.0/24"
+    target = SCAN_TARGET
 
-    logging.info("Scan started for category: %s", category)
+    logging.info("Scan requested for category: %s", category)
 
     #  Invalid category guard
-    if category not in SCAN_CATEGORIES:
+    if category not in get_presets():
         flash("❌ Unknown scan category selected.", "danger")
         return redirect(url_for("core.index"))
 
-    #  Generate unique output filenames based on timestamp
-    timestamp = datetime.now().isoformat(timespec="microseconds").replace(":", "-").replace(".", "-")
-    output_dir = "scans"
-    os.makedirs(output_dir, exist_ok=True)
+    try:
+        priority = int(request.form.get("priority", 0))
+    except ValueError:
+        priority = 0
 
-    #  Output XML and log paths (temporary & final)
-    xml_filename = f"scan_{category.replace(' ', '_')}_{timestamp}.xml"
-    tmp_xml_path = os.path.join(output_dir, xml_filename + ".tmp")
-    final_xml_path = os.path.join(output_dir, xml_filename)
+    try:
+        job = enqueue_job(category, target, priority=priority)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    log_filename = f"log_{category.replace(' ', '_')}_{timestamp}.txt"
-    log_path = os.path.join(output_dir, log_filename)
+    #  Return log filename to frontend for progress tracking
+    return jsonify({
+        "log": job["log_name"],
+        "job_id": job["id"],
+        "queue_position": queue_position(job["id"]),
+        "estimated_seconds": job["estimated_seconds"]
+    })
 
-    # ---------------------
-    #  Background scan logic
-    # ---------------------
-    def background_scan():
-        try:
-            with open(log_path, "w") as log_file:
-                #  Construct full Nmap command  no sudo for DOCKER sudo for Else
-                #full_cmd = ["sudo", "nmap"] + SCAN_CATEGORIES[category]["nmap_args"] + [
-                full_cmd = ["nmap"] + SCAN_CATEGORIES[category]["nmap_args"] + [
-                    "-oX", tmp_xml_path, target
-                ]
-                logging.info("Running command: %s", " ".join(full_cmd))
-
-                #  Start subprocess and write stdout to log
-                process = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                for line in process.stdout:
-                    log_file.write(line)
-                    log_file.flush()
-                process.wait()
-
-            time.sleep(1)  # 🧹 Allow disk I/O to catch up
-
-            # ✅ Validate XML before renaming
-            try:
-                ET.parse(tmp_xml_path)  # If XML is invalid, raise exception
-            except ET.ParseError as e:
-                corrupt_path = tmp_xml_path + ".corrupt"
-                shutil.copy(tmp_xml_path, corrupt_path)
-                with open(log_path, "a") as log_file:
-                    log_file.write(f"[FATAL] XML parse error: {e}. Copied to {corrupt_path}\n")
-                return
-
-            #  Rename temp XML to final name
-            os.rename(tmp_xml_path, final_xml_path)
-
-            #  Parse results and insert into database
-            parse_and_insert(final_xml_path, log_path)
-
-        except Exception as e:
-            #  Handle unexpected errors
-            with open(log_path, "a") as log_file:
-                log_file.write(f"[ERROR] {str(e)}\n")
-
-    #  Run scan in background thread (non-blocking)
-    Thread(target=background_scan).start()
 
-    #  Return log filename to frontend for progress tracking
-    return jsonify({"log": log_filename})
+# ---------------------
+#  Scan Jobs
+# ---------------------
+@bp.route("/jobs")
+def jobs():
+    """Lists queued, running and recent scan jobs."""
+    jobs = list_jobs()
+    for job in jobs:
+        job["estimate_label"] = format_duration(job["estimated_seconds"]) if job["estimated_seconds"] else None
+    return render_template("jobs.html", jobs=jobs, max_concurrent=SCAN_MAX_CONCURRENT)
+
+
+@bp.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel(job_id):
+    """Cancels a queued job or stops a running scan."""
+    if cancel_job(job_id):
+        flash(f"🛑 Scan job #{job_id} cancelled.", "success")
+    else:
+        flash(f"⚠️ Scan job #{job_id} is not queued or running.", "warning")
+    return redirect(url_for("run_scan.jobs"))
 
 
 # ---------------------
 #  Real-Time Scan Progress
 # ---------------------
+SSE_KEEPALIVE = 15  # seconds between keepalive comments (detects closed clients)
+
+
 @bp.route("/scan_progress/<logfile>")
 def scan_progress(logfile):
     """
-    Streams real-time progress percent based on log file contents.
-    Frontend consumes this via Server-Sent Events (SSE).
+    Streams real-time progress for a scan via Server-Sent Events (SSE).
+    Each message is JSON: percent, phase, phase_percent, eta_seconds,
+    elapsed_seconds, hosts_completed, hosts_up, hosts_undergoing.
+    All clients watching the same scan share one watcher, which is fed
+    directly by the scan's nmap output (or one log follower per process).
     """
+    if not is_valid_log_name(logfile):
+        return "Invalid log file", 400
+
+    watcher = get_watcher(logfile)
 
     def stream():
-        log_path = os.path.join("scans", logfile)
-        last_pos = 0
-        percent = 0
-
-        #  Defined Nmap progress stages & their estimated percentages
-        stages = [
-            ("Initiating Ping Scan", 10),
-            ("Completed Ping Scan", 20),
-            ("Initiating SYN Stealth Scan", 30),
-            ("Completed SYN Stealth Scan", 40),
-            ("Initiating Service scan", 60),
-            ("Completed Service scan", 80),
-            ("OS detection", 90),
-            ("Nmap done", 100),
-        ]
-
-        #  Monitor the log file for known stage markers
-        while percent < 100:
-            try:
-                if os.path.exists(log_path):
-                    with open(log_path, "r") as f:
-                        f.seek(last_pos)
-                        lines = f.read()
-                        last_pos = f.tell()
-
-                        for marker, stage_percent in stages:
-                            if marker in lines and stage_percent > percent:
-                                percent = stage_percent
-                                yield f"data: {percent}\n\n"
-                time.sleep(1)
-            except GeneratorExit:
-                break  #  Exit gracefully if client disconnects
+        events = watcher.subscribe()
+        try:
+            while True:
+                try:
+                    kind, value = events.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if kind == "failed":
+                    yield f"event: failed\ndata: {value}\n\n"
+                    break
+                yield f"data: {json.dumps(value)}\n\n"
+                if kind == "done":
+                    break
+        except GeneratorExit:
+            pass  #  Client disconnected
+        finally:
+            watcher.unsubscribe(events)
 
     return Response(stream(), content_type="text/event-stream")
-
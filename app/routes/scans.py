@@ -3,22 +3,30 @@
 #  View, tag, export, and analyze individual scan sessions
 # ---------------------
 
-from flask import Blueprint, render_template, request, redirect, flash, url_for, Response, make_response, jsonify
+from flask import (
+    Blueprint, render_template, request, redirect, flash, url_for, Response, make_response,
+    jsonify, send_file, current_app, stream_with_context
+)
 from app.utils.db_utils import (
-    get_scan_details, get_scan_summary, compute_diff, get_tags, set_tag,
-    get_scan_summaries, get_hosts_and_ports
+    get_scan_details, get_scan_summary, compute_diff, get_tags, set_tag, set_tags_bulk,
+    get_scan_summaries, get_hosts_and_ports, session_exists, iter_export_rows, EXPORT_COLUMNS
 )
-from app.utils.risk_utils import compute_host_risk_and_reasons, compute_row_risk_score
-from weasyprint import HTML, logger as weasy_logger
-from app.config import DB_PATH
-from app.utils.tag_suggestions import suggest_tags
+from app.utils.risk_utils import get_session_risk, compute_row_risk_score
+from app.utils.host_risk import get_top_risers
+from app.utils.risk_rescore import rescore_hosts
+from app.config import DB_PATH, LOG_VIEW_TAIL_KB, LOG_VIEW_MAX_KB
+from app.utils.tag_suggestions import suggest_tags, get_tag_suggester
+from app.utils.tag_neighbors import get_neighbor_index, fill_suggestions
 from app.utils.custom_logging import export_logger
+from app.utils.pdf_exports import start_export, get_export_status, touch
+from app.utils.http_cache import session_validators, is_not_modified, not_modified_response, apply_validators
 import sqlite3
 import csv
+import json
 import os
 import logging
 from logging.handlers import RotatingFileHandler
-from io import StringIO
+from io import StringIO, BytesIO
 from datetime import datetime 
 
 bp = Blueprint("scans", __name__)
@@ -31,6 +39,11 @@ def scan_detail(session_id):
     """
     Show detailed results of a scan session, with optional filters and tag analysis.
     """
+    # Skip all work if the client's copy is still current
+    validators = session_validators(session_id)
+    if is_not_modified(validators):
+        return not_modified_response(validators)
+
     # GET filters
     ip_filter = request.args.get("ip")
     port_filter = request.args.get("port")
@@ -45,38 +58,12 @@ def scan_detail(session_id):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    # Fetch highest risk host
-    cursor.execute("""
-        SELECT ip, SUM(risk_score) as total_risk
-        FROM scan_results
-        WHERE session_id = ?
-        GROUP BY ip
-        ORDER BY total_risk DESC
-        LIMIT 1
-    """, (session_id,))
-    row = cursor.fetchone()
-    highest_ip, highest_score = row if row else (None, None)
+    # Per-host risk totals and top factors (reason strings are built only for displayed hosts)
+    session_risk = get_session_risk(session_id, cursor=cursor)
+    highest_ip, highest_score = session_risk.highest()
 
-    # Per-host risk scores
-    cursor.execute("""
-        SELECT ip, SUM(risk_score)
-        FROM scan_results
-        WHERE session_id = ?
-        GROUP BY ip
-    """, (session_id,))
-    risk_by_host = dict(cursor.fetchall())
-
-    # Risk breakdown
-    cursor.execute("""
-        SELECT ip, port, service, risk_score
-        FROM scan_results
-        WHERE session_id = ? AND state = 'open'
-    """, (session_id,))
-    rows = cursor.fetchall()
-    risk_reasons_by_host = {}
-    for ip, port, service, score in rows:
-        reason = f"Port {port}, Service '{service}', Score: {score}"
-        risk_reasons_by_host.setdefault(ip, []).append(reason)
+    # Hosts whose risk grew most since their previous scan
+    risers = get_top_risers(limit=10, session_id=session_id)
 
     # Load global tags
     cursor.execute("SELECT ip, device_tag, service_tag FROM global_tags")
@@ -105,6 +92,7 @@ def scan_detail(session_id):
 
 
     # Tag aggregation
+    suggester = get_tag_suggester()
     tags = {}
     all_device_tags = set()
     all_service_tags = set()
@@ -112,7 +100,7 @@ def scan_detail(session_id):
         ip, _, port, _, service, _, _, os_match, *_rest, risk_score = row
         mac_vendor = row[11]
         global_tag = global_tags.get(ip, {"device": "", "service": ""})
-        suggested_device, suggested_service = suggest_tags(ip, port, service, mac_vendor, os_match)
+        suggested_device, suggested_service = suggest_tags(ip, port, service, mac_vendor, os_match, suggester=suggester)
 
         tags[ip] = {
             "global": global_tag,
@@ -127,6 +115,14 @@ def scan_detail(session_id):
         if global_tag["service"]:
             all_service_tags.add(global_tag["service"])
 
+    # Hosts no rule matched: tags of the nearest already-tagged hosts, when confident enough
+    learned = get_neighbor_index(cursor).suggest_session(session_id, ips=tags, cursor=cursor)
+    suggested = {ip: (tag["suggested"]["device"], tag["suggested"]["service"]) for ip, tag in tags.items()}
+    fill_suggestions(suggested, learned)
+    for ip, (device, service) in suggested.items():
+        tags[ip]["suggested"] = {"device": device, "service": service}
+        tags[ip]["learned"] = learned.get(ip)
+
     # Filter by tags
     if device_tag_filter or service_tag_filter:
         filtered_details = []
@@ -157,7 +153,7 @@ def scan_detail(session_id):
         port_counts[port] = port_counts.get(port, 0) + 1
         service_counts[service] = service_counts.get(service, 0) + 1
 
-    return render_template("scan_detail.html",
+    rendered = render_template("scan_detail.html",
         session_id=session_id,
         timestamp=timestamp,
         scan_type=scan_type,
@@ -170,10 +166,11 @@ def scan_detail(session_id):
             "device_tag": request.args.get("device_tag", ""),
             "service_tag": request.args.get("service_tag", "")
         },
-        risk_by_host=risk_by_host,
-        risk_reasons_by_host=risk_reasons_by_host,
+        session_risk=session_risk,
         highest_ip=highest_ip,
         highest_score=highest_score,
+        riser_labels=[r["ip"] for r in risers],
+        riser_deltas=[r["risk_delta"] for r in risers],
         tags=tags,
         port_labels=[str(p) for p in port_counts.keys()],
         port_counts=list(port_counts.values()),
@@ -183,6 +180,7 @@ def scan_detail(session_id):
         all_service_tags=sorted(all_service_tags),
         trusted_status=status_by_ip_mac
     )
+    return apply_validators(make_response(rendered), validators)
 
 # ---------------------
 # Apply Suggested Tags
@@ -207,10 +205,15 @@ def apply_suggested_tags(session_id):
         mac = row[0] if row else ""
         conn.close()
 
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
     if suggested_device:
-        set_tag(session_id, ip, mac, "device", suggested_device)
+        set_tag(session_id, ip, mac, "device", suggested_device, cursor)
+        rescore_hosts(cursor, [ip])  # Risk rules may match on the device tag
     if suggested_service:
-        set_tag(session_id, ip, mac, "service", suggested_service)
+        set_tag(session_id, ip, mac, "service", suggested_service, cursor)
+    conn.commit()
+    conn.close()
 
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify({
@@ -225,6 +228,73 @@ def apply_suggested_tags(session_id):
     flash(f"Tags updated for {ip} ({mac})", "success")
     return redirect(url_for("scans.scan_detail", session_id=session_id))
 
+@bp.route("/apply_suggested_tags/<int:session_id>/all", methods=["POST"])
+def apply_all_suggested_tags(session_id):
+    """
+    Apply the suggested tags of every host in a session, as if "Copy Suggested"
+    was clicked on each row of the scan detail page under the same filters
+    (ip, port, service, device_tag, service_tag form fields). Suggestions equal
+    to a host's current tags are skipped. One transaction for all hosts.
+    """
+    ip_filter = request.form.get("ip")
+    port_filter = request.form.get("port")
+    service_filter = request.form.get("service")
+    device_tag_filter = request.form.get("device_tag", "").lower()
+    service_tag_filter = request.form.get("service_tag", "").lower()
+
+    # Same rows and per-host suggestion (last row by port, learned tags filling gaps) as the scan detail page
+    suggester = get_tag_suggester()
+    suggested = {}
+    for row in get_scan_details(session_id, ip_filter, port_filter, service_filter):
+        ip, _, port, _, service, _, _, os_match = row[:8]
+        suggested[ip] = suggest_tags(ip, port, service, row[11], os_match, suggester=suggester)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    fill_suggestions(suggested, get_neighbor_index(cursor).suggest_session(session_id, ips=suggested, cursor=cursor))
+    cursor.execute("SELECT ip, device_tag, service_tag FROM global_tags")
+    global_tags = {row[0]: (row[1] or "", row[2] or "") for row in cursor.fetchall()}
+
+    # Latest MAC seen per IP in this session
+    cursor.execute("""
+        SELECT ip, mac_addr FROM scan_results
+        WHERE session_id = ? AND mac_addr IS NOT NULL AND mac_addr != ''
+        ORDER BY id
+    """, (session_id,))
+    macs = dict(cursor.fetchall())
+
+    items, skipped = [], 0
+    for ip, (device, service) in suggested.items():
+        global_device, global_service = global_tags.get(ip, ("", ""))
+        if device_tag_filter not in global_device.lower() or service_tag_filter not in global_service.lower():
+            continue
+        device = device if device != global_device else ""
+        service = service if service != global_service else ""
+        if not device and not service:
+            skipped += 1
+            continue
+        items.append((ip, macs.get(ip, ""), device, service))
+
+    device_count, service_count = set_tags_bulk(session_id, items, cursor)
+    rescore_hosts(cursor, [ip for ip, _mac, device, _service in items if device])
+    conn.commit()
+    conn.close()
+
+    message = f"Suggested tags applied to {len(items)} hosts ({skipped} skipped: no new suggestion)"
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify({
+            "success": True,
+            "applied": len(items),
+            "skipped": skipped,
+            "device_tags": device_count,
+            "service_tags": service_count,
+            "message": message
+        })
+
+    flash(message, "success")
+    filters = {key: request.form.get(key) for key in ("ip", "port", "service", "device_tag", "service_tag")}
+    return redirect(url_for("scans.scan_detail", session_id=session_id, **{k: v for k, v in filters.items() if v}))
+
 # ---------------------
 #  Update Tags
 # ---------------------
@@ -256,10 +326,15 @@ def set_tags_route(session_id):
         mac = row[0] if row else ""
         conn.close()
 
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
     if device_tag:
-        set_tag(session_id, ip, mac, "device", device_tag)
+        set_tag(session_id, ip, mac, "device", device_tag, cursor)
+        rescore_hosts(cursor, [ip])  # Risk rules may match on the device tag
     if service_tag:
-        set_tag(session_id, ip, mac, "service", service_tag)
+        set_tag(session_id, ip, mac, "service", service_tag, cursor)
+    conn.commit()
+    conn.close()
 
     flash(f"Tags updated for {ip} ({mac or 'N/A'})", "success")
     return redirect(url_for("scans.scan_detail", session_id=session_id))
@@ -270,89 +345,262 @@ def set_tags_route(session_id):
 # ---------------------
 @bp.route("/export/<int:session_id>.pdf")
 def export_pdf(session_id):
-    export_logger.info(f"Starting export for session {session_id}")
+    """
+    Download the session's PDF report.
+    Served straight from the export cache when ready; otherwise a background
+    render is started and a status page polls until the file is available.
+    """
+    validators = session_validators(session_id)
+    if is_not_modified(validators):
+        return not_modified_response(validators)
 
-    try:
-        #  Get current timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        filename_ts = datetime.now().strftime("%Y%m%d-%H%M")
+    status = start_export(current_app._get_current_object(), session_id)
+
+    if status["state"] == "not_found":
+        flash("Scan session not found.", "danger")
+        return redirect(url_for("core.index"))
 
-        #  Query scan result rows with global tags and risk score
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT 
-                    r.ip, r.hostname, r.mac_addr, r.vendor, r.protocol, r.port,
-                    r.state, r.service, r.product, r.version, r.os, r.cpe,
-                    r.uptime, r.last_boot, r.script,
-                    COALESCE(gt.device_tag, '') AS device_tag,
-                    COALESCE(gt.service_tag, '') AS service_tag,
-                    COALESCE(r.risk_score, 0) as risk_score
-                FROM scan_results r
-                LEFT JOIN global_tags gt ON r.ip = gt.ip
-                WHERE r.session_id = ?
-                ORDER BY r.ip, r.port
-            """, (session_id,))
-            rows = cursor.fetchall()
-
-        export_logger.info(f"Retrieved {len(rows)} rows for session {session_id}")
-
-        #  Render HTML with timestamp for PDF
-        rendered = render_template(
-            "export_pdf.html",
-            session_id=session_id,
-            rows=rows,
-            datetime_now=timestamp
+    if status["state"] == "ready":
+        touch(status["path"])
+        filename_ts = datetime.now().strftime("%Y%m%d-%H%M")
+        response = send_file(
+            status["path"],
+            mimetype="application/pdf",
+            as_attachment=True,
+            download_name=f"scan_{session_id}_{filename_ts}.pdf",
+            conditional=True,
         )
-        export_logger.info("HTML rendered for PDF export")
+        return apply_validators(response, validators)
 
-        #  Generate PDF
-        pdf = HTML(string=rendered).write_pdf()
-        export_logger.info("✅ PDF generation complete")
+    return render_template("export_status.html", session_id=session_id, status=status)
 
-        #  Serve PDF with timestamped filename
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = (
-            f'attachment; filename=scan_{session_id}_{filename_ts}.pdf'
-        )
-        return response
 
-    except Exception as e:
-        export_logger.exception(f"❌ PDF export failed for session {session_id}: {e}")
-        flash("An error occurred while exporting the PDF.", "danger")
-        return redirect(url_for("scans.scan_detail", session_id=session_id))
+@bp.route("/export/<int:session_id>/pdf_job", methods=["GET", "POST"])
+def export_pdf_job(session_id):
+    """
+    PDF export job API.
+    - POST: start (or retry) the export job
+    - GET: report job status
+    Returns JSON with state plus status/download URLs.
+    """
+    if request.method == "POST":
+        status = start_export(current_app._get_current_object(), session_id, retry_failed=True)
+    else:
+        status = get_export_status(session_id)
+
+    if status["state"] == "not_found":
+        return jsonify({"state": "not_found"}), 404
+
+    body = {
+        "session_id": session_id,
+        "state": status["state"],
+        "status_url": url_for("scans.export_pdf_job", session_id=session_id),
+        "download_url": url_for("scans.export_pdf", session_id=session_id),
+    }
+    if status.get("error"):
+        body["error"] = status["error"]
+    return jsonify(body), (202 if status["state"] == "running" else 200)
+
+# ---------------------
+#  Streaming CSV / NDJSON Export
+# ---------------------
+def _stream_export(session_id, fmt):
+    """Build a streaming response of raw result rows (constant memory per batch)."""
+    if not session_exists(session_id):
+        return "Scan session not found", 404
+
+    export_logger.info(f"Starting {fmt} stream for session {session_id}")
+
+    def generate_csv():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in iter_export_rows(session_id):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        for batch in iter_export_rows(session_id):
+            yield "".join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+                for row in batch
+            )
+
+    if fmt == "csv":
+        body, mimetype = generate_csv(), "text/csv"
+    else:
+        body, mimetype = generate_ndjson(), "application/x-ndjson"
+
+    filename_ts = datetime.now().strftime("%Y%m%d-%H%M")
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=scan_{session_id}_{filename_ts}.{fmt}"
+    return response
+
+
+@bp.route("/export/<int:session_id>.csv")
+def export_csv(session_id):
+    """Stream all result rows (with global tags and risk) as CSV."""
+    return _stream_export(session_id, "csv")
+
+
+@bp.route("/export/<int:session_id>.ndjson")
+def export_ndjson(session_id):
+    """Stream all result rows (with global tags and risk) as newline-delimited JSON."""
+    return _stream_export(session_id, "ndjson")
 
 # ---------------------
 #  View Log File
 # ---------------------
-@bp.route("/logs/<int:session_id>")
-def view_logs(session_id):
+def _log_source(session_id):
     """
-    Render the full Nmap log file used for a scan session.
-    Falls back to DB log_text if the .txt file no longer exists.
+    Locate a session's log without loading it.
+    Returns: ("file", path, size_bytes), ("db", None, size_chars), (None, None, 0),
+             or None if the session does not exist.
     """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute("SELECT log_path, log_text FROM scan_sessions WHERE id = ?", (session_id,))
+    cursor.execute("SELECT log_path, COALESCE(length(log_text), 0) FROM scan_sessions WHERE id = ?", (session_id,))
     row = cursor.fetchone()
     conn.close()
 
     if not row:
+        return None
+
+    log_path, db_length = row
+    if log_path and os.path.exists(log_path):
+        return "file", log_path, os.path.getsize(log_path)
+    if db_length:
+        return "db", None, db_length
+    return None, None, 0
+
+
+def _read_log_window(session_id, source, path, offset, length, total):
+    """
+    Read [offset, offset + length) of the log without touching the rest.
+    Files are read by byte offset via seek; DB fallback text by character
+    offset via SQL substr().
+
+    The window is aligned to whole lines: a partial first line is dropped
+    unless offset is a line start, and the window ends after its last
+    newline (unless it reaches the end of the log), so paging on from the
+    returned end neither repeats nor loses a line. A line longer than the
+    window is shown as is.
+    Returns: (text, start, end) with start/end the offsets actually shown.
+    """
+    lead = 1 if offset > 0 else 0  # One unit before offset tells if it starts a line
+    if source == "file":
+        with open(path, "rb") as f:
+            f.seek(offset - lead)
+            data = f.read(length + lead)
+        newline = b"\n"
+    else:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT substr(log_text, ?, ?) FROM scan_sessions WHERE id = ?",
+                       (offset - lead + 1, length + lead, session_id))
+        row = cursor.fetchone()
+        conn.close()
+        data = row[0] if row and row[0] else ""
+        newline = "\n"
+
+    start, stop = lead, len(data)
+    if lead and data[:1] != newline:
+        first = data.find(newline, start)
+        if first != -1:
+            start = first + 1
+    if offset + length < total:
+        last = data.rfind(newline, start)
+        if last != -1:
+            stop = last + 1
+
+    text = data[start:stop]
+    if source == "file":
+        text = text.decode("utf-8", errors="replace")
+    return text, offset - lead + start, offset - lead + stop
+
+
+@bp.route("/logs/<int:session_id>")
+def view_logs(session_id):
+    """
+    Render one window of the Nmap log file used for a scan session.
+    Falls back to DB log_text if the .txt file no longer exists.
+
+    Query:
+        mode=tail (default): last `kb` KB of the log
+        mode=range: `length` bytes starting at `offset`
+    """
+    validators = session_validators(session_id)
+    if is_not_modified(validators):
+        return not_modified_response(validators)
+
+    located = _log_source(session_id)
+    if located is None:
         return "Log data not found", 404
 
-    log_path, log_text = row
+    source, log_path, total = located
+    mode = request.args.get("mode", "tail")
+    kb = min(max(request.args.get("kb", LOG_VIEW_TAIL_KB, type=int), 1), LOG_VIEW_MAX_KB)
+    page_size = kb * 1024
 
-    if log_path and os.path.exists(log_path):
-        try:
-            with open(log_path, "r", encoding="utf-8") as f:
-                log_content = f.read()
-        except Exception as e:
-            log_content = log_text or f"⚠️ Failed to read log file: {e}"
-    elif log_text:
-        log_content = log_text
+    if mode == "range":
+        length = min(max(request.args.get("length", page_size, type=int), 1), LOG_VIEW_MAX_KB * 1024)
+        offset = min(max(request.args.get("offset", 0, type=int), 0), total)
     else:
+        mode = "tail"
+        length = page_size
+        offset = max(total - page_size, 0)
+    end = min(offset + length, total)
+
+    if source is None:
         log_content = "⚠️ Log file not found and no log text available."
+    else:
+        try:
+            log_content, offset, end = _read_log_window(
+                session_id, source, log_path, offset, end - offset, total
+            )
+        except Exception as e:
+            log_content = f"⚠️ Failed to read log file: {e}"
 
-    return render_template("view_logs.html", log_content=log_content, session_id=session_id)
+    rendered = render_template(
+        "view_logs.html",
+        log_content=log_content,
+        session_id=session_id,
+        source=source,
+        window={
+            "mode": mode,
+            "kb": kb,
+            "offset": offset,
+            "end": end,
+            "total": total,
+            "length": length,
+            "unit": "bytes" if source == "file" else "characters",
+        },
+    )
+    return apply_validators(make_response(rendered), validators)
+
+
+@bp.route("/logs/<int:session_id>/raw")
+def raw_log(session_id):
+    """
+    Serve the full log as text/plain with HTTP Range support,
+    so large logs can be fetched or resumed in pieces.
+    """
+    located = _log_source(session_id)
+    if located is None or located[0] is None:
+        return "Log data not found", 404
+
+    source, log_path, _ = located
+    if source == "file":
+        return send_file(os.path.abspath(log_path), mimetype="text/plain", conditional=True,
+                         download_name=f"scan_{session_id}_log.txt")
 
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT log_text FROM scan_sessions WHERE id = ?", (session_id,))
+    log_text = cursor.fetchone()[0] or ""
+    conn.close()
+    return send_file(BytesIO(log_text.encode("utf-8")), mimetype="text/plain", conditional=True,
+                     download_name=f"scan_{session_id}_log.txt")
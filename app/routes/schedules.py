@@ -0,0 +1,63 @@
+# app/routes/schedules.py
+# ---------------------
+#  Recurring scan schedules (create, pause/resume, delete)
+# ---------------------
+
+from flask import Blueprint, render_template, request, redirect, flash, url_for
+from app.utils.scanner_presets import get_presets
+from app.utils.scan_schedules import create_schedule, set_schedule_enabled, delete_schedule, list_schedules
+from app.config import SCAN_TARGET
+
+bp = Blueprint("schedules", __name__)
+
+
+# ---------------------
+#  Schedule List + Create
+# ---------------------
+@bp.route("/schedules", methods=["GET", "POST"])
+def schedules():
+    """
+    - GET: list schedules with run latency stats.
+    - POST: add a schedule (interval in minutes, jitter in seconds).
+    """
+    if request.method == "POST":
+        try:
+            schedule_id = create_schedule(
+                name=request.form.get("name", "").strip(),
+                category=request.form.get("category", ""),
+                target=request.form.get("target", SCAN_TARGET),
+                interval_seconds=int(float(request.form.get("interval_minutes", 0)) * 60),
+                jitter_seconds=int(request.form.get("jitter_seconds", 0) or 0),
+                priority=int(request.form.get("priority", 0) or 0),
+            )
+            flash(f"✅ Schedule #{schedule_id} created.", "success")
+        except ValueError as e:
+            flash(f"❌ {e}", "danger")
+        return redirect(url_for("schedules.schedules"))
+
+    return render_template(
+        "schedules.html",
+        schedules=list_schedules(),
+        scan_categories=get_presets(),
+        default_target=SCAN_TARGET
+    )
+
+
+@bp.route("/schedules/<int:schedule_id>/toggle", methods=["POST"])
+def toggle(schedule_id):
+    """Pauses or resumes a schedule."""
+    enabled = request.form.get("enabled") == "1"
+    if set_schedule_enabled(schedule_id, enabled):
+        flash(f"{'▶️ Resumed' if enabled else '⏸ Paused'} schedule #{schedule_id}.", "success")
+    else:
+        flash(f"⚠️ Schedule #{schedule_id} not found.", "warning")
+    return redirect(url_for("schedules.schedules"))
+
+
+@bp.route("/schedules/<int:schedule_id>/delete", methods=["POST"])
+def delete(schedule_id):
+    if delete_schedule(schedule_id):
+        flash(f"🗑 Schedule #{schedule_id} deleted.", "success")
+    else:
+        flash(f"⚠️ Schedule #{schedule_id} not found.", "warning")
+    return redirect(url_for("schedules.schedules"))
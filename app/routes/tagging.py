@@ -5,6 +5,7 @@
 # ---------------------------------------
 from flask import Blueprint, render_template, request, redirect, flash, url_for
 from app.config import DB_PATH
+from app.utils.db_utils import bump_session_versions
 import sqlite3
 
 bp = Blueprint("tagging", __name__)
@@ -62,6 +63,11 @@ def tag_inventory():
                 VALUES (?, ?, ?, ?)
             """, inserts)
 
+        #  Invalidate cached views of every session showing an edited IP
+        changed_ips = {row[0] for row in updates} | {row[4] for row in updates} | {row[0] for row in inserts}
+        for changed_ip in changed_ips:
+            bump_session_versions(cursor, ip=changed_ip)
+
         conn.commit()
         flash("✅ Tags updated successfully!", "success")
         return redirect(url_for("tagging.tag_inventory"))
@@ -137,6 +143,9 @@ def delete_tag():
         return redirect(url_for("tagging.tag_inventory"))
 
     deleted = cursor.rowcount
+    if deleted:
+        #  MAC-only deletes can touch any IP, so invalidate everything
+        bump_session_versions(cursor, ip=ip or None)
     conn.commit()
     conn.close()
 
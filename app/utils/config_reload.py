@@ -0,0 +1,74 @@
+# app/utils/config_reload.py
+# ---------------------
+# Config files reloaded in place when they change on disk
+# ---------------------
+#
+# Risk rules, tag rules, scan presets and the OUI index are each loaded from
+# a file that can be edited while the app runs. A ReloadableConfig holds the
+# value loaded from one such file and compares the file's (path, mtime,
+# size) stamp on every access, so an unchanged file costs one stat(); a
+# changed file is loaded again under a lock. A broken edit is logged and
+# recorded in status, and the last valid value stays in use.
+
+import os
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadableConfig:
+    """One config file and the last valid value loaded from it."""
+
+    def __init__(self, path, loader, error, initial, label, describe):
+        """
+        Args:
+            path: default file to load (reload_if_changed() may be given another)
+            loader: callable(path) -> value; raises error for an invalid file
+            error: exception class of the loader's validation errors
+            initial: value in use until a file has loaded
+            label: file kind for log messages, e.g. "risk rule file"
+            describe: callable(value) -> log text, e.g. "7 risk rules"
+        """
+        self.value = initial
+        self.status = {"path": path, "loaded_at": None, "error": None}
+        self._path = path
+        self._loader = loader
+        self._error = error
+        self._label = label
+        self._describe = describe
+        self._lock = threading.Lock()
+        self._stamp = None
+
+    def get(self):
+        """Current value, reloading the file first if it changed."""
+        self.reload_if_changed()
+        return self.value
+
+    def reload_if_changed(self, path=None):
+        """Reload the file if its mtime/size changed. Returns: True if the value was replaced."""
+        path = path or self._path
+        try:
+            st = os.stat(path)
+            stamp = (path, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = (path, None, None)
+        if stamp == self._stamp:
+            return False
+
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            try:
+                value = self._loader(path)
+            except self._error as e:
+                self.status.update(path=path, error=str(e))
+                logger.error(f"❌ Invalid {self._label} {path}; keeping the last valid one: {e}")
+                return False
+
+            self.value = value
+            self.status.update(path=path, loaded_at=datetime.now().isoformat(timespec="seconds"), error=None)
+            logger.info(f"Loaded {self._describe(value)} from {path}")
+            return True
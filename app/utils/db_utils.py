@@ -5,9 +5,12 @@
 
 import sqlite3
 import os, sys
+import json
+import base64
 from flask import session, flash, redirect, url_for, has_request_context
 from app.config import DB_PATH
 from collections import defaultdict
+from datetime import datetime
 
 # ---------------------
 # 🔍 SCAN SESSION RETRIEVAL
@@ -169,6 +172,52 @@ def get_hosts_and_ports(session_id):
     return hosts, port_map
 
 
+def get_latest_open_ports():
+    """
+       Get each host's open ports as found by its newest port scan (host_risk.is_latest;
+    ping sweeps are not port scans). A narrow follow-up scan only replaces the baseline
+    of the hosts it scanned, and a host whose newest scan found nothing open has none.
+    Returns: Tuple ({ip: baseline session id}, {ip: set of (protocol, port)}), empty if none.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+
+    cur.execute("""
+        SELECT r.ip, r.protocol, r.port, r.session_id
+        FROM host_risk h
+        JOIN scan_results r ON r.session_id = h.session_id AND r.ip = h.ip
+        WHERE h.is_latest = 1 AND h.open_ports > 0
+          AND r.state = 'open' AND r.port IS NOT NULL
+    """)
+    open_ports, baselines = {}, {}
+    for ip, protocol, port, session_id in cur.fetchall():
+        open_ports.setdefault(ip, set()).add((protocol or "tcp", port))
+        baselines[ip] = session_id
+
+    conn.close()
+    return baselines, open_ports
+
+
+def get_new_hosts(session_id):
+    """
+       Get IPs in a session that no earlier session has seen.
+    Returns: Sorted list of IPs
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT r.ip FROM scan_results r
+        WHERE r.session_id = ?
+          AND NOT EXISTS (
+              SELECT 1 FROM scan_results prev
+              WHERE prev.ip = r.ip AND prev.session_id < r.session_id
+          )
+    """, (session_id,))
+    hosts = sorted(row[0] for row in cur.fetchall() if row[0] and row[0] != "unknown")
+    conn.close()
+    return hosts
+
+
 def delete_orphaned_results():
     """
     🧹 Delete scan_results that reference non-existent scan_sessions.
@@ -197,6 +246,116 @@ def delete_orphaned_results():
 
     return results_deleted
 
+# ---------------------
+# 📤 EXPORT ROWS
+# ---------------------
+
+# Scan result rows with global tags and risk score, in report column order
+EXPORT_COLUMNS = (
+    "ip", "hostname", "mac_addr", "vendor", "protocol", "port",
+    "state", "service", "product", "version", "os", "cpe",
+    "uptime", "last_boot", "script", "device_tag", "service_tag", "risk_score"
+)
+
+# Tags are looked up per IP with LIMIT 1 so an IP tagged under several MACs
+# still yields exactly one row per scan result.
+_EXPORT_SELECT_COLUMNS = """
+        r.ip, r.hostname, r.mac_addr, r.vendor, r.protocol, r.port,
+        r.state, r.service, r.product, r.version, r.os, r.cpe,
+        r.uptime, r.last_boot, r.script,
+        COALESCE((SELECT device_tag FROM global_tags g WHERE g.ip = r.ip LIMIT 1), '') AS device_tag,
+        COALESCE((SELECT service_tag FROM global_tags g WHERE g.ip = r.ip LIMIT 1), '') AS service_tag,
+        COALESCE(r.risk_score, 0) as risk_score
+"""
+
+EXPORT_ROWS_QUERY = f"""
+    SELECT {_EXPORT_SELECT_COLUMNS}
+    FROM scan_results r
+    WHERE r.session_id = ?
+    ORDER BY r.ip, r.port
+"""
+
+# Keyset batches ordered like the report; r.id breaks ties between equal (ip, port).
+# Plain columns (no COALESCE) so idx_scan_results_session_ip_port serves both the
+# seek and the order; NULL ports/IPs sort first and are matched with IS.
+_EXPORT_BATCH_QUERY = """
+    SELECT r.id, {columns}
+    FROM scan_results r
+    WHERE r.session_id = ? {condition}
+    ORDER BY r.ip, r.port, r.id
+    LIMIT ?
+"""
+
+
+def _after(column, value):
+    """SQL condition (and params) for rows sorting after value in column, NULLs first."""
+    return (f"{column} IS NOT NULL", ()) if value is None else (f"{column} > ?", (value,))
+
+
+def _export_batch(cursor, session_id, last, limit):
+    """
+       Next export rows after the last row of the previous batch (None: from the start).
+    Resumes in three index range steps: same (ip, port) with a higher id, same ip
+    with a later port, then later IPs.
+    """
+    if last is None:
+        steps = [("", ())]
+    else:
+        row_id, ip, port = last[0], last[1], last[6]
+        port_after, port_params = _after("r.port", port)
+        ip_after, ip_params = _after("r.ip", ip)
+        steps = [
+            ("AND r.ip IS ? AND r.port IS ? AND r.id > ?", (ip, port, row_id)),
+            (f"AND r.ip IS ? AND {port_after}", (ip, *port_params)),
+            (f"AND {ip_after}", ip_params),
+        ]
+
+    rows = []
+    for condition, params in steps:
+        query = _EXPORT_BATCH_QUERY.format(columns=_EXPORT_SELECT_COLUMNS, condition=condition)
+        cursor.execute(query, (session_id, *params, limit - len(rows)))
+        rows += cursor.fetchall()
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def get_export_rows(session_id):
+    """
+       Get all export rows for a session (see EXPORT_COLUMNS for column order).
+    Returns: List of tuples.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(EXPORT_ROWS_QUERY, (session_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def iter_export_rows(session_id, batch_size=2000):
+    """
+       Stream export rows for a session in bounded batches.
+    Each batch is its own short query resuming after the last (ip, port, id),
+    so no read lock is held while the caller is busy sending data and memory
+    stays at one batch no matter how large the session is.
+    Yields: lists of tuples (EXPORT_COLUMNS order), at most batch_size each.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.cursor()
+        last = None
+        while True:
+            batch = _export_batch(cursor, session_id, last, batch_size)
+            if not batch:
+                break
+            last = batch[-1]
+            yield [row[1:] for row in batch]
+            if len(batch) < batch_size:
+                break
+    finally:
+        conn.close()
+
 # ------------------------
 # 🏷️ Tagging Functions
 # ------------------------
@@ -318,9 +477,126 @@ def set_tag(session_id, ip, mac, tag_type, tag_value, cursor=None):
             DO UPDATE SET service_tag = excluded.service_tag
         """, (ip, mac, ip, mac, tag_value))
 
+    # Global tags show up in every session containing this IP
+    bump_session_versions(cursor, session_id=session_id, ip=ip)
+
+    if should_close:
+        conn.commit()
+        conn.close()
+
+
+def set_tags_bulk(session_id, items, cursor=None):
+    """
+       Insert or update device/service tags for many devices in one go;
+       same result as calling set_tag for each non-empty tag.
+    - items: iterable of (ip, mac, device_tag, service_tag); "" or None leaves that tag as it is
+    - One executemany per table, and one cache bump for all IPs.
+    - Can be used standalone or inside larger DB transaction.
+    Returns: (device tags set, service tags set)
+    """
+    should_close = False
+    if cursor is None:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        should_close = True
+    else:
+        conn = None
+
+    items = [(ip, mac or "", device or "", service or "") for ip, mac, device, service in items if device or service]
+    session_rows = [
+        (session_id, ip, tag_type, tag_value)
+        for ip, _mac, device, service in items
+        for tag_type, tag_value in (("device", device), ("service", service)) if tag_value
+    ]
+
+    # Per-scan tags
+    cursor.executemany("""
+        INSERT INTO tags (session_id, ip, tag_type, tag_value)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(session_id, ip, tag_type)
+        DO UPDATE SET tag_value = excluded.tag_value
+    """, session_rows)
+
+    # Global tags: an empty tag keeps the stored one
+    cursor.executemany("""
+        INSERT INTO global_tags (ip, mac_addr, device_tag, service_tag)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(ip, mac_addr)
+        DO UPDATE SET device_tag = COALESCE(NULLIF(excluded.device_tag, ''), device_tag),
+                      service_tag = COALESCE(NULLIF(excluded.service_tag, ''), service_tag)
+    """, items)
+
+    bump_session_versions(cursor, session_id=session_id, ips={ip for ip, *_tags in items})
+
     if should_close:
         conn.commit()
         conn.close()
+    devices = sum(1 for _ip, _mac, device, _service in items if device)
+    return devices, len(session_rows) - devices
+
+
+# ------------------------
+# 🔁 Session Versioning (HTTP cache validators)
+# ------------------------
+
+def bump_session_versions(cursor, session_id=None, ip=None, ips=None):
+    """
+       Mark cached views of sessions as stale.
+    - session_id: bump that session
+    - ip: bump every session containing the IP (tags are global per IP)
+    - ips: same for many IPs at once (bulk tagging)
+    - none of them: bump all sessions (e.g. trusted-device list changed)
+    Uses the caller's cursor so it commits with the change that caused it.
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+
+    if session_id is None and ip is None and not ips:
+        cursor.execute("UPDATE scan_sessions SET version = version + 1, updated_at = ?", (now,))
+        return
+
+    if session_id is not None:
+        cursor.execute("""
+            UPDATE scan_sessions SET version = version + 1, updated_at = ?
+            WHERE id = ?
+        """, (now, session_id))
+
+    if ip is not None:
+        cursor.execute("""
+            UPDATE scan_sessions SET version = version + 1, updated_at = ?
+            WHERE id IN (SELECT DISTINCT session_id FROM scan_results WHERE ip = ?)
+              AND id IS NOT ?
+        """, (now, ip, session_id))
+
+    ips = list(ips or ())
+    for start in range(0, len(ips), 500):  # Stay under SQLite's bound parameter limit
+        chunk = ips[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"""
+            UPDATE scan_sessions SET version = version + 1, updated_at = ?
+            WHERE id IN (SELECT DISTINCT session_id FROM scan_results WHERE ip IN ({placeholders}))
+              AND id IS NOT ?
+        """, (now, *chunk, session_id))
+
+
+def get_session_versions(session_ids):
+    """
+       Get cache validators for one or more sessions.
+    Returns: dict { session_id: (version, updated_at) } for sessions that exist.
+    """
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in session_ids)
+    cursor.execute(f"""
+        SELECT id, version, updated_at FROM scan_sessions
+        WHERE id IN ({placeholders})
+    """, session_ids)
+    versions = {row[0]: (row[1] or 0, row[2]) for row in cursor.fetchall()}
+    conn.close()
+    return versions
 
 
 # ------------------------
@@ -539,10 +815,252 @@ def get_detailed_port_info(old_id, new_id, ip, port):
 
     return old_info, new_info
 
+# ------------------------
+# 🌐 JSON API Queries (keyset pagination)
+# ------------------------
+
+# Columns exposed by /api/v1/sessions/<id>/results (in default order)
+RESULT_API_FIELDS = (
+    "id", "ip", "hostname", "mac_addr", "vendor", "protocol", "port", "state",
+    "service", "product", "version", "os", "cpe", "uptime", "last_boot",
+    "script", "risk_score", "service_cpe", "cve_ids", "device_tag", "service_tag"
+)
+
+# Columns exposed by /api/v1/sessions/<id>/hosts
+HOST_API_FIELDS = (
+    "ip", "hostname", "mac_addr", "vendor", "os", "ports", "open_ports",
+    "total_risk", "device_tag", "service_tag"
+)
+
+# Allowed sort keys -> SQL expression (NULL-safe so keyset comparisons work)
+RESULT_SORT_KEYS = {
+    "id": "id",
+    "ip": "COALESCE(ip, '')",
+    "port": "COALESCE(port, -1)",
+    "risk_score": "COALESCE(risk_score, 0)",
+}
+HOST_SORT_KEYS = {
+    "ip": "ip",
+    "total_risk": "total_risk",
+    "open_ports": "open_ports",
+}
+
+# Global tags are keyed by (ip, mac); like the HTML views, tags are looked up by IP
+_RESULTS_BASE_QUERY = """
+    SELECT r.id, r.ip, r.hostname, r.mac_addr, r.vendor, r.protocol, r.port, r.state,
+           r.service, r.product, r.version, r.os, r.cpe, r.uptime, r.last_boot,
+           r.script, COALESCE(r.risk_score, 0) AS risk_score, r.service_cpe, r.cve_ids,
+           COALESCE((SELECT device_tag FROM global_tags g WHERE g.ip = r.ip LIMIT 1), '') AS device_tag,
+           COALESCE((SELECT service_tag FROM global_tags g WHERE g.ip = r.ip LIMIT 1), '') AS service_tag
+    FROM scan_results r
+    WHERE r.session_id = ?
+"""
+
+_HOSTS_BASE_QUERY = """
+    SELECT h.*,
+           COALESCE((SELECT device_tag FROM global_tags g WHERE g.ip = h.ip LIMIT 1), '') AS device_tag,
+           COALESCE((SELECT service_tag FROM global_tags g WHERE g.ip = h.ip LIMIT 1), '') AS service_tag
+    FROM (
+        SELECT ip,
+               MAX(hostname) AS hostname,
+               MAX(mac_addr) AS mac_addr,
+               MAX(vendor) AS vendor,
+               MAX(os) AS os,
+               COUNT(port) AS ports,
+               SUM(state = 'open') AS open_ports,
+               SUM(COALESCE(risk_score, 0)) AS total_risk
+        FROM scan_results
+        WHERE session_id = ?
+        GROUP BY ip
+    ) h
+"""
+
+
+def encode_page_cursor(sort_value, key):
+    """Encode the last row's (sort value, unique key) into an opaque cursor string."""
+    raw = json.dumps([sort_value, key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor):
+    """
+    Decode a cursor produced by encode_page_cursor().
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    return sort_value, key
+
+
+def _keyset_page(base_query, params, filters_sql, filter_params, sort_expr, key_col,
+                 fields, descending, cursor, limit):
+    """
+    Run one page of a keyset-paginated query over a derived table.
+
+    Rows are ordered by (sort_expr, key_col) so the cursor stays stable
+    even when the sort column has duplicates.
+    Returns: (list of dicts, next_cursor or None)
+    """
+    query = f"SELECT {', '.join(fields)}, {sort_expr} AS _sort, {key_col} AS _key FROM ({base_query}) WHERE 1=1"
+    params = list(params)
+
+    for clause in filters_sql:
+        query += f" AND {clause}"
+    params.extend(filter_params)
+
+    op = "<" if descending else ">"
+    if cursor:
+        sort_value, key = decode_page_cursor(cursor)
+        query += f" AND ({sort_expr} {op} ? OR ({sort_expr} = ? AND {key_col} {op} ?))"
+        params.extend([sort_value, sort_value, key])
+
+    direction = "DESC" if descending else "ASC"
+    query += f" ORDER BY {sort_expr} {direction}, {key_col} {direction} LIMIT ?"
+    params.append(limit + 1)  # Fetch one extra row to know if another page exists
+
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor_obj = conn.cursor()
+    cursor_obj.execute(query, params)
+    rows = cursor_obj.fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_page_cursor(last["_sort"], last["_key"])
+
+    return [{field: row[field] for field in fields} for row in rows], next_cursor
+
+
+def get_sessions_page(scan_type=None, timestamp=None, cursor=None, limit=50):
+    """
+    Page through scan sessions, newest first.
+    Each session includes host and result counts.
+    Returns: (list of dicts, next_cursor or None)
+    """
+    base_query = """
+        SELECT s.id, s.timestamp, s.scan_type,
+               (SELECT COUNT(DISTINCT ip) FROM scan_results WHERE session_id = s.id) AS host_count,
+               (SELECT COUNT(*) FROM scan_results WHERE session_id = s.id) AS result_count
+        FROM scan_sessions s
+    """
+    filters_sql, filter_params = [], []
+    if scan_type:
+        filters_sql.append("scan_type LIKE ?")
+        filter_params.append(f"%{scan_type}%")
+    if timestamp:
+        filters_sql.append("timestamp LIKE ?")
+        filter_params.append(f"%{timestamp}%")
+
+    fields = ("id", "timestamp", "scan_type", "host_count", "result_count")
+    return _keyset_page(base_query, [], filters_sql, filter_params, "id", "id",
+                        fields, True, cursor, limit)
+
+
+def get_results_page(session_id, filters=None, fields=None, sort="id",
+                     descending=False, cursor=None, limit=100):
+    """
+    Page through scan_results rows for a session.
+
+    Filters (all optional):
+        ip, service, tag   -> substring match
+        port, state        -> exact match
+        min_risk, max_risk -> risk_score bounds
+    Returns: (list of dicts, next_cursor or None)
+    """
+    filters = filters or {}
+    fields = fields or RESULT_API_FIELDS
+    filters_sql, filter_params = [], []
+
+    if filters.get("ip"):
+        filters_sql.append("ip LIKE ?")
+        filter_params.append(f"%{filters['ip']}%")
+    if filters.get("port") is not None:
+        filters_sql.append("port = ?")
+        filter_params.append(filters["port"])
+    if filters.get("service"):
+        filters_sql.append("service LIKE ?")
+        filter_params.append(f"%{filters['service']}%")
+    if filters.get("state"):
+        filters_sql.append("state = ?")
+        filter_params.append(filters["state"])
+    if filters.get("tag"):
+        filters_sql.append("(device_tag LIKE ? OR service_tag LIKE ?)")
+        filter_params.extend([f"%{filters['tag']}%"] * 2)
+    if filters.get("min_risk") is not None:
+        filters_sql.append("risk_score >= ?")
+        filter_params.append(filters["min_risk"])
+    if filters.get("max_risk") is not None:
+        filters_sql.append("risk_score <= ?")
+        filter_params.append(filters["max_risk"])
+
+    return _keyset_page(_RESULTS_BASE_QUERY, [session_id], filters_sql, filter_params,
+                        RESULT_SORT_KEYS[sort], "id", fields, descending, cursor, limit)
+
+
+def get_hosts_page(session_id, filters=None, fields=None, sort="ip",
+                   descending=False, cursor=None, limit=100):
+    """
+    Page through per-host aggregates for a session.
+
+    Filters (all optional):
+        ip, tag            -> substring match on the host
+        port, service      -> host has a row with this port / service
+        min_risk, max_risk -> bounds on the host's total risk
+    Returns: (list of dicts, next_cursor or None)
+    """
+    filters = filters or {}
+    fields = fields or HOST_API_FIELDS
+    filters_sql, filter_params = [], []
+
+    if filters.get("ip"):
+        filters_sql.append("ip LIKE ?")
+        filter_params.append(f"%{filters['ip']}%")
+    if filters.get("port") is not None:
+        filters_sql.append("ip IN (SELECT ip FROM scan_results WHERE session_id = ? AND port = ?)")
+        filter_params.extend([session_id, filters["port"]])
+    if filters.get("service"):
+        filters_sql.append("ip IN (SELECT ip FROM scan_results WHERE session_id = ? AND service LIKE ?)")
+        filter_params.extend([session_id, f"%{filters['service']}%"])
+    if filters.get("tag"):
+        filters_sql.append("(device_tag LIKE ? OR service_tag LIKE ?)")
+        filter_params.extend([f"%{filters['tag']}%"] * 2)
+    if filters.get("min_risk") is not None:
+        filters_sql.append("total_risk >= ?")
+        filter_params.append(filters["min_risk"])
+    if filters.get("max_risk") is not None:
+        filters_sql.append("total_risk <= ?")
+        filter_params.append(filters["max_risk"])
+
+    return _keyset_page(_HOSTS_BASE_QUERY, [session_id], filters_sql, filter_params,
+                        HOST_SORT_KEYS[sort], "ip", fields, descending, cursor, limit)
+
+
+def session_exists(session_id):
+    """Return True if a scan_sessions row exists for this id."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM scan_sessions WHERE id = ?", (session_id,))
+    found = cursor.fetchone() is not None
+    conn.close()
+    return found
+
 # ------------------------
 # Initialization
 # ------------------------
 
+def _ensure_column(cursor, table, column, ddl):
+    """Add a column to an existing table if an older database is missing it."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
 def init_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -623,6 +1141,208 @@ def init_db():
         )
     """)
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            target TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT CHECK(status IN ('queued', 'running', 'done', 'failed', 'cancelled')) NOT NULL DEFAULT 'queued',
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            log_name TEXT,
+            xml_path TEXT,
+            session_id INTEGER,
+            owner TEXT,
+            pid INTEGER,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            error TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scan_jobs_status
+        ON scan_jobs (status, priority, id)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER,
+            session_id INTEGER,
+            category TEXT NOT NULL,
+            target TEXT NOT NULL,
+            addresses INTEGER NOT NULL,
+            shards INTEGER NOT NULL DEFAULT 1,
+            hosts INTEGER NOT NULL DEFAULT 0,
+            ports INTEGER NOT NULL DEFAULT 0,
+            duration_seconds REAL NOT NULL,
+            finished_at TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scan_runs_category_target
+        ON scan_runs (category, target, id)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            target TEXT NOT NULL,
+            interval_seconds INTEGER NOT NULL,
+            jitter_seconds INTEGER NOT NULL DEFAULT 0,
+            priority INTEGER NOT NULL DEFAULT 0,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            next_run_at REAL NOT NULL,
+            last_job_id INTEGER,
+            created_at TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schedule_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INTEGER NOT NULL,
+            due_at REAL NOT NULL,
+            fired_at REAL NOT NULL,
+            latency_seconds REAL NOT NULL,
+            job_id INTEGER,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(schedule_id) REFERENCES scan_schedules(id) ON DELETE CASCADE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_schedule_runs_schedule
+        ON schedule_runs (schedule_id, id)
+    """)
+
+    # Risk weights snapshot used by the set-based re-score (see risk_rescore)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS risk_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fingerprint TEXT NOT NULL UNIQUE,
+            weights TEXT,
+            created_at TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS risk_port_weights (
+            port INTEGER PRIMARY KEY,
+            weight INTEGER NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS risk_service_weights (
+            service TEXT PRIMARY KEY,
+            weight INTEGER NOT NULL
+        )
+    """)
+
+    # Per-host risk per session with a link to the host's previous observation (see host_risk)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS host_risk (
+            session_id INTEGER NOT NULL,
+            ip TEXT NOT NULL,
+            risk_score INTEGER NOT NULL,
+            open_ports INTEGER NOT NULL,
+            prev_session_id INTEGER,
+            prev_risk_score INTEGER,
+            risk_delta INTEGER,
+            is_latest INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (session_id, ip)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_host_risk_ip
+        ON host_risk (ip, session_id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_host_risk_latest_delta
+        ON host_risk (is_latest, risk_delta)
+    """)
+
+    # Offline vulnerability index imported from NVD feeds (see vuln_index)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vuln_feeds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT,
+            imported_at TEXT,
+            cves INTEGER,
+            ranges INTEGER
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cves (
+            cve_id TEXT PRIMARY KEY,
+            cvss REAL,
+            severity TEXT,
+            published TEXT,
+            summary TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cve_cpe_ranges (
+            vendor TEXT NOT NULL,
+            product TEXT NOT NULL,
+            version TEXT,
+            start_including TEXT,
+            start_excluding TEXT,
+            end_including TEXT,
+            end_excluding TEXT,
+            cve_id TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cve_cpe_ranges_product
+        ON cve_cpe_ranges (product, vendor)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cve_cpe_ranges_cve
+        ON cve_cpe_ranges (cve_id)
+    """)
+
+    # Columns added after the original schema (migrate existing databases)
+    _ensure_column(cursor, "scan_sessions", "version", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(cursor, "scan_sessions", "updated_at", "TEXT")
+    cursor.execute(
+        "UPDATE scan_sessions SET updated_at = ? WHERE updated_at IS NULL",
+        (datetime.now().isoformat(timespec="seconds"),)
+    )
+    _ensure_column(cursor, "scan_jobs", "shards", "INTEGER NOT NULL DEFAULT 1")
+    _ensure_column(cursor, "scan_jobs", "heartbeat_at", "REAL")
+    _ensure_column(cursor, "scan_jobs", "resume_count", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(cursor, "scan_jobs", "estimated_seconds", "REAL")
+    _ensure_column(cursor, "scan_results", "risk_version", "INTEGER")
+    _ensure_column(cursor, "scan_results", "service_cpe", "TEXT")
+    _ensure_column(cursor, "scan_results", "cve_ids", "TEXT")
+    _ensure_column(cursor, "scan_results", "vuln_score", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(cursor, "scan_schedules", "nominal_run_at", "REAL")
+
+    # Indexes for per-session lookups (detail views, API pagination, diffs)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scan_results_session_ip_port
+        ON scan_results (session_id, ip, port)
+    """)
+
+    # Index for cross-session lookups by IP (tag edits invalidate every session with the IP)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scan_results_ip
+        ON scan_results (ip, session_id)
+    """)
+
     conn.commit()
     conn.close()
     print("✅ Database initialized with all necessary tables.")
@@ -0,0 +1,233 @@
+# app/utils/host_risk.py
+# ---------------------
+# Per-host risk per session, precomputed for history and "top risers"
+# ---------------------
+#
+# host_risk holds one row per (session, IP): the host's total risk in that
+# session, its open port count, and a link to the same host's previous
+# observation (prev_session_id, prev_risk_score, risk_delta). is_latest marks
+# each host's most recent row, so fleet-wide questions ("which hosts got
+# riskier since their last scan?") are one indexed range scan instead of a
+# GROUP BY over every result row ever stored.
+#
+# Only sessions that scanned ports (at least one result row with a port) get
+# rows: a ping sweep (-sn) sees hosts but no ports, so linking to it would
+# turn every host's next port scan into a "riser" from a risk of zero.
+#
+# Rows are written at ingest (record_session_risk), re-aggregated when stored
+# scores change (rescore) and unlinked when a session is deleted
+# (drop_session_risk). backfill_host_risk() fills the table once for
+# databases that predate it, or that still hold rows of sweep sessions.
+
+import sqlite3
+import logging
+
+from app.config import DB_PATH
+from app.utils.db_utils import bump_session_versions
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = ("session_id", "timestamp", "scan_type", "risk_score", "open_ports", "risk_delta")
+RISER_FIELDS = (
+    "ip", "session_id", "timestamp", "risk_score", "open_ports",
+    "prev_session_id", "prev_risk_score", "risk_delta"
+)
+
+#  Per-host totals of one session, in the same terms as the scan detail page (all rows summed)
+_SESSION_TOTALS_SQL = """
+    SELECT ip, SUM(risk_score) AS risk_score, SUM(state = 'open') AS open_ports
+    FROM scan_results
+    WHERE session_id = ?
+    GROUP BY ip
+"""
+
+#  Sessions whose results include ports (format with the session id column or ?)
+_PORT_SCAN_SQL = "EXISTS (SELECT 1 FROM scan_results ps WHERE ps.session_id = {} AND ps.port IS NOT NULL)"
+
+
+# ---------------------
+#  Writing
+# ---------------------
+def record_session_risk(cursor, session_id):
+    """
+    (Re)build the host_risk rows of one session from its scan results and
+    link them to each host's previous and next observation. Sessions
+    without port results (ping sweeps) get no rows. Uses the caller's
+    cursor so it commits with the results it summarizes.
+    Returns: number of hosts recorded
+    """
+    cursor.execute(f"SELECT {_PORT_SCAN_SQL.format('?')}", (session_id,))
+    if not cursor.fetchone()[0]:
+        drop_session_risk(cursor, session_id)
+        return 0
+
+    cursor.execute("DELETE FROM host_risk WHERE session_id = ?", (session_id,))
+    cursor.execute(f"""
+        INSERT INTO host_risk (
+            session_id, ip, risk_score, open_ports,
+            prev_session_id, prev_risk_score, risk_delta, is_latest
+        )
+        SELECT ?, cur.ip, cur.risk_score, cur.open_ports,
+               prev.session_id, prev.risk_score, cur.risk_score - prev.risk_score,
+               NOT EXISTS (SELECT 1 FROM host_risk n WHERE n.ip = cur.ip AND n.session_id > ?)
+        FROM ({_SESSION_TOTALS_SQL}) cur
+        LEFT JOIN host_risk prev ON prev.ip = cur.ip AND prev.session_id = (
+            SELECT MAX(p.session_id) FROM host_risk p WHERE p.ip = cur.ip AND p.session_id < ?
+        )
+    """, (session_id, session_id, session_id, session_id))
+    hosts = cursor.rowcount
+
+    #  Earlier rows of these hosts are no longer their latest
+    cursor.execute("""
+        UPDATE host_risk SET is_latest = 0
+        WHERE is_latest = 1 AND session_id < ?
+          AND ip IN (SELECT ip FROM host_risk WHERE session_id = ?)
+    """, (session_id, session_id))
+
+    #  Later observations (only when an older session is re-recorded) now compare against this one
+    cursor.execute("""
+        SELECT n.session_id, n.ip, c.risk_score
+        FROM host_risk c
+        JOIN host_risk n ON n.ip = c.ip AND n.session_id = (
+            SELECT MIN(q.session_id) FROM host_risk q WHERE q.ip = c.ip AND q.session_id > c.session_id
+        )
+        WHERE c.session_id = ?
+    """, (session_id,))
+    _relink(cursor, [(session_id, risk, next_id, ip) for next_id, ip, risk in cursor.fetchall()])
+    return hosts
+
+
+def drop_session_risk(cursor, session_id):
+    """
+    Remove a session's host_risk rows before the session is deleted. Each
+    host's next observation is re-linked to the one before it, and the
+    previous row becomes latest where the dropped one was.
+    """
+    cursor.execute("""
+        SELECT d.ip, d.prev_session_id, d.prev_risk_score, d.is_latest, (
+            SELECT MIN(q.session_id) FROM host_risk q WHERE q.ip = d.ip AND q.session_id > d.session_id
+        )
+        FROM host_risk d
+        WHERE d.session_id = ?
+    """, (session_id,))
+    rows = cursor.fetchall()
+
+    _relink(cursor, [
+        (prev_id, prev_risk, next_id, ip)
+        for ip, prev_id, prev_risk, _latest, next_id in rows if next_id is not None
+    ])
+    cursor.executemany(
+        "UPDATE host_risk SET is_latest = 1 WHERE session_id = ? AND ip = ?",
+        [(prev_id, ip) for ip, prev_id, _risk, latest, _next in rows if latest and prev_id is not None]
+    )
+    cursor.execute("DELETE FROM host_risk WHERE session_id = ?", (session_id,))
+
+
+def _relink(cursor, links):
+    """
+    Point rows at a new previous observation: links are
+    (prev_session_id, prev_risk_score, session_id, ip). Sessions whose
+    deltas change get their cached views invalidated.
+    """
+    cursor.executemany("""
+        UPDATE host_risk
+        SET prev_session_id = ?1, prev_risk_score = ?2, risk_delta = risk_score - ?2
+        WHERE session_id = ?3 AND ip = ?4
+    """, links)
+    for session_id in sorted({link[2] for link in links}):
+        bump_session_versions(cursor, session_id=session_id)
+
+
+def backfill_host_risk(force=False):
+    """
+    Build host_risk for every stored session that scanned ports in one pass
+    (window functions link each host's observations). Runs only when the
+    table is empty or holds rows of sweep sessions, unless force.
+    Returns: number of rows written
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    cursor = conn.cursor()
+    if not force:
+        cursor.execute(f"""
+            SELECT NOT EXISTS (SELECT 1 FROM host_risk) OR EXISTS (
+                SELECT 1 FROM (SELECT DISTINCT session_id FROM host_risk) h
+                WHERE NOT {_PORT_SCAN_SQL.format('h.session_id')}
+            )
+        """)
+        if not cursor.fetchone()[0]:
+            conn.close()
+            return 0
+
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("DELETE FROM host_risk")
+    cursor.execute(f"""
+        INSERT INTO host_risk (
+            session_id, ip, risk_score, open_ports,
+            prev_session_id, prev_risk_score, risk_delta, is_latest
+        )
+        SELECT session_id, ip, risk_score, open_ports,
+               LAG(session_id) OVER w, LAG(risk_score) OVER w, risk_score - LAG(risk_score) OVER w,
+               LEAD(session_id) OVER w IS NULL
+        FROM (
+            SELECT session_id, ip, SUM(risk_score) AS risk_score, SUM(state = 'open') AS open_ports
+            FROM scan_results
+            WHERE session_id IN (SELECT s.id FROM scan_sessions s WHERE {_PORT_SCAN_SQL.format('s.id')})
+            GROUP BY session_id, ip
+        )
+        WINDOW w AS (PARTITION BY ip ORDER BY session_id)
+    """)
+    rows = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if rows:
+        logger.info(f"Backfilled host risk history: {rows} host/session rows")
+    return rows
+
+
+# ---------------------
+#  Reading
+# ---------------------
+def get_host_risk_history(ip, limit=None):
+    """
+    Risk of one host in every session that saw it, oldest first.
+    limit keeps only the most recent observations.
+    Returns: list of dicts (HISTORY_FIELDS)
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT h.session_id, s.timestamp, s.scan_type, h.risk_score, h.open_ports, h.risk_delta
+        FROM host_risk h
+        JOIN scan_sessions s ON s.id = h.session_id
+        WHERE h.ip = ?
+        ORDER BY h.session_id DESC
+        LIMIT ?
+    """, (ip, -1 if limit is None else limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(zip(HISTORY_FIELDS, row)) for row in reversed(rows)]
+
+
+def get_top_risers(limit=10, min_delta=1, session_id=None):
+    """
+    Hosts whose risk grew the most since their previous scan, by the
+    risk_delta of each host's latest observation (or of one session's
+    rows with session_id).
+    Returns: list of dicts (RISER_FIELDS), largest increase first
+    """
+    scope = "h.session_id = ?" if session_id is not None else "h.is_latest = 1"
+    params = (session_id,) if session_id is not None else ()
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT h.ip, h.session_id, s.timestamp, h.risk_score, h.open_ports,
+               h.prev_session_id, h.prev_risk_score, h.risk_delta
+        FROM host_risk h
+        JOIN scan_sessions s ON s.id = h.session_id
+        WHERE {scope} AND h.risk_delta >= ? AND h.ip != 'unknown'
+        ORDER BY h.risk_delta DESC, h.ip
+        LIMIT ?
+    """, params + (min_delta, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(zip(RISER_FIELDS, row)) for row in rows]
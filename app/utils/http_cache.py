@@ -0,0 +1,100 @@
+# app/utils/http_cache.py
+# ---------------------
+# HTTP conditional caching (ETag / Last-Modified) for session-scoped views
+# ---------------------
+
+import os
+import hashlib
+from datetime import datetime
+from flask import request, session, make_response
+from app.utils.db_utils import get_session_versions
+from app.utils.risk_rules import get_rule_engine
+from app.utils.tag_suggestions import get_tag_suggester
+from app.utils.tag_neighbors import neighbor_signature
+
+# Templates change the rendered output too, so fold their mtimes into every ETag.
+# This is identical across gunicorn workers, unlike a per-process token.
+_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
+
+
+def _template_stamp():
+    try:
+        return str(max(
+            os.path.getmtime(os.path.join(_TEMPLATE_DIR, name))
+            for name in os.listdir(_TEMPLATE_DIR)
+        ))
+    except (OSError, ValueError):
+        return ""
+
+
+TEMPLATE_STAMP = _template_stamp()
+
+
+def session_validators(*session_ids):
+    """
+    Build (etag, last_modified) for a view over the given sessions.
+
+    The ETag covers each session's version counter, the endpoint and its
+    query string (filters change the output), the loaded risk and tag
+    rules (a reload changes rule matches and suggestions without touching
+    any session), and the neighbour index signature (learned suggestions
+    come from every tagged host, not only this session's). Returns None if
+    any session is missing so error pages are never cached.
+    """
+    versions = get_session_versions(session_ids)
+    if len(versions) != len(set(session_ids)):
+        return None
+
+    parts = [
+        request.endpoint or "", request.query_string.decode(), TEMPLATE_STAMP,
+        get_rule_engine().fingerprint, get_tag_suggester().fingerprint,
+        ":".join(str(value) for value in neighbor_signature()),
+    ]
+    stamps = []
+    for sid in session_ids:
+        version, updated_at = versions[sid]
+        parts.append(f"{sid}:{version}:{updated_at}")
+        if updated_at:
+            stamps.append(updated_at)
+
+    etag = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+
+    last_modified = None
+    if stamps:
+        try:
+            last_modified = max(datetime.fromisoformat(s) for s in stamps)
+        except ValueError:
+            last_modified = None
+
+    return etag, last_modified
+
+
+def is_not_modified(validators):
+    """
+    True if the client's cached copy is still valid.
+    Pending flash messages always force a full render so they get displayed.
+    """
+    if not validators or session.get("_flashes"):
+        return False
+
+    etag, last_modified = validators
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def apply_validators(response, validators):
+    """Attach ETag / Last-Modified headers to a response (no-op if validators is None)."""
+    if validators:
+        etag, last_modified = validators
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+    return response
+
+
+def not_modified_response(validators):
+    """Empty 304 response carrying the current validators."""
+    return apply_validators(make_response("", 304), validators)
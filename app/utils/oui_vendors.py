@@ -0,0 +1,244 @@
+# app/utils/oui_vendors.py
+# ---------------------
+# MAC vendor lookup from the IEEE OUI registries
+# ---------------------
+#
+# nmap only reports <address addrtype="mac" vendor=...> when its own prefix
+# file knows the MAC, so imported scans often carry a MAC without a vendor
+# (and suggest_tags loses its vendor rules). OUI_FILE (config/oui.tsv.gz,
+# written by scripts/update_oui.py from the IEEE MA-L, MA-M and MA-S
+# registries) holds one "<hex prefix>\t<organization>" line per block; the
+# prefix length gives the block size:
+#
+#   6 hex digits  24-bit  MA-L (classic OUI)
+#   7 hex digits  28-bit  MA-M
+#   9 hex digits  36-bit  MA-S / OUI-36
+#
+# OuiIndex keeps one dict per block size keyed by the prefix as an int, so a
+# lookup is one int conversion and at most three dict hits, longest block
+# first (MA-M/MA-S blocks are carved out of IEEE-owned MA-L blocks). Vendor
+# names are interned, as many blocks share an organization.
+
+import io
+import os
+import csv
+import gzip
+import time
+import sqlite3
+import logging
+from datetime import datetime
+
+from app.config import DB_PATH, OUI_FILE
+from app.utils.db_utils import bump_session_versions
+from app.utils.config_reload import ReloadableConfig
+
+logger = logging.getLogger(__name__)
+
+BLOCK_BITS = {6: 24, 7: 28, 9: 36}  # Prefix hex digits -> block size
+HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+MAC_SEPARATORS = str.maketrans("", "", ":-. ")
+BACKFILL_BATCH_ROWS = 50_000
+
+
+class OuiFileError(ValueError):
+    """Raised when the OUI file is unreadable or has malformed lines (first problems listed)."""
+
+
+def mac_to_int(mac):
+    """48-bit MAC as an int from "00:1A:2B:3C:4D:5E", "00-1a-2b-...", "001a.2b3c.4d5e" or bare hex; None if not a MAC."""
+    digits = (mac or "").translate(MAC_SEPARATORS)
+    if len(digits) != 12 or not HEX_DIGITS.issuperset(digits):
+        return None
+    return int(digits, 16)
+
+
+class OuiIndex:
+    """MAC prefix -> organization, one dict per block size."""
+
+    def __init__(self, entries=()):
+        self.blocks = {bits: {} for bits in sorted(BLOCK_BITS.values(), reverse=True)}
+        self._names = {}
+        for prefix, vendor in entries:
+            self.add(prefix, vendor)
+
+    def add(self, prefix, vendor):
+        """Add one block; prefix is 6, 7 or 9 hex digits."""
+        bits = BLOCK_BITS[len(prefix)]
+        self.blocks[bits][int(prefix, 16)] = self._names.setdefault(vendor, vendor)
+
+    def lookup(self, mac):
+        """Organization owning the MAC's most specific block, or None."""
+        value = mac_to_int(mac)
+        if value is None:
+            return None
+        for bits, block in self.blocks.items():
+            vendor = block.get(value >> (48 - bits))
+            if vendor is not None:
+                return vendor
+        return None
+
+    def entries(self):
+        """Returns: [(hex prefix, organization)] sorted by prefix, as written to OUI_FILE."""
+        digits = {bits: length for length, bits in BLOCK_BITS.items()}
+        rows = [
+            (f"{key:0{digits[bits]}X}", vendor)
+            for bits, block in self.blocks.items() for key, vendor in block.items()
+        ]
+        return sorted(rows)
+
+    def counts(self):
+        return {f"{bits}-bit": len(block) for bits, block in sorted(self.blocks.items())}
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks.values())
+
+
+# ---------------------
+#  Reading registry sources
+# ---------------------
+def parse_registry(text):
+    """
+    Parse an IEEE registry CSV (oui.csv, mam.csv, oui36.csv: Registry,
+    Assignment,Organization Name,...) or nmap's nmap-mac-prefixes
+    ("001A2B Vendor" lines).
+    Yields: (hex prefix, organization)
+    """
+    text = text.lstrip("\ufeff")
+    if text.startswith("Registry,"):
+        for row in csv.DictReader(io.StringIO(text)):
+            prefix = (row.get("Assignment") or "").strip().upper()
+            vendor = " ".join((row.get("Organization Name") or "").split())
+            if len(prefix) in BLOCK_BITS and HEX_DIGITS.issuperset(prefix) and vendor:
+                yield prefix, vendor
+        return
+    for line in text.splitlines():
+        prefix, _, vendor = line.strip().partition(" ")
+        vendor = vendor.strip()
+        if len(prefix) in BLOCK_BITS and HEX_DIGITS.issuperset(prefix) and vendor:
+            yield prefix.upper(), vendor
+
+
+def _open_text(path, mode, compressed=None):
+    compressed = path.endswith(".gz") if compressed is None else compressed
+    opener = gzip.open if compressed else open
+    return opener(path, mode + "t", encoding="utf-8", newline="" if mode == "r" else None)
+
+
+def read_oui_file(path):
+    """Load OUI_FILE into an index. A missing file means no lookups. Raises OuiFileError."""
+    if not os.path.exists(path):
+        return OuiIndex()
+    index, problems = OuiIndex(), []
+    try:
+        with _open_text(path, "r") as f:
+            for number, line in enumerate(f, 1):
+                line = line.rstrip("\r\n")
+                if not line or line.startswith("#"):
+                    continue
+                prefix, _, vendor = line.partition("\t")
+                if len(prefix) not in BLOCK_BITS or not HEX_DIGITS.issuperset(prefix) or not vendor:
+                    problems.append(f"line {number}: expected '<6, 7 or 9 hex digits>\\t<organization>'")
+                    continue
+                index.add(prefix, vendor)
+    except (OSError, ValueError) as e:
+        raise OuiFileError(f"Cannot read {path}: {e}")
+    if problems:
+        more = f" (and {len(problems) - 5} more)" if len(problems) > 5 else ""
+        raise OuiFileError("; ".join(problems[:5]) + more)
+    return index
+
+
+def write_oui_file(path, index, sources=()):
+    """Write the index to path (gzip if it ends in .gz), replacing the old file atomically."""
+    tmp_path = path + ".part"
+    with _open_text(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+        f.write(f"# IEEE OUI registry blocks, {datetime.now().isoformat(timespec='seconds')}\n")
+        for source in sources:
+            f.write(f"# source: {source}\n")
+        for prefix, vendor in index.entries():
+            f.write(f"{prefix}\t{vendor}\n")
+    os.replace(tmp_path, path)
+
+
+# ---------------------
+#  Registry access
+# ---------------------
+_oui = ReloadableConfig(
+    OUI_FILE, read_oui_file, OuiFileError, OuiIndex(), "OUI file",
+    lambda index: f"{len(index)} OUI blocks"
+)
+
+
+def get_oui_index():
+    """Current OUI index, reloading the file first if it changed (see config_reload)."""
+    return _oui.get()
+
+
+def lookup_vendor(mac, index=None):
+    """Organization for a MAC address, or None. Pass index (get_oui_index()) when looking up many MACs."""
+    return (index or get_oui_index()).lookup(mac)
+
+
+def oui_status():
+    """Returns: dict with 'path', 'loaded_at', the last load 'error' (or None) and block counts."""
+    index = _oui.get()
+    return {**_oui.status, "blocks": len(index), **index.counts()}
+
+
+def reload_if_changed(path=None):
+    """Reload the OUI file if its mtime/size changed. Returns: True if the index was replaced."""
+    return _oui.reload_if_changed(path)
+
+
+# ---------------------
+#  Backfilling stored results
+# ---------------------
+def backfill_vendors(batch_rows=BACKFILL_BATCH_ROWS, progress=None):
+    """
+    Fill scan_results.vendor from the OUI index for rows that have a MAC
+    but no vendor (vendors reported by nmap are kept). Sessions with
+    filled rows get their caches invalidated.
+
+    Args:
+        progress: optional callback(rows_done, rows_total)
+    Returns: dict with rows checked, rows filled, sessions and seconds
+    """
+    started = time.perf_counter()
+    index = get_oui_index()
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    cursor = conn.cursor()
+    candidates = "COALESCE(mac_addr, '') != '' AND COALESCE(vendor, '') = ''"
+    cursor.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM scan_results WHERE {candidates}")
+    total, first_id, last_id = cursor.fetchone()
+
+    checked = filled = 0
+    sessions = set()
+    if total and len(index):
+        for low in range(first_id, last_id + 1, batch_rows):
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT id, session_id, mac_addr FROM scan_results
+                WHERE id BETWEEN ? AND ? AND {candidates}
+            """, (low, low + batch_rows - 1))
+            updates = []
+            for row_id, session_id, mac in cursor.fetchall():
+                vendor = index.lookup(mac)
+                if vendor:
+                    updates.append((vendor, row_id))
+                    sessions.add(session_id)
+                checked += 1
+            cursor.executemany("UPDATE scan_results SET vendor = ? WHERE id = ?", updates)
+            filled += len(updates)
+            conn.commit()
+            if progress:
+                progress(checked, total)
+
+    cursor.execute("SELECT id FROM scan_sessions")
+    for session_id in sorted(sessions & {row[0] for row in cursor.fetchall()}):
+        bump_session_versions(cursor, session_id=session_id)
+    conn.commit()
+    conn.close()
+    return {
+        "rows": checked, "filled": filled, "sessions": len(sessions),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
@@ -12,9 +12,15 @@ import xml.etree.ElementTree as ET
 from datetime import datetime
 
 # Project-specific utility imports
+from app.config import DB_PATH
 from app.utils.db_utils import init_db, set_tag
 from app.utils.risk_utils import compute_row_risk_score
-from app.utils.tag_suggestions import suggest_tags
+from app.utils.risk_rescore import register_risk_version, rescore_hosts
+from app.utils.risk_rules import get_rule_engine
+from app.utils.host_risk import record_session_risk, backfill_host_risk
+from app.utils.vuln_index import get_vuln_index, vuln_score
+from app.utils.tag_suggestions import suggest_tags, get_tag_suggester
+from app.utils.oui_vendors import get_oui_index
 import logging
 
 # ----------------------------------------
@@ -36,10 +42,9 @@ if not logger.handlers:
     logger.addHandler(file_handler)
 
 # ----------------------------------------
-# DB path setup (fallback)
+# DB path setup
 # ----------------------------------------
 
-DB_PATH = "nmap_results.db"
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 # ----------------------------------------
@@ -101,19 +106,21 @@ def parse_scripts(port):
 # Database insert
 # ----------------------------------------
 
-def insert_scan_result(session_id, entry, cursor, risk_score=0):
+def insert_scan_result(session_id, entry, cursor, risk_score=0, risk_version=None):
     """Insert parsed host/port/service details into the scan_results table."""
     cursor.execute("""
         INSERT INTO scan_results (
             session_id, ip, hostname, mac_addr, vendor,
             protocol, port, state, service, product,
-            version, os, cpe, uptime, last_boot, script, risk_score
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            version, os, cpe, uptime, last_boot, script, risk_score, risk_version,
+            service_cpe, cve_ids, vuln_score
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         session_id, entry["ip"], entry["hostname"], entry["mac_addr"], entry["vendor"],
         entry["protocol"], entry["port"], entry["state"], entry["service"], entry["product"],
         entry.get("version", ""), entry.get("os", ""), entry.get("cpe", ""),
-        entry.get("uptime", ""), entry.get("last_boot", ""), entry.get("script", ""), risk_score
+        entry.get("uptime", ""), entry.get("last_boot", ""), entry.get("script", ""), risk_score,
+        risk_version, entry.get("service_cpe"), entry.get("cve_ids"), entry.get("vuln_score", 0)
     ))
 
 # ----------------------------------------
@@ -131,6 +138,7 @@ def parse_and_insert(xml_path, log_path=None):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     init_db()
+    backfill_host_risk()  # History of sessions stored before host_risk existed
 
     # Parse XML file
     try:
@@ -162,9 +170,9 @@ def parse_and_insert(xml_path, log_path=None):
     logger.info(f"Inserting scan session: {timestamp}, type={scan_type}, file={xml_path}")
     try:
         cursor.execute("""
-            INSERT INTO scan_sessions (timestamp, scan_type, xml_path, log_path, log_text)
-            VALUES (?, ?, ?, ?, ?)
-        """, (timestamp, scan_type, xml_path, log_path, log_text))
+            INSERT INTO scan_sessions (timestamp, scan_type, xml_path, log_path, log_text, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (timestamp, scan_type, xml_path, log_path, log_text, datetime.now().isoformat(timespec="seconds")))
         session_id = cursor.lastrowid
     except Exception as e:
         logger.error(f"❌ Failed to insert scan session: {e}")
@@ -176,6 +184,15 @@ def parse_and_insert(xml_path, log_path=None):
 
     total_device_tags = 0
     total_service_tags = 0
+    device_tagged = []  # Hosts given a device tag here; their earlier scans are re-scored with it
+    rule_engine = get_rule_engine()
+    rule_rows, rule_ns = rule_engine.rows, rule_engine.nanoseconds
+    risk_version = register_risk_version(cursor, rule_engine)  # Weights + rules every row of this session is scored with
+    vuln_index = get_vuln_index()
+    suggester = get_tag_suggester()
+    oui_index = get_oui_index()
+    oui_filled = 0
+    vuln_lookups, vuln_ns = vuln_index.lookups, vuln_index.nanoseconds
 
     # Loop through all <host> elements in the scan
     for host in root.findall("host"):
@@ -189,6 +206,9 @@ def parse_and_insert(xml_path, log_path=None):
         mac = host.find("address[@addrtype='mac']")
         mac_addr = mac.attrib.get("addr") if mac is not None else None
         vendor = mac.attrib.get("vendor") if mac is not None else None
+        if mac_addr and not vendor:
+            vendor = oui_index.lookup(mac_addr)  # nmap had no prefix entry (or the XML was imported)
+            oui_filled += vendor is not None
 
         # Hostname extraction
         hostnames = host.find("hostnames")
@@ -206,6 +226,7 @@ def parse_and_insert(xml_path, log_path=None):
         session_tags = get_existing_tags(cursor, addr_ip)
         global_tags = get_existing_global_tags(cursor, addr_ip)
         tagged = False
+        host_device_tag = global_tags.get("device") or session_tags.get("device")
 
         ports_elem = host.find("ports")
         port_found = False
@@ -223,23 +244,36 @@ def parse_and_insert(xml_path, log_path=None):
                 service = service_elem.attrib.get("name", "") if service_elem is not None else ""
                 product = service_elem.attrib.get("product", "") if service_elem is not None else ""
                 version = service_elem.attrib.get("version", "") if service_elem is not None else ""
+                service_cpe_elem = service_elem.find("cpe") if service_elem is not None else None
+                service_cpe = service_cpe_elem.text if service_cpe_elem is not None else None
 
                 # Script output (e.g. banners)
                 script_output = parse_scripts(port)
 
                 # Optional: Suggest tags if not already tagged
                 if not tagged:
-                    device_tag, service_tag = suggest_tags(addr_ip, port_id, service, mac_vendor=vendor, os_match=os_match)
+                    device_tag, service_tag = suggest_tags(
+                        addr_ip, port_id, service, mac_vendor=vendor, os_match=os_match, suggester=suggester
+                    )
                     if device_tag and not session_tags.get("device") and not global_tags.get("device"):
                         set_tag(session_id, addr_ip, mac_addr, "device", device_tag, cursor)
                         total_device_tags += 1
+                        host_device_tag = device_tag
+                        device_tagged.append(addr_ip)
                     if service_tag and not session_tags.get("service") and not global_tags.get("service"):
                         set_tag(session_id, addr_ip, mac_addr, "service", service_tag, cursor)
                         total_service_tags += 1
                     tagged = True
 
                 # Risk score computation
-                risk = compute_row_risk_score(port_id, service)
+                risk = compute_row_risk_score(
+                    port_id, service, product, version, script_output, host_device_tag, protocol, state, engine=rule_engine
+                )
+
+                # Known vulnerabilities of the product/version (offline CVE index)
+                cves = vuln_index.match(service_cpe, product, version) if state == "open" else []
+                cve_score = vuln_score(cves)
+                risk += cve_score
                 logger.debug(f"📊 RISK DEBUG: {addr_ip} {port_id}/{service} => {risk}")
 
                 # Assemble entry and insert
@@ -247,10 +281,12 @@ def parse_and_insert(xml_path, log_path=None):
                     "ip": addr_ip, "hostname": hostname, "mac_addr": mac_addr, "vendor": vendor,
                     "protocol": protocol, "port": port_id, "state": state, "service": service,
                     "product": product, "version": version, "os": os_match, "cpe": cpe,
-                    "uptime": uptime, "last_boot": last_boot, "script": script_output
+                    "uptime": uptime, "last_boot": last_boot, "script": script_output,
+                    "service_cpe": service_cpe, "cve_ids": ",".join(cve[0] for cve in cves) or None,
+                    "vuln_score": cve_score
                 }
 
-                insert_scan_result(session_id, entry, cursor, risk_score=risk)
+                insert_scan_result(session_id, entry, cursor, risk_score=risk, risk_version=risk_version)
                 port_found = True
 
         # Fallback entry if no ports were parsed
@@ -261,12 +297,28 @@ def parse_and_insert(xml_path, log_path=None):
                 "service": "All ports filtered or closed", "product": "", "version": "",
                 "os": os_match, "cpe": cpe, "uptime": uptime, "last_boot": last_boot, "script": ""
             }
-            risk = compute_row_risk_score(None, "All ports filtered or closed")
-            insert_scan_result(session_id, entry, cursor, risk_score=risk)
+            risk = compute_row_risk_score(None, "All ports filtered or closed", state="filtered", engine=rule_engine)
+            insert_scan_result(session_id, entry, cursor, risk_score=risk, risk_version=risk_version)
+
+    # Per-host totals for the risk history
+    rescore_hosts(cursor, device_tagged, engine=rule_engine)
+    record_session_risk(cursor, session_id)
 
     conn.commit()
     conn.close()
     logger.info(f"✅ Parsed: {xml_path} | Device tags: {total_device_tags}, Service tags: {total_service_tags}")
+
+    rows = rule_engine.rows - rule_rows
+    if rows:
+        seconds = (rule_engine.nanoseconds - rule_ns) / 1e9
+        logger.info(f"Risk rules: {len(rule_engine.rules)} rules over {rows} rows in {seconds * 1000:.1f} ms "
+                    f"({seconds / rows * 1e6:.2f} µs/row)")
+    lookups = vuln_index.lookups - vuln_lookups
+    if lookups and vuln_index.feed_version is not None:
+        seconds = (vuln_index.nanoseconds - vuln_ns) / 1e9
+        logger.info(f"CVE index: {lookups} lookups in {seconds * 1000:.1f} ms ({seconds / lookups * 1e6:.2f} µs/lookup)")
+    if oui_filled:
+        logger.info(f"OUI: filled the vendor of {oui_filled} hosts from their MAC prefix")
     return session_id
 
 # ----------------------------------------
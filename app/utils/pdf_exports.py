@@ -0,0 +1,212 @@
+# app/utils/pdf_exports.py
+# ---------------------
+# Background PDF export jobs with an on-disk, size-limited LRU cache
+# ---------------------
+#
+# The cache directory is the single source of truth so every gunicorn worker
+# sees the same job state:
+#   <key>.pdf       finished export (served as a static file)
+#   <key>.pdf.part  render in progress (created with O_EXCL = job claim)
+#   <key>.err       last failure message
+# The key contains the session id and its version counter, so tag edits
+# produce a new file and old ones age out of the LRU.
+#
+# Pool threads only gather rows and render the template; WeasyPrint runs in
+# a separate process (pdf_render.py), as gevent workers would otherwise
+# block on the CPU-bound render.
+
+import os
+import sys
+import time
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import render_template
+
+from app.config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_MB, PDF_EXPORT_WORKERS, PDF_EXPORT_TIMEOUT
+from app.utils.db_utils import get_export_rows, get_session_versions
+from app.utils.custom_logging import export_logger
+
+_executor = ThreadPoolExecutor(max_workers=PDF_EXPORT_WORKERS, thread_name_prefix="pdf-export")
+_RENDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_render.py")
+
+
+# ---------------------
+#  Cache paths
+# ---------------------
+def cache_key(session_id):
+    """
+    Cache key for a session's current version, or None if the session is gone.
+    updated_at is hashed in so a reused session id never matches an old file.
+    """
+    versions = get_session_versions([session_id])
+    if session_id not in versions:
+        return None
+    version, updated_at = versions[session_id]
+    stamp = hashlib.sha1(str(updated_at).encode()).hexdigest()[:8]
+    return f"scan_{session_id}_v{version}_{stamp}"
+
+
+def _paths(key):
+    base = os.path.join(EXPORT_CACHE_DIR, key)
+    return base + ".pdf", base + ".pdf.part", base + ".err"
+
+
+# ---------------------
+#  Job status
+# ---------------------
+def get_export_status(session_id):
+    """
+    Current export state for a session.
+    Returns: dict with 'state' in {'ready', 'running', 'failed', 'missing', 'not_found'}
+             plus 'path' (when ready) and 'error' (when failed).
+    """
+    key = cache_key(session_id)
+    if key is None:
+        return {"state": "not_found"}
+
+    pdf_path, part_path, err_path = _paths(key)
+
+    if os.path.exists(pdf_path):
+        return {"state": "ready", "path": pdf_path}
+
+    if os.path.exists(part_path):
+        age = time.time() - os.path.getmtime(part_path)
+        if age < PDF_EXPORT_TIMEOUT:
+            return {"state": "running"}
+        # Worker died mid-render: drop the stale claim so the job can be retried
+        _remove_quietly(part_path)
+
+    if os.path.exists(err_path):
+        with open(err_path, "r", encoding="utf-8") as f:
+            return {"state": "failed", "error": f.read()}
+
+    return {"state": "missing"}
+
+
+def start_export(app, session_id, retry_failed=False):
+    """
+    Ensure a PDF export for the session is ready or being rendered.
+
+    Args:
+        app: Flask app (templates are rendered inside its app context)
+        retry_failed: clear a previous failure and try again
+    Returns: status dict (see get_export_status)
+    """
+    status = get_export_status(session_id)
+    if status["state"] == "failed" and retry_failed:
+        _remove_quietly(_paths(cache_key(session_id))[2])
+        status = {"state": "missing"}
+
+    if status["state"] != "missing":
+        return status
+
+    key = cache_key(session_id)
+    pdf_path, part_path, err_path = _paths(key)
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+
+    # Atomic claim: only one worker/process renders a given key
+    try:
+        fd = os.open(part_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+    except FileExistsError:
+        return {"state": "running"}
+
+    export_logger.info(f"Queued PDF export for session {session_id} ({key})")
+    _executor.submit(_render_job, app, session_id, pdf_path, part_path, err_path)
+    return {"state": "running"}
+
+
+def touch(path):
+    """Mark a cached PDF as recently used (LRU order is by mtime)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+# ---------------------
+#  Background render
+# ---------------------
+def _render_job(app, session_id, pdf_path, part_path, err_path):
+    started = time.time()
+    try:
+        rows = get_export_rows(session_id)
+        export_logger.info(f"Retrieved {len(rows)} rows for session {session_id}")
+
+        with app.app_context():
+            rendered = render_template(
+                "export_pdf.html",
+                session_id=session_id,
+                rows=rows,
+                datetime_now=datetime.now().strftime("%Y-%m-%d %H:%M")
+            )
+        export_logger.info("HTML rendered for PDF export")
+
+        # Render into the claim file in a separate process, then publish with an atomic rename
+        result = subprocess.run(
+            [sys.executable, _RENDER_SCRIPT, part_path],
+            input=rendered.encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=PDF_EXPORT_TIMEOUT,
+        )
+        if result.returncode != 0:
+            lines = result.stderr.decode("utf-8", errors="replace").strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"PDF renderer exited with code {result.returncode}")
+        os.replace(part_path, pdf_path)
+        _remove_quietly(err_path)
+        export_logger.info(f"✅ PDF generation complete for session {session_id} in {time.time() - started:.1f}s")
+
+        prune_cache()
+
+    except Exception as e:
+        export_logger.exception(f"❌ PDF export failed for session {session_id}: {e}")
+        with open(err_path, "w", encoding="utf-8") as f:
+            f.write(str(e))
+        _remove_quietly(part_path)
+
+
+# ---------------------
+#  LRU size limit
+# ---------------------
+def prune_cache(max_bytes=None):
+    """
+    Delete least-recently-used PDFs until the cache fits in EXPORT_CACHE_MAX_MB.
+    Returns: number of files removed.
+    """
+    max_bytes = EXPORT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    if not os.path.isdir(EXPORT_CACHE_DIR):
+        return 0
+
+    entries = []
+    for name in os.listdir(EXPORT_CACHE_DIR):
+        if not name.endswith(".pdf"):
+            continue
+        path = os.path.join(EXPORT_CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove_quietly(path)
+        total -= size
+        removed += 1
+
+    if removed:
+        export_logger.info(f"Pruned {removed} cached PDF(s) from export cache")
+    return removed
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,27 @@
+# app/utils/pdf_render.py
+# ---------------------
+# PDF render worker: report HTML on stdin -> PDF file, run as its own process
+# ---------------------
+#
+# WeasyPrint is CPU-bound. Under gunicorn's gevent workers a thread is a
+# greenlet, so rendering in-process would stall every request of the worker;
+# pdf_exports runs this script as a subprocess instead (like upload_xml runs
+# parse2_nmap). Only WeasyPrint is imported, not the app.
+#
+# Usage: python app/utils/pdf_render.py <output.pdf> < report.html
+
+import sys
+
+from weasyprint import HTML
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python pdf_render.py <output.pdf> < report.html", file=sys.stderr)
+        sys.exit(2)
+    html = sys.stdin.buffer.read().decode("utf-8")
+    HTML(string=html).write_pdf(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
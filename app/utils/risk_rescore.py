@@ -0,0 +1,282 @@
+# app/utils/risk_rescore.py
+# ---------------------
+# Versioned risk weights and set-based re-scoring of stored results
+# ---------------------
+#
+# risk_score is computed once per row at ingest. Each row also records the
+# risk_version it was scored with; a version is a fingerprint of
+# PORT_RISK_WEIGHTS + SERVICE_RISK_WEIGHTS + VULN_RISK_WEIGHTS + the risk
+# rules, registered in risk_versions. When they change, rescore_results()
+# copies the weights into lookup tables and recomputes every stale row with
+# one UPDATE per id range, so SQLite does the weight part (indexed lookups,
+# no Python per row). Only rows with stored CVE matches (vuln_score from the
+# severities in cves) and rows a rule could match (the engine's candidate
+# filter) go through Python.
+#
+# Rules can match on a host's device tag, so a tag change re-scores that
+# host's rows in every session with rescore_hosts().
+
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+from datetime import datetime
+
+from app.config import DB_PATH
+from app.utils.risk_utils import PORT_RISK_WEIGHTS, SERVICE_RISK_WEIGHTS, VULN_RISK_WEIGHTS, compute_row_risk_score
+from app.utils.risk_rules import get_rule_engine
+from app.utils.db_utils import bump_session_versions
+from app.utils.host_risk import record_session_risk
+from app.utils.vuln_index import vuln_score
+
+logger = logging.getLogger(__name__)
+
+RESCORE_BATCH_ROWS = 200_000  # rows per transaction (keeps write locks short)
+
+#  Weight part of the row score: 1 + port weight + service weight + CVE score (recomputed first; rules are added in Python)
+ROW_SCORE_SQL = """
+    1
+    + COALESCE((SELECT weight FROM risk_port_weights w WHERE w.port = scan_results.port), 0)
+    + COALESCE((SELECT weight FROM risk_service_weights w WHERE w.service = LOWER(TRIM(scan_results.service))), 0)
+    + COALESCE(scan_results.vuln_score, 0)
+"""
+
+
+def weights_fingerprint(engine=None):
+    """Stable hash of the current weight tables and risk rules."""
+    payload = json.dumps({
+        "ports": sorted(PORT_RISK_WEIGHTS.items()),
+        "services": sorted((name.lower(), weight) for name, weight in SERVICE_RISK_WEIGHTS.items()),
+        "vulns": sorted(VULN_RISK_WEIGHTS.items()),
+        "rules": (engine or get_rule_engine()).fingerprint,
+    })
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def register_risk_version(cursor, engine=None):
+    """
+    Version id of the current weights and rules, registered on first use.
+    Uses the caller's cursor so it commits with the rows scored under it.
+    Returns: int
+    """
+    engine = engine or get_rule_engine()
+    fingerprint = weights_fingerprint(engine)
+    cursor.execute("SELECT id FROM risk_versions WHERE fingerprint = ?", (fingerprint,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    cursor.execute("""
+        INSERT INTO risk_versions (fingerprint, weights, created_at) VALUES (?, ?, ?)
+    """, (
+        fingerprint,
+        json.dumps({
+            "ports": PORT_RISK_WEIGHTS, "services": SERVICE_RISK_WEIGHTS, "vulns": VULN_RISK_WEIGHTS,
+            "rules": engine.fingerprint
+        }, sort_keys=True),
+        datetime.now().isoformat(timespec="seconds")
+    ))
+    return cursor.lastrowid
+
+
+def _load_weight_tables(cursor):
+    cursor.execute("DELETE FROM risk_port_weights")
+    cursor.executemany(
+        "INSERT INTO risk_port_weights (port, weight) VALUES (?, ?)", PORT_RISK_WEIGHTS.items()
+    )
+    cursor.execute("DELETE FROM risk_service_weights")
+    cursor.executemany(
+        "INSERT OR REPLACE INTO risk_service_weights (service, weight) VALUES (?, ?)",
+        ((name.strip().lower(), weight) for name, weight in SERVICE_RISK_WEIGHTS.items())
+    )
+
+
+def _load_device_tags(cursor, ips=None):
+    """Device tag lookup for rules: global tags by IP, then session tags by (session, IP); optionally only these IPs."""
+    ip_filter = f"AND ip IN ({', '.join('?' for _ in ips)})" if ips is not None else ""
+    params = tuple(ips or ())
+    cursor.execute(f"""
+        SELECT ip, device_tag FROM global_tags WHERE device_tag IS NOT NULL AND device_tag != '' {ip_filter}
+    """, params)
+    global_tags = dict(cursor.fetchall())
+    cursor.execute(f"""
+        SELECT session_id, ip, tag_value FROM tags WHERE tag_type = 'device' AND tag_value != '' {ip_filter}
+    """, params)
+    session_tags = {(session_id, ip): tag for session_id, ip, tag in cursor.fetchall()}
+    return global_tags, session_tags
+
+
+def _stored_cves(cursor, cve_ids, known):
+    """(cve, cvss, severity) of a row's stored CVE ids, read from cves once per id and cached in known."""
+    ids = [cve_id for cve_id in cve_ids.split(",") if cve_id]
+    missing = [cve_id for cve_id in ids if cve_id not in known]
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        cursor.execute(
+            f"SELECT cve_id, cvss, severity FROM cves WHERE cve_id IN ({', '.join('?' for _ in chunk)})", chunk
+        )
+        for cve_id, cvss, severity in cursor.fetchall():
+            known[cve_id] = (cve_id, cvss, severity)
+        for cve_id in chunk:
+            known.setdefault(cve_id, None)  # No longer in the index: adds nothing
+    return [known[cve_id] for cve_id in ids if known[cve_id]]
+
+
+def rescore_hosts(cursor, ips, engine=None):
+    """
+    Re-score every stored row of these IPs after their device tag changed,
+    so rules with a device_tag condition match the new tag (as the risk
+    reasons do), and rebuild host risk of the sessions whose scores moved.
+    Rows keep their risk_version: stale rows are still left to rescore_results().
+    Uses the caller's cursor so it commits with the tag change.
+    Returns: number of rows whose score changed
+    """
+    engine = engine or get_rule_engine()
+    ips = sorted({ip for ip in ips if ip})
+    if not ips or not engine.uses_device_tags:
+        return 0  # Device tags cannot change any score
+
+    updates, sessions = [], set()
+    for start in range(0, len(ips), 500):
+        chunk = ips[start:start + 500]
+        global_tags, session_tags = _load_device_tags(cursor, chunk)
+        cursor.execute(f"""
+            SELECT id, session_id, ip, port, service, product, version, script, protocol, state,
+                   COALESCE(vuln_score, 0), risk_score
+            FROM scan_results
+            WHERE ip IN ({', '.join('?' for _ in chunk)})
+        """, chunk)
+        for row_id, session_id, ip, port, service, product, row_version, script, protocol, state, cve_score, old_score \
+                in cursor.fetchall():
+            device_tag = global_tags.get(ip) or session_tags.get((session_id, ip))
+            score = compute_row_risk_score(
+                port, service, product, row_version, script, device_tag, protocol, state, engine=engine
+            ) + cve_score
+            if score != old_score:
+                updates.append((score, row_id))
+                sessions.add(session_id)
+
+    cursor.executemany("UPDATE scan_results SET risk_score = ? WHERE id = ?", updates)
+    for session_id in sorted(sessions):
+        bump_session_versions(cursor, session_id=session_id)
+        record_session_risk(cursor, session_id)
+    return len(updates)
+
+
+def stale_row_count(cursor=None):
+    """Rows scored with other weights than the current ones (or never versioned)."""
+    own = cursor is None
+    conn = sqlite3.connect(DB_PATH) if own else None
+    cursor = conn.cursor() if own else cursor
+    cursor.execute("SELECT id FROM risk_versions WHERE fingerprint = ?", (weights_fingerprint(),))
+    row = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*) FROM scan_results WHERE risk_version IS NOT ?", (row[0] if row else None,))
+    count = cursor.fetchone()[0]
+    if own:
+        conn.close()
+    return count
+
+
+def rescore_results(force=False, batch_rows=RESCORE_BATCH_ROWS, progress=None):
+    """
+    Recompute risk_score for every row not scored with the current weights
+    and rules (all rows with force=True), batch by batch over id ranges.
+
+    Args:
+        progress: optional callback(rows_done, rows_total)
+    Returns: dict with version, rows, sessions, seconds, rows_per_minute,
+             rule_rows (rows run through the rules) and rule_us_per_row
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    cursor = conn.cursor()
+
+    engine = get_rule_engine()
+    version = register_risk_version(cursor, engine)
+    _load_weight_tables(cursor)
+    conn.commit()
+
+    candidates = engine.candidate_filter()
+    global_tags, session_tags = _load_device_tags(cursor) if engine.uses_device_tags else ({}, {})
+    rule_rows, rule_ns = engine.rows, engine.nanoseconds
+
+    stale = "1" if force else "risk_version IS NOT ?"
+    stale_params = () if force else (version,)
+    cursor.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM scan_results WHERE {stale}", stale_params)
+    total, first_id, last_id = cursor.fetchone()
+
+    done = 0
+    sessions = set()
+    known_cves = {}
+    if total:
+        for low in range(first_id, last_id + 1, batch_rows):
+            high = low + batch_rows - 1
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT DISTINCT session_id FROM scan_results
+                WHERE id BETWEEN ? AND ? AND {stale}
+            """, (low, high) + stale_params)
+            batch_sessions = {row[0] for row in cursor.fetchall()}
+
+            #  CVE part from the stored matches under the current VULN_RISK_WEIGHTS (ROW_SCORE_SQL adds it)
+            cursor.execute(f"""
+                SELECT id, cve_ids FROM scan_results
+                WHERE id BETWEEN ? AND ? AND {stale} AND COALESCE(cve_ids, '') != ''
+            """, (low, high) + stale_params)
+            vuln_scores = [
+                (vuln_score(_stored_cves(cursor, cve_ids, known_cves)), row_id)
+                for row_id, cve_ids in cursor.fetchall()
+            ]
+            cursor.executemany("UPDATE scan_results SET vuln_score = ? WHERE id = ?", vuln_scores)
+
+            #  Rule bonuses for the rows a rule could match (read before the UPDATE marks them current)
+            bonuses = []
+            if candidates:
+                where, params = candidates
+                cursor.execute(f"""
+                    SELECT id, session_id, ip, port, service, product, version, script, protocol, state
+                    FROM scan_results
+                    WHERE id BETWEEN ? AND ? AND {stale} AND {where}
+                """, (low, high) + stale_params + params)
+                for row_id, session_id, ip, port, service, product, row_version, script, protocol, state in cursor.fetchall():
+                    device_tag = global_tags.get(ip) or session_tags.get((session_id, ip))
+                    bonus = engine.score(port, service, product, row_version, script, device_tag, protocol, state)
+                    if bonus:
+                        bonuses.append((bonus, row_id))
+
+            cursor.execute(f"""
+                UPDATE scan_results SET risk_score = {ROW_SCORE_SQL}, risk_version = ?
+                WHERE id BETWEEN ? AND ? AND {stale}
+            """, (version, low, high) + stale_params)
+            done += cursor.rowcount
+            cursor.executemany("UPDATE scan_results SET risk_score = risk_score + ? WHERE id = ?", bonuses)
+
+            #  Cached pages and PDFs of these sessions show the old scores
+            for session_id in batch_sessions - sessions:
+                bump_session_versions(cursor, session_id=session_id)
+            sessions |= batch_sessions
+            conn.commit()
+            if progress:
+                progress(done, total)
+
+    #  Host totals of the re-scored sessions, oldest first so each links to an up-to-date predecessor
+    cursor.execute("SELECT id FROM scan_sessions")
+    for session_id in sorted(sessions & {row[0] for row in cursor.fetchall()}):
+        record_session_risk(cursor, session_id)
+    conn.commit()
+
+    conn.close()
+    seconds = time.perf_counter() - started
+    rule_rows, rule_ns = engine.rows - rule_rows, engine.nanoseconds - rule_ns
+    stats = {
+        "version": version,
+        "rows": done,
+        "sessions": len(sessions),
+        "seconds": round(seconds, 2),
+        "rows_per_minute": int(done / seconds * 60) if seconds > 0 else 0,
+        "rule_rows": rule_rows,
+        "rule_us_per_row": round(rule_ns / rule_rows / 1000, 2) if rule_rows else None,
+    }
+    logger.info(f"Re-scored {done} rows in {len(sessions)} sessions with risk weights v{version} "
+                f"({stats['rows_per_minute']:,} rows/min; {rule_rows} rows through risk rules)")
+    return stats
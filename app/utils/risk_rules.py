@@ -0,0 +1,308 @@
+# app/utils/risk_rules.py
+# ---------------------
+# Declarative risk rules compiled into lookup tables
+# ---------------------
+#
+# Rules are loaded from RISK_RULES_FILE (JSON) and add to the port/service
+# weight score of a result row, e.g. "telnet open on a host tagged Gateway",
+# "OpenSSH older than 7.7" or "NSE script reports State: VULNERABLE":
+#
+#   {"rules": [{"id": "...", "description": "...", "score": 5,
+#               "when": {"service": "telnet", "device_tag": ["Gateway", "Router"]}}]}
+#
+# Conditions (all must hold; lists mean "any of"):
+#   port, protocol, service, product, state (default "open"), device_tag,
+#   version_below / version_at_least (numeric compare, "7.4p1" -> 7.4.1),
+#   script_contains (case-insensitive substring of the NSE output)
+#
+# Each rule is indexed under one condition it requires (port, product,
+# service or script text), so a row only checks the rules its own port,
+# product and service point at. Script rules share one compiled regex that
+# is tried first; most rows have no match and skip them entirely.
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+
+from app.config import RISK_RULES_FILE
+from app.utils.config_reload import ReloadableConfig
+
+logger = logging.getLogger(__name__)
+
+CONDITION_KEYS = (
+    "port", "protocol", "service", "product", "state", "device_tag",
+    "version_below", "version_at_least", "script_contains"
+)
+VERSION_RE = re.compile(r"\d+")
+
+
+class RiskRuleError(ValueError):
+    """Raised when the rule file is unreadable or fails validation (all problems listed)."""
+
+
+def version_key(text):
+    """Comparable version tuple: "2.4.29" -> (2, 4, 29), "8.9p1" -> (8, 9, 1); None if no digits."""
+    parts = VERSION_RE.findall(text or "")
+    return tuple(int(part) for part in parts[:4]) if parts else None
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+# ---------------------
+#  Compiled rules
+# ---------------------
+class _Rule:
+    __slots__ = (
+        "id", "description", "score", "ports", "protocols", "services", "products", "states",
+        "device_tags", "below", "at_least", "needles"
+    )
+
+    def __init__(self, rule):
+        when = rule["when"]
+
+        def lowered(key):
+            return frozenset(str(v).strip().lower() for v in _as_list(when[key])) if key in when else None
+
+        self.id = rule["id"]
+        self.description = rule.get("description") or rule["id"]
+        self.score = rule["score"]
+        self.ports = frozenset(_as_list(when["port"])) if "port" in when else None
+        self.protocols = lowered("protocol")
+        self.services = lowered("service")
+        self.products = lowered("product")
+        self.states = lowered("state") if "state" in when else frozenset(["open"])
+        self.device_tags = lowered("device_tag")
+        self.below = version_key(when["version_below"]) if "version_below" in when else None
+        self.at_least = version_key(when["version_at_least"]) if "version_at_least" in when else None
+        self.needles = tuple(lowered("script_contains")) if "script_contains" in when else None
+
+    def matches(self, port, protocol, service, product, version, script_lower, device_tag, state):
+        if self.ports is not None and port not in self.ports:
+            return False
+        if self.states is not None and state not in self.states:
+            return False
+        if self.protocols is not None and protocol not in self.protocols:
+            return False
+        if self.services is not None and service not in self.services:
+            return False
+        if self.products is not None and product not in self.products:
+            return False
+        if self.device_tags is not None and device_tag not in self.device_tags:
+            return False
+        if self.below is not None or self.at_least is not None:
+            key = version_key(version)
+            if key is None:
+                return False  # Unknown version: no version-based verdict
+            if self.below is not None and key >= self.below:
+                return False
+            if self.at_least is not None and key < self.at_least:
+                return False
+        if self.needles is not None and not any(needle in script_lower for needle in self.needles):
+            return False
+        return True
+
+
+class RuleEngine:
+    """
+    Rules compiled into dict lookups by port, product and service, plus one
+    regex prefilter for script-text rules. Counts rows evaluated and time spent.
+    """
+
+    def __init__(self, rules=(), fingerprint="none"):
+        self.rules = [_Rule(rule) for rule in rules]
+        self.fingerprint = fingerprint
+        self.by_port, self.by_product, self.by_service = {}, {}, {}
+        self.script_rules, self.generic = [], []
+
+        for rule in self.rules:
+            if rule.ports is not None:
+                for port in rule.ports:
+                    self.by_port.setdefault(port, []).append(rule)
+            elif rule.products is not None:
+                for product in rule.products:
+                    self.by_product.setdefault(product, []).append(rule)
+            elif rule.services is not None:
+                for service in rule.services:
+                    self.by_service.setdefault(service, []).append(rule)
+            elif rule.needles is not None:
+                self.script_rules.append(rule)
+            else:
+                self.generic.append(rule)
+
+        needles = sorted({needle for rule in self.script_rules for needle in rule.needles}, key=len, reverse=True)
+        self.script_re = re.compile("|".join(re.escape(n) for n in needles), re.IGNORECASE) if needles else None
+        self.uses_device_tags = any(rule.device_tags is not None for rule in self.rules)
+        self.rows = 0
+        self.nanoseconds = 0
+
+    def evaluate(self, port, service, product="", version="", script="", device_tag=None, protocol="", state="open"):
+        """
+        Rules matching one result row.
+        Returns: (score bonus, list of matched rules)
+        """
+        started = time.perf_counter_ns()
+        service = (service or "").strip().lower()
+        product = (product or "").strip().lower()
+        protocol = (protocol or "").lower()
+        state = (state or "").lower()
+        device_tag = (device_tag or "").strip().lower() or None
+
+        candidates = []
+        if port in self.by_port:
+            candidates += self.by_port[port]
+        if product in self.by_product:
+            candidates += self.by_product[product]
+        if service in self.by_service:
+            candidates += self.by_service[service]
+        if script and self.script_re is not None and self.script_re.search(script):
+            candidates += self.script_rules
+        candidates += self.generic
+
+        matched = []
+        if candidates:
+            script_lower = (script or "").lower()
+            matched = [
+                rule for rule in candidates
+                if rule.matches(port, protocol, service, product, version, script_lower, device_tag, state)
+            ]
+
+        self.rows += 1
+        self.nanoseconds += time.perf_counter_ns() - started
+        return sum(rule.score for rule in matched), matched
+
+    def score(self, *args, **kwargs):
+        return self.evaluate(*args, **kwargs)[0]
+
+    def stats(self):
+        """Returns: dict with rules, rows evaluated, seconds and microseconds per row"""
+        return {
+            "rules": len(self.rules),
+            "rows": self.rows,
+            "seconds": round(self.nanoseconds / 1e9, 4),
+            "us_per_row": round(self.nanoseconds / self.rows / 1000, 2) if self.rows else None,
+        }
+
+    def candidate_filter(self):
+        """
+        SQL WHERE clause selecting every scan_results row a rule could match
+        (each rule requires its index key). Returns: (sql, params) or None if there are no rules.
+        """
+        if not self.rules:
+            return None
+        if self.generic:
+            return "1", ()
+        parts, params = [], []
+        if self.by_port:
+            parts.append(f"port IN ({', '.join('?' for _ in self.by_port)})")
+            params += list(self.by_port)
+        if self.by_product:
+            parts.append(f"LOWER(TRIM(product)) IN ({', '.join('?' for _ in self.by_product)})")
+            params += list(self.by_product)
+        if self.by_service:
+            parts.append(f"LOWER(TRIM(service)) IN ({', '.join('?' for _ in self.by_service)})")
+            params += list(self.by_service)
+        for needle in sorted({needle for rule in self.script_rules for needle in rule.needles}):
+            parts.append("script LIKE ?")  # LIKE is case-insensitive for ASCII
+            params.append(f"%{needle}%")
+        return "(" + " OR ".join(parts) + ")", tuple(params)
+
+
+# ---------------------
+#  Loading + validation
+# ---------------------
+def load_rules(path):
+    """Read and compile a rule file. A missing file means no rules. Raises RiskRuleError."""
+    if not os.path.exists(path):
+        return RuleEngine()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RiskRuleError(f"Cannot read {path}: {e}")
+    return compile_rules(data)
+
+
+def compile_rules(data):
+    """Validate {"rules": [...]} and compile it. Raises RiskRuleError listing every problem."""
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise RiskRuleError('Expected {"rules": [{"id": ..., "when": {...}, "score": N}, ...]}')
+
+    errors = []
+    seen = set()
+    for index, rule in enumerate(data["rules"]):
+        where = f"rule #{index + 1}"
+        if not isinstance(rule, dict):
+            errors.append(f"{where}: must be an object")
+            continue
+        if not isinstance(rule.get("id"), str) or not rule["id"]:
+            errors.append(f"{where}: 'id' must be a non-empty string")
+        else:
+            where = f"rule '{rule['id']}'"
+            if rule["id"] in seen:
+                errors.append(f"{where}: duplicate id")
+            seen.add(rule["id"])
+
+        unknown = set(rule) - {"id", "description", "when", "score"}
+        if unknown:
+            errors.append(f"{where}: unknown keys {sorted(unknown)}")
+        score = rule.get("score")
+        if isinstance(score, bool) or not isinstance(score, int):
+            errors.append(f"{where}: 'score' must be an integer")
+
+        when = rule.get("when")
+        if not isinstance(when, dict) or not when:
+            errors.append(f"{where}: 'when' must be an object with at least one condition")
+            continue
+        unknown = set(when) - set(CONDITION_KEYS)
+        if unknown:
+            errors.append(f"{where}: unknown conditions {sorted(unknown)}")
+        if set(when) <= {"state"}:
+            errors.append(f"{where}: needs a condition besides 'state'")
+
+        if "port" in when:
+            ports = _as_list(when["port"])
+            if not ports or not all(isinstance(p, int) and not isinstance(p, bool) and 0 <= p <= 65535 for p in ports):
+                errors.append(f"{where}: 'port' must be a port number or a list of them")
+        for key in ("protocol", "service", "product", "state", "device_tag", "script_contains"):
+            if key in when:
+                values = _as_list(when[key])
+                if not values or not all(isinstance(v, str) and v.strip() for v in values):
+                    errors.append(f"{where}: '{key}' must be a string or a list of strings")
+        for key in ("version_below", "version_at_least"):
+            if key in when and (not isinstance(when[key], str) or version_key(when[key]) is None):
+                errors.append(f"{where}: '{key}' must be a version string like '7.4'")
+
+    if errors:
+        raise RiskRuleError("; ".join(errors))
+    fingerprint = hashlib.sha1(json.dumps(data["rules"], sort_keys=True).encode()).hexdigest()[:16]
+    return RuleEngine(data["rules"], fingerprint)
+
+
+# ---------------------
+#  Registry access
+# ---------------------
+_rules = ReloadableConfig(
+    RISK_RULES_FILE, load_rules, RiskRuleError, RuleEngine(), "risk rule file",
+    lambda engine: f"{len(engine.rules)} risk rules"
+)
+
+
+def get_rule_engine():
+    """Current compiled rules, reloading the file first if it changed (see config_reload)."""
+    return _rules.get()
+
+
+def rule_status():
+    """Returns: dict with 'path', 'loaded_at', the last load 'error' (or None) and engine stats."""
+    engine = _rules.get()
+    return {**_rules.status, **engine.stats()}
+
+
+def reload_if_changed(path=None):
+    """Reload the rule file if its mtime/size changed. Returns: True if rules were replaced."""
+    return _rules.reload_if_changed(path)
@@ -4,11 +4,13 @@
  Risk analysis utilities for Nmap scan results.
 
 This module defines scoring weights for services and ports,
-and computes a total risk score per host based on open ports and services.
+scores result rows, and aggregates the stored row scores per host.
+Rules from risk_rules (e.g. "telnet on a gateway") add to the weight score.
 """
 
 import sqlite3
 from app.config import DB_PATH
+from app.utils.risk_rules import get_rule_engine
 
 # ----------------------------------------
 #  Risk Weight Definitions
@@ -44,81 +46,143 @@ PORT_RISK_WEIGHTS = {
     445: 3      # SMB
 }
 
+#  Risk added for known vulnerabilities of a port's product/version (worst CVE severity, see vuln_index)
+VULN_RISK_WEIGHTS = {
+    "CRITICAL": 5,
+    "HIGH": 3,
+    "MEDIUM": 1,
+    "LOW": 0
+}
+
 #  Exportable combined dictionary for access
 RISK_WEIGHTS = {
     'ports': PORT_RISK_WEIGHTS,
-    'services': SERVICE_RISK_WEIGHTS
+    'services': SERVICE_RISK_WEIGHTS,
+    'vulnerabilities': VULN_RISK_WEIGHTS
 }
 
 # ----------------------------------------
 #  Risk Computation Logic
 # ----------------------------------------
 
-def compute_host_risk_and_reasons(cursor_or_session_id, session_id=None, ip=None):
+class SessionRisk:
+    """
+       Per-host risk of one session: totals plus each host's top contributing
+    open ports, loaded by get_session_risk(). Reason strings are built on
+    first use per host, so only displayed hosts pay for them.
+    """
+
+    def __init__(self, totals, factors, device_tags=None):
+        self.totals = totals     #  IP → total risk score (all rows, as stored)
+        self.factors = factors   #  IP → [(port, service, product, version, script, protocol, cve_ids, vuln_score, score)]
+        self.device_tags = device_tags or {}
+        self._reasons = {}
+
+    def highest(self):
+        """Returns: (ip, total) of the riskiest host, or (None, None) for an empty session"""
+        if not self.totals:
+            return None, None
+        ip = max(self.totals, key=lambda host: (self.totals[host], host))
+        return ip, self.totals[ip]
+
+    def reasons(self, ip):
+        """Explanation strings for one host's top factors (cached)."""
+        if ip not in self._reasons:
+            engine = get_rule_engine()
+            reasons = []
+            device_tag = self.device_tags.get(ip)
+            for port, service, product, version, script, protocol, cve_ids, vuln_score, score in self.factors.get(ip, ()):
+                service = (service or "").strip().lower()
+                port_score = PORT_RISK_WEIGHTS.get(port, 0)
+                service_score = SERVICE_RISK_WEIGHTS.get(service, 0)
+                _bonus, rules = engine.evaluate(port, service, product, version, script, device_tag, protocol)
+                reason = f"Port {port} (+{port_score}), Service '{service}' (+{service_score})"
+                reason += "".join(f", {rule.description} (+{rule.score})" for rule in rules)
+                if cve_ids:
+                    ids = cve_ids.split(",")
+                    more = f" and {len(ids) - 3} more" if len(ids) > 3 else ""
+                    reason += f", {', '.join(ids[:3])}{more} (+{vuln_score or 0})"
+                reasons.append(f"{reason} = {score}")
+            self._reasons[ip] = reasons
+        return self._reasons[ip]
+
+
+def get_session_risk(session_id, ip=None, top=3, cursor=None):
     """
-       Compute the risk score for a single host (if IP is provided) or all hosts in a session.
+       Per-host risk totals and top contributing factors of a session, from one
+    grouped query over the stored row scores. Pass the caller's cursor to
+    reuse its connection.
 
     Args:
-        cursor_or_session_id (Union[cursor, int]):
-            - If ip is provided: treat this as DB cursor, use session_id + ip
-            - If ip is None: treat this as session_id
-
-        session_id (int): Required if passing a cursor
-        ip (str): Optional. Target specific host
+        ip (str): Optional. Only this host
+        top (int): Open ports kept per host as factors, highest score first
 
     Returns:
-        Tuple:
-            - risk_by_host (dict): { ip: total_risk_score }
-            - reasons_by_host (dict): { ip: [explanation strings] }
+        SessionRisk
     """
-    
-    if ip is not None:
-        #  Direct cursor usage mode
-        cursor = cursor_or_session_id
-        cursor.execute("""
-            SELECT ip, port, service
+    own = cursor is None
+    conn = sqlite3.connect(DB_PATH) if own else None
+    cursor = conn.cursor() if own else cursor
+
+    ip_filter = "AND ip = ?" if ip is not None else ""
+    params = (session_id,) + ((ip,) if ip is not None else ())
+    #  Each host's rank-1 row carries its total; open rows ranked within top are its factors
+    cursor.execute(f"""
+        SELECT ip, total, is_open, port, service, product, version, script, protocol, cve_ids, vuln_score, risk_score
+        FROM (
+            SELECT ip, port, service, product, version, script, protocol, cve_ids, vuln_score, risk_score,
+                   state = 'open' AS is_open,
+                   SUM(risk_score) OVER (PARTITION BY ip) AS total,
+                   ROW_NUMBER() OVER (PARTITION BY ip ORDER BY state = 'open' DESC, risk_score DESC, port) AS rank
             FROM scan_results
-            WHERE session_id = ? AND ip = ? AND state = 'open'
-        """, (session_id, ip))
-        rows = cursor.fetchall()
-    else:
-        #  Legacy session-only mode
-        session_id = cursor_or_session_id
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT ip, port, service
-            FROM scan_results
-            WHERE session_id = ? AND state = 'open'
-        """, (session_id,))
-        rows = cursor.fetchall()
+            WHERE session_id = ? {ip_filter}
+        )
+        WHERE rank <= ?
+    """, params + (max(top, 1),))
+    rows = cursor.fetchall()
+    device_tags = get_device_tags(cursor, session_id, ip) if get_rule_engine().uses_device_tags else {}
+    if own:
         conn.close()
 
-    risk_by_host = {}     #  IP → cumulative score
-    reasons_by_host = {}  #  IP → list of reason strings
-
-    for row_ip, port, service in rows:
-        service = (service or "").lower()
-        port_score = PORT_RISK_WEIGHTS.get(port, 0)
-        service_score = SERVICE_RISK_WEIGHTS.get(service, 0)
-        total_score = 1 + port_score + service_score  # ✅ Always include base score of 1
+    totals, factors = {}, {}
+    for row_ip, total, is_open, *factor in rows:
+        totals[row_ip] = total
+        if is_open and top > 0:
+            factors.setdefault(row_ip, []).append(tuple(factor))
+    return SessionRisk(totals, factors, device_tags)
 
-        risk_by_host[row_ip] = risk_by_host.get(row_ip, 0) + total_score
-        reason = f"Port {port} (+{port_score}), Service '{service}' (+{service_score})"
-        reasons_by_host.setdefault(row_ip, []).append(reason)
 
-    return risk_by_host, reasons_by_host
+def get_device_tags(cursor, session_id, ip=None):
+    """
+       Device tag per IP as risk rules see it: the global tag, else the session's tag.
+    Returns: { ip: device_tag }
+    """
+    ip_filter = "AND ip = ?" if ip is not None else ""
+    ip_param = (ip,) if ip is not None else ()
+    cursor.execute(f"""
+        SELECT ip, tag_value FROM tags
+        WHERE session_id = ? AND tag_type = 'device' {ip_filter}
+    """, (session_id,) + ip_param)
+    device_tags = {row_ip: tag for row_ip, tag in cursor.fetchall() if tag}
+    cursor.execute(f"""
+        SELECT ip, device_tag FROM global_tags
+        WHERE device_tag IS NOT NULL AND device_tag != '' {ip_filter}
+    """, ip_param)
+    device_tags.update(cursor.fetchall())
+    return device_tags
 
 # ----------------------------------------
 #  Per-Row Risk Scoring
 # ----------------------------------------
 
-def compute_row_risk_score(port, service):
+def compute_row_risk_score(port, service, product=None, version=None, script=None,
+                           device_tag=None, protocol=None, state="open", engine=None):
     """
-       Compute a single row's risk score from port/service.
+       Compute a single row's risk score from port/service plus matching risk rules.
+    Pass engine (get_rule_engine()) when scoring many rows to skip the reload check.
 
     Returns:
-        int: Total score = 1 + port_score + service_score
+        int: Total score = 1 + port_score + service_score + rule scores
     """
     try:
         port = int(port)
@@ -129,7 +193,7 @@ def compute_row_risk_score(port, service):
 
     port_score = PORT_RISK_WEIGHTS.get(port, 0)
     service_score = SERVICE_RISK_WEIGHTS.get(service, 0)
+    rule_score = (engine or get_rule_engine()).score(port, service, product, version, script, device_tag, protocol, state)
 
-
-    return 1 + port_score + service_score
+    return 1 + port_score + service_score + rule_score
 
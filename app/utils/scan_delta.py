@@ -0,0 +1,60 @@
+# app/utils/scan_delta.py
+# ---------------------
+# Delta rescans: re-verify only the ports each host's latest port scan found open
+# ---------------------
+#
+# Hosts with the same open port set share one nmap invocation
+# (host list + -p list), so a rescan touches only known services.
+# Groups beyond the shard limit are folded together (port lists merged).
+
+
+def port_spec(ports):
+    """
+    nmap -p argument for a set of (protocol, port) pairs.
+    Returns: e.g. "T:22,80,U:53"
+    """
+    tcp = sorted(port for protocol, port in ports if protocol != "udp")
+    udp = sorted(port for protocol, port in ports if protocol == "udp")
+    parts = []
+    if tcp:
+        parts.append("T:" + ",".join(str(port) for port in tcp))
+    if udp:
+        parts.append("U:" + ",".join(str(port) for port in udp))
+    return ",".join(parts)
+
+
+def delta_args(ports):
+    """Extra nmap arguments for one group: port list, plus a UDP scan if needed."""
+    args = ["-p", port_spec(ports)]
+    if any(protocol == "udp" for protocol, _ in ports):
+        args.append("-sU")
+    return args
+
+
+def build_delta_plan(open_ports, max_groups):
+    """
+    Group hosts by identical open port sets, folding the smallest groups into
+    the most similar remaining one until at most max_groups are left.
+
+    Args:
+        open_ports: {ip: set of (protocol, port)}
+    Returns: list of (sorted host list, set of (protocol, port)), largest first
+    """
+    groups = {}
+    for ip, ports in open_ports.items():
+        groups.setdefault(frozenset(ports), []).append(ip)
+    plan = [[hosts, set(ports)] for ports, hosts in groups.items()]
+
+    def weight(group):
+        return len(group[0]) * len(group[1])
+
+    while len(plan) > max(max_groups, 1):
+        plan.sort(key=weight)
+        hosts, ports = plan.pop(0)
+        #  Most shared ports first, then the lighter group
+        target = max(plan, key=lambda group: (len(group[1] & ports), -weight(group)))
+        target[0].extend(hosts)
+        target[1] |= ports
+
+    plan.sort(key=weight, reverse=True)
+    return [(sorted(hosts), ports) for hosts, ports in plan]
@@ -0,0 +1,92 @@
+# app/utils/scan_estimates.py
+# ---------------------
+# Scan duration history and time estimates per preset and target
+# ---------------------
+#
+# Every completed job is recorded in scan_runs (duration, target size, hosts
+# and ports found). Estimates use the median of recent runs of the same
+# preset on the same target, falling back to the preset's median time per
+# address scaled to the new target's size.
+
+import sqlite3
+import statistics
+from datetime import datetime
+
+from app.config import DB_PATH
+from app.utils.scan_shards import target_size
+
+HISTORY_SAMPLES = 5  # most recent runs used per estimate
+
+
+def record_run(job, session_id, duration_seconds):
+    """Store a finished job's duration with the size of what it scanned."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(DISTINCT ip), COUNT(port) FROM scan_results WHERE session_id = ?
+    """, (session_id,))
+    hosts, ports = cursor.fetchone()
+    cursor.execute("""
+        INSERT INTO scan_runs
+            (job_id, session_id, category, target, addresses, shards, hosts, ports, duration_seconds, finished_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        job["id"], session_id, job["category"], job["target"], target_size(job["target"]),
+        job["shards"], hosts, ports, duration_seconds, datetime.now().isoformat(timespec="seconds")
+    ))
+    conn.commit()
+    conn.close()
+
+
+def estimate_duration(category, target):
+    """
+    Predict how long a scan will take from past runs.
+    Returns: dict with 'seconds', 'basis' ('target' or 'preset'), 'samples'
+             and a display 'label', or None when there is no history.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    #  Same preset on the same target: typical duration as-is
+    cursor.execute("""
+        SELECT duration_seconds FROM scan_runs
+        WHERE category = ? AND target = ?
+        ORDER BY id DESC LIMIT ?
+    """, (category, target, HISTORY_SAMPLES))
+    durations = [row[0] for row in cursor.fetchall()]
+    if durations:
+        conn.close()
+        return _estimate(statistics.median(durations), "target", len(durations))
+
+    #  Same preset elsewhere: scale its time per address to this target
+    cursor.execute("""
+        SELECT duration_seconds, addresses FROM scan_runs
+        WHERE category = ? AND addresses > 0
+        ORDER BY id DESC LIMIT ?
+    """, (category, HISTORY_SAMPLES))
+    rates = [duration / addresses for duration, addresses in cursor.fetchall()]
+    conn.close()
+    if rates:
+        return _estimate(statistics.median(rates) * target_size(target), "preset", len(rates))
+    return None
+
+
+def estimate_all(categories, target):
+    """Estimates for every preset on one target. Returns: {category: estimate or None}"""
+    return {category: estimate_duration(category, target) for category in categories}
+
+
+def _estimate(seconds, basis, samples):
+    return {"seconds": round(seconds, 1), "basis": basis, "samples": samples, "label": format_duration(seconds)}
+
+
+def format_duration(seconds):
+    """Short human duration, e.g. '45s', '3m 20s', '2h 5m'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m"
@@ -0,0 +1,600 @@
+# app/utils/scan_jobs.py
+# ---------------------
+# Persistent scan job queue with a concurrency limit and cancellation
+# ---------------------
+#
+# Jobs live in the scan_jobs table, so the queue survives web worker
+# restarts. Every worker runs a small dispatcher thread; a job is claimed
+# with BEGIN IMMEDIATE so at most SCAN_MAX_CONCURRENT jobs run across all
+# workers. Highest priority runs first, then the shortest estimated scan.
+
+import os
+import time
+import shlex
+import signal
+import socket
+import shutil
+import sqlite3
+import logging
+import subprocess
+import threading
+from datetime import datetime
+import xml.etree.ElementTree as ET
+
+from app.config import (
+    DB_PATH, SCAN_MAX_CONCURRENT, SCAN_DISPATCH_INTERVAL, NMAP_STATS_EVERY, SCAN_SHARDS,
+    SCAN_HEARTBEAT_TIMEOUT, SCAN_RESUME_MAX, NMAP_BINARY
+)
+from app.utils.scanner_presets import get_preset, limit_args, nice_prefix
+from app.utils.parse2_nmap import parse_and_insert
+from app.utils.scan_progress import register_scan, SCAN_OUTPUT_DIR
+from app.utils.scan_shards import split_target, validate_target, target_matcher, run_shards, merge_xml
+from app.utils.scan_delta import build_delta_plan, delta_args
+from app.utils.db_utils import get_latest_open_ports, get_new_hosts
+from app.utils.scan_estimates import estimate_duration, record_run
+from app.utils.scan_resume import (
+    salvage_partial_xml, partial_xml_paths, completed_hosts, write_exclude_file, cleanup_resume_files
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_COLUMNS = (
+    "id", "category", "target", "priority", "status", "created_at", "started_at",
+    "finished_at", "log_name", "xml_path", "session_id", "owner", "pid",
+    "cancel_requested", "error", "shards", "heartbeat_at", "resume_count", "estimated_seconds"
+)
+
+#  Dispatch order: priority, then shortest expected scan first. Time spent
+#  waiting counts against the estimate so long scans are not starved.
+UNKNOWN_ESTIMATE_SECONDS = 600
+DISPATCH_ORDER = f"""
+    priority DESC,
+    COALESCE(estimated_seconds, {UNKNOWN_ESTIMATE_SECONDS})
+        - (julianday('now', 'localtime') - julianday(created_at)) * 86400 ASC,
+    id ASC
+"""
+
+
+def _process_start(pid):
+    """Start time of a process (clock ticks since boot, from /proc), or "" if it is gone or /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return ""
+    return stat[stat.rindex(")") + 2:].split()[19]
+
+
+#  Identifies the web worker that owns a running job: host, pid and the pid's
+#  start time. A container restart keeps the hostname and hands the same small
+#  pids to the new workers; the start time tells them apart from the old owner.
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{_process_start(os.getpid())}"
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _connect():
+    return sqlite3.connect(DB_PATH, timeout=10.0)
+
+
+def _row_to_job(row):
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+# ---------------------
+#  Queue operations
+# ---------------------
+def enqueue_job(category, target, priority=0, max_shards=None):
+    """
+    Queue a scan. Output filenames are fixed now so the progress stream can
+    be opened immediately, even while the job waits for a free slot.
+    Large targets are split into up to max_shards (default SCAN_SHARDS) parallel nmap runs.
+    Raises ValueError for a target that is not a list of IPs, CIDRs, hostnames or octet ranges.
+    Returns: job dict
+    """
+    target = validate_target(target)
+    timestamp = datetime.now().isoformat(timespec="microseconds").replace(":", "-").replace(".", "-")
+    safe_category = category.replace(" ", "_")
+    log_name = f"log_{safe_category}_{timestamp}.txt"
+    xml_path = os.path.join(SCAN_OUTPUT_DIR, f"scan_{safe_category}_{timestamp}.xml")
+    preset = get_preset(category)
+    max_shards = SCAN_SHARDS if max_shards is None else max_shards
+    max_shards = min(max_shards, preset["limits"].get("max_shards", max_shards))
+    if preset.get("mode") == "delta":
+        shards = max_shards  # Planned from the latest results when the job starts
+    else:
+        shards = len(split_target(target, max_shards))
+    estimate = estimate_duration(category, target)
+
+    os.makedirs(SCAN_OUTPUT_DIR, exist_ok=True)
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO scan_jobs
+            (category, target, priority, status, created_at, log_name, xml_path, shards, estimated_seconds)
+        VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?)
+    """, (category, target, priority, _now(), log_name, xml_path, shards, estimate and estimate["seconds"]))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    with open(os.path.join(SCAN_OUTPUT_DIR, log_name), "w") as log_file:
+        log_file.write(f"[QUEUED] Scan job #{job_id} waiting for a free scan slot\n")
+
+    logger.info(f"Queued scan job #{job_id}: {category} -> {target} (priority {priority}, {shards} shard(s))")
+    wake_dispatcher()
+    return get_job(job_id)
+
+
+def get_job(job_id):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM scan_jobs WHERE id = ?", (job_id,))
+    job = _row_to_job(cursor.fetchone())
+    conn.close()
+    return job
+
+
+def list_jobs(limit=100, statuses=None):
+    """Most recent jobs first, optionally filtered by status."""
+    query = f"SELECT {', '.join(JOB_COLUMNS)} FROM scan_jobs"
+    params = []
+    if statuses:
+        query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+        params.extend(statuses)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    jobs = [_row_to_job(row) for row in cursor.fetchall()]
+    conn.close()
+    return jobs
+
+
+def queue_position(job_id):
+    """1-based position of a queued job in dispatch order, or None if not queued."""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id FROM scan_jobs WHERE status = 'queued' ORDER BY {DISPATCH_ORDER}")
+    order = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return order.index(job_id) + 1 if job_id in order else None
+
+
+def claim_next_job(max_concurrent=None):
+    """
+    Atomically move the next queued job to 'running' for this worker,
+    unless the global concurrency limit is reached.
+    Returns: job dict or None
+    """
+    max_concurrent = SCAN_MAX_CONCURRENT if max_concurrent is None else max_concurrent
+    conn = _connect()
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT COUNT(*) FROM scan_jobs WHERE status = 'running'")
+        if cursor.fetchone()[0] >= max_concurrent:
+            cursor.execute("ROLLBACK")
+            return None
+
+        cursor.execute(f"""
+            SELECT id FROM scan_jobs
+            WHERE status = 'queued'
+            ORDER BY {DISPATCH_ORDER}
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute("ROLLBACK")
+            return None
+
+        cursor.execute("""
+            UPDATE scan_jobs SET status = 'running', owner = ?, started_at = COALESCE(started_at, ?), heartbeat_at = ?
+            WHERE id = ? AND status = 'queued'
+        """, (OWNER, _now(), time.time(), row[0]))
+        cursor.execute("COMMIT")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Could not claim scan job: {e}")
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        return None
+    finally:
+        conn.close()
+
+    return get_job(row[0])
+
+
+def _update_job(job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn = _connect()
+    conn.execute(f"UPDATE scan_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+    conn.close()
+
+
+def cancel_job(job_id):
+    """
+    Cancel a queued job, or stop a running one by killing its nmap process.
+    Works from any worker on the same host.
+    Returns: True if the job was queued or running.
+    """
+    job = get_job(job_id)
+    if not job or job["status"] not in ("queued", "running"):
+        return False
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE scan_jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1
+        WHERE id = ? AND status = 'queued'
+    """, (_now(), job_id))
+    was_queued = cursor.rowcount == 1
+    if not was_queued:
+        cursor.execute("UPDATE scan_jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+    if was_queued:
+        _append_log(job["log_name"], "[CANCELLED] Scan job cancelled before it started")
+    else:
+        # Re-read: the runner stores the pid right after starting nmap
+        job = get_job(job_id)
+        _kill(job["pid"])
+
+    logger.info(f"Cancel requested for scan job #{job_id}")
+    return True
+
+
+def _kill(pid):
+    """Stop a job's nmap process group (every shard of a sharded scan)."""
+    if not pid:
+        return
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    except PermissionError as e:
+        logger.warning(f"Could not signal nmap process {pid}: {e}")
+
+
+def _append_log(log_name, line):
+    with open(os.path.join(SCAN_OUTPUT_DIR, log_name), "a") as log_file:
+        log_file.write(line + "\n")
+
+
+def reap_orphaned_jobs():
+    """
+    Find 'running' jobs whose worker is gone: the owning process on this host
+    has exited (worker restart) or its pid now belongs to a process started
+    later (container restart), or a worker on another host sent no heartbeat
+    for SCAN_HEARTBEAT_TIMEOUT seconds. Local owners are judged by their
+    process only: a long import transaction or CPU-bound work can delay their
+    heartbeat while the scan is still running. Owners recorded without a
+    start time (older rows, no /proc) also need a fresh heartbeat.
+    Hosts the interrupted run already finished are salvaged from its XML and
+    the job is re-queued to resume, up to SCAN_RESUME_MAX times.
+    Returns: number of jobs reaped.
+    """
+    host = socket.gethostname()
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, owner, pid, log_name, xml_path, heartbeat_at, resume_count
+        FROM scan_jobs WHERE status = 'running'
+    """)
+    running = cursor.fetchall()
+    conn.close()
+
+    reaped = 0
+    for job_id, owner, pid, log_name, xml_path, heartbeat_at, resume_count in running:
+        owner_host, _, owner_pid = (owner or "").partition(":")
+        owner_pid, _, owner_start = owner_pid.partition(":")
+        local_owner = owner_host == host and owner_pid.isdigit()
+        stale = (heartbeat_at or 0) < time.time() - SCAN_HEARTBEAT_TIMEOUT
+        local_owner_gone = local_owner_restarted = False
+        if local_owner:
+            local_owner_gone = not _process_alive(int(owner_pid))
+            if owner_start:
+                local_owner_restarted = not local_owner_gone and _process_start(int(owner_pid)) != owner_start
+            else:
+                local_owner_restarted = not local_owner_gone and stale
+        heartbeat_lost = not local_owner and stale
+        if owner == OWNER or not (local_owner_gone or local_owner_restarted or heartbeat_lost):
+            continue
+
+        resume = resume_count < SCAN_RESUME_MAX
+        conn = _connect()
+        cursor = conn.cursor()
+        if resume:
+            cursor.execute("""
+                UPDATE scan_jobs SET status = 'queued', owner = NULL, pid = NULL, heartbeat_at = NULL,
+                                     resume_count = resume_count + 1
+                WHERE id = ? AND status = 'running' AND owner IS ?
+            """, (job_id, owner))
+        else:
+            cursor.execute("""
+                UPDATE scan_jobs SET status = 'failed', finished_at = ?, pid = NULL, error = ?
+                WHERE id = ? AND status = 'running' AND owner IS ?
+            """, (_now(), "Interrupted: worker process exited", job_id, owner))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        conn.close()
+        if not claimed:
+            continue  # Another worker reaped it first
+
+        #  nmap only outlives its worker on the same host (separate process group).
+        #  After a container restart it is gone too and its pgid may belong to another process.
+        if local_owner_gone:
+            _kill(pid)
+
+        if resume:
+            salvaged = salvage_partial_xml(xml_path)
+            _append_log(
+                log_name,
+                f"[QUEUED] Scan job #{job_id} was interrupted; re-queued to resume "
+                f"({salvaged} finished host(s) kept, attempt {resume_count + 1} of {SCAN_RESUME_MAX})"
+            )
+            logger.warning(f"Re-queued interrupted scan job #{job_id} (owner {owner}, {salvaged} hosts salvaged)")
+            wake_dispatcher()
+        else:
+            cleanup_resume_files(xml_path)
+            _append_log(log_name, "[ERROR] Scan interrupted: worker process exited")
+            logger.warning(f"Reaped orphaned scan job #{job_id} (owner {owner})")
+        reaped += 1
+    return reaped
+
+
+def _heartbeat():
+    """Mark this worker's running jobs as alive."""
+    conn = _connect()
+    conn.execute(
+        "UPDATE scan_jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+        (time.time(), OWNER)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ---------------------
+#  Job execution
+# ---------------------
+def build_command(job, target=None, xml_out=None, extra_args=None, shards=1):
+    """
+    Full nmap command line for a job (or one of its shards), with the
+    preset's resource limits applied (rates are shared across shards).
+    """
+    target = job["target"] if target is None else target
+    xml_out = job["xml_path"] + ".tmp" if xml_out is None else xml_out
+    preset = get_preset(job["category"])
+    limits = preset["limits"]
+    return nice_prefix(limits) + shlex.split(NMAP_BINARY) + preset["nmap_args"] + limit_args(limits, shards) + (extra_args or []) + [
+        "--stats-every", NMAP_STATS_EVERY, "-oX", xml_out, "--"
+    ] + target.split()
+
+
+def plan_scan(job):
+    """
+    Split a job into nmap runs: shards of a large target, or for delta
+    rescans one run per group of hosts sharing the same open ports.
+    Resumed jobs skip hosts finished by the interrupted run.
+    Returns: (list of (command, weight), note for the log or None);
+             more than one command means a sharded run, none means nothing left to scan.
+    """
+    notes = []
+    done_hosts = completed_hosts(job["xml_path"]) if job["resume_count"] else set()
+    if done_hosts:
+        notes.append(f"[RESUME] Resuming: {len(done_hosts)} host(s) already finished are excluded")
+
+    if get_preset(job["category"]).get("mode") == "delta":
+        baselines, open_ports = get_latest_open_ports()
+        in_target = target_matcher(job["target"])  # Never re-verify stored hosts outside this job's target
+        open_ports = {ip: ports for ip, ports in open_ports.items() if in_target(ip)}
+        if not open_ports:
+            raise ValueError(f"No open ports from a previous scan of {job['target']} to re-verify; run a full scan first")
+        port_count = sum(len(ports) for ports in open_ports.values())
+        baselines = sorted({baselines[ip] for ip in open_ports})
+        sources = ", ".join(f"#{session_id}" for session_id in baselines[-5:])
+        if len(baselines) > 5:
+            sources = f"{len(baselines)} sessions, latest {sources}"
+        notes.append(f"[DELTA] Re-verifying {port_count} open port(s) on {len(open_ports)} host(s) from session(s) {sources}")
+        open_ports = {ip: ports for ip, ports in open_ports.items() if ip not in done_hosts}
+        groups = [
+            (" ".join(hosts), len(hosts) * len(ports), delta_args(ports))
+            for hosts, ports in build_delta_plan(open_ports, job["shards"])
+        ] if open_ports else []
+    else:
+        exclude = ["--excludefile", write_exclude_file(job["xml_path"], done_hosts)] if done_hosts else None
+        groups = [(spec, size, exclude) for spec, size in split_target(job["target"], job["shards"])]
+
+    note = "\n".join(notes) or None
+    if not groups:
+        return [], note
+
+    if len(groups) == 1:
+        target, weight, extra_args = groups[0]
+        return [(build_command(job, target, extra_args=extra_args), weight)], note
+    return [
+        (build_command(job, target, path, extra_args, shards=len(groups)), weight)
+        for (target, weight, extra_args), path in zip(groups, _shard_xml_paths(job, len(groups)))
+    ], note
+
+
+def _shard_xml_paths(job, count):
+    return [f"{job['xml_path']}.shard{i + 1}.tmp" for i in range(count)]
+
+
+def run_job(job):
+    """Run one claimed job to completion: nmap (one or more shards) -> XML validation -> parse_and_insert."""
+    job_id = job["id"]
+    log_path = os.path.join(SCAN_OUTPUT_DIR, job["log_name"])
+    tmp_xml_path = job["xml_path"] + ".tmp"
+    final_xml_path = job["xml_path"]
+    started = time.time()
+
+    #  Shared progress watcher; nmap output is pushed to it line by line
+    watcher = register_scan(job["log_name"])
+
+    try:
+        preset = get_preset(job["category"])  # Current settings: presets may have been reloaded
+        runs, note = plan_scan(job)
+        shard_xml_paths = _shard_xml_paths(job, len(runs))
+        if len(runs) != job["shards"]:
+            _update_job(job_id, shards=len(runs))
+
+        with open(log_path, "a") as log_file:
+            if note:
+                log_file.write(note + "\n")
+            if not runs:
+                pass  # Resumed job with every host already finished
+            elif len(runs) > 1:
+                for command, _ in runs:
+                    logger.info("Running command: %s", " ".join(command))
+                run_shards(
+                    [command for command, _ in runs], [weight for _, weight in runs], log_file, watcher.feed,
+                    on_start=lambda pgid: _update_job(job_id, pid=pgid)
+                )
+            else:
+                full_cmd = runs[0][0]
+                logger.info("Running command: %s", " ".join(full_cmd))
+
+                #  Start subprocess (own process group, so cancel reaches it) and write stdout to log
+                process = subprocess.Popen(
+                    full_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, process_group=0
+                )
+                _update_job(job_id, pid=process.pid)
+                for line in process.stdout:
+                    log_file.write(line)
+                    log_file.flush()
+                    watcher.feed(line)
+                process.wait()
+
+        if get_job(job_id)["cancel_requested"]:
+            _append_log(job["log_name"], "[CANCELLED] Scan cancelled")
+            _update_job(job_id, status="cancelled", finished_at=_now(), pid=None)
+            cleanup_resume_files(final_xml_path)
+            watcher.finish(error="Scan cancelled")
+            return
+
+        time.sleep(1)  # 🧹 Allow disk I/O to catch up
+
+        # ✅ Validate XML before renaming (every shard, then merge into one document)
+        output_paths = shard_xml_paths if len(runs) > 1 else [tmp_xml_path] if runs else []
+        for path in output_paths:
+            try:
+                ET.parse(path)  # If XML is invalid, raise exception
+            except ET.ParseError as e:
+                corrupt_path = path + ".corrupt"
+                shutil.copy(path, corrupt_path)
+                _append_log(job["log_name"], f"[FATAL] XML parse error: {e}. Copied to {corrupt_path}")
+                _update_job(job_id, status="failed", finished_at=_now(), pid=None, error=f"XML parse error: {e}")
+                watcher.finish(error=f"XML parse error: {e}")
+                return
+
+        #  Merge shards and hosts salvaged from interrupted runs into one document
+        partial_paths = partial_xml_paths(final_xml_path)
+        if len(output_paths) + len(partial_paths) > 1 or not output_paths:
+            merge_xml(output_paths + partial_paths, tmp_xml_path)
+            if len(runs) > 1:
+                for path in shard_xml_paths:
+                    os.remove(path)
+            cleanup_resume_files(final_xml_path)
+
+        #  Rename temp XML to final name
+        os.rename(tmp_xml_path, final_xml_path)
+
+        #  Parse results and insert into database
+        session_id = parse_and_insert(final_xml_path, log_path)
+        if session_id:
+            #  Duration history for estimates (resumed runs would understate it)
+            if not job["resume_count"]:
+                record_run(get_job(job_id), session_id, time.time() - started)
+            if preset.get("follow_up"):
+                _queue_follow_up(job, preset["follow_up"], session_id)
+            _update_job(job_id, status="done", finished_at=_now(), pid=None, session_id=session_id)
+            watcher.finish()
+        else:
+            _update_job(job_id, status="failed", finished_at=_now(), pid=None, error="Import failed")
+            watcher.finish(error="Scan results could not be imported (see parser.log)")
+
+    except Exception as e:
+        #  Handle unexpected errors
+        _append_log(job["log_name"], f"[ERROR] {str(e)}")
+        _update_job(job_id, status="failed", finished_at=_now(), pid=None, error=str(e))
+        watcher.finish(error=str(e))
+
+    finally:
+        wake_dispatcher()  # A slot just freed up
+
+
+def _queue_follow_up(job, category, session_id):
+    """Discovery sweeps: queue a full scan of hosts no earlier session has seen."""
+    new_hosts = get_new_hosts(session_id)
+    if not new_hosts:
+        _append_log(job["log_name"], "[FOLLOW-UP] No new hosts found")
+        return
+    follow_up = enqueue_job(category, " ".join(new_hosts), priority=job["priority"])
+    _append_log(job["log_name"], f"[FOLLOW-UP] {len(new_hosts)} new host(s): queued {category} job #{follow_up['id']}")
+
+
+# ---------------------
+#  Dispatcher (one thread per web worker)
+# ---------------------
+class _Dispatcher(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name="scan-dispatcher", daemon=True)
+        self.interval = interval
+        self.wakeup = threading.Event()
+
+    def run(self):
+        reap_orphaned_jobs()
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.exception(f"Scan dispatcher error: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def tick(self):
+        _heartbeat()
+        reap_orphaned_jobs()
+        while True:
+            job = claim_next_job()
+            if not job:
+                break
+            threading.Thread(target=run_job, args=(job,), name=f"scan-job-{job['id']}", daemon=True).start()
+
+
+def start_dispatcher(interval=None):
+    """Start this process's dispatcher thread (idempotent)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = _Dispatcher(SCAN_DISPATCH_INTERVAL if interval is None else interval)
+            _dispatcher.start()
+    return _dispatcher
+
+
+def wake_dispatcher():
+    """Ask the local dispatcher to check the queue now instead of at the next tick."""
+    if _dispatcher is not None:
+        _dispatcher.wakeup.set()
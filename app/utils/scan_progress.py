@@ -0,0 +1,393 @@
+# app/utils/scan_progress.py
+# ---------------------
+# Shared, event-driven scan progress watchers
+# ---------------------
+#
+# One ScanWatcher exists per running scan (per process). SSE clients subscribe
+# to it instead of each polling the log file themselves.
+#   - Publisher mode: the scan runs in this process, so the job runner feeds
+#     every nmap stdout line straight in (no polling at all).
+#   - Follower mode: the scan runs in another gunicorn worker, so a single
+#     thread follows the log file for all local subscribers, reading only
+#     newly appended bytes.
+# Watchers shut down when the scan finishes (or fails) and are dropped from
+# the registry.
+
+import os
+import re
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+from app.config import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+SCAN_OUTPUT_DIR = "scans"
+
+#  Overall percent range covered by each nmap phase (start, end).
+#  100 is reserved for "results are in the database".
+PHASE_RANGES = {
+    "discovery": (0, 15),
+    "ports": (15, 55),
+    "service": (55, 80),
+    "os": (80, 85),
+    "scripts": (85, 95),
+}
+
+#  Phase start/end markers, used until (or when) no --stats-every output arrives
+STAGES = [
+    ("Initiating Ping Scan", 2),
+    ("Completed Ping Scan", 15),
+    ("Initiating SYN Stealth Scan", 15),
+    ("Completed SYN Stealth Scan", 55),
+    ("Initiating Service scan", 55),
+    ("Completed Service scan", 80),
+    ("OS detection", 85),
+    ("Completed NSE", 95),
+    ("Nmap done", 95),
+]
+
+#  --stats-every output, e.g.
+#    Stats: 0:00:12 elapsed; 3 hosts completed (10 up), 7 undergoing SYN Stealth Scan
+#    SYN Stealth Scan Timing: About 45.50% done; ETC: 12:00 (0:00:15 remaining)
+STATS_RE = re.compile(
+    r"Stats: (\d+:\d{2}:\d{2}) elapsed; (\d+) hosts? completed \((\d+) up\), (\d+) undergoing (.+)"
+)
+TIMING_RE = re.compile(
+    r"(.+?) Timing: About ([\d.]+)% done(?:; ETC: (\d{1,2}:\d{2}) \((\d+:\d{2}:\d{2}) remaining\))?"
+)
+
+#  Lines written by the job runner when a scan cannot complete
+FAILURE_MARKERS = ("[FATAL]", "[ERROR]", "[CANCELLED]")
+QUEUED_MARKER = "[QUEUED]"
+
+#  Sharded scans: raw shard output is prefixed, combined progress is logged as JSON
+SHARD_PREFIX = "[shard "
+PROGRESS_MARKER = "[PROGRESS]"
+
+FOLLOW_INTERVAL = 0.5       # seconds between log size checks in follower mode
+FOLLOW_IDLE_TIMEOUT = 3600  # give up following a log that stopped growing
+FOLLOW_MISSING_TIMEOUT = 30 # give up if the log file never appears
+FOLLOW_UNWATCHED_GRACE = 60 # stop following once nobody has been subscribed this long
+INGEST_WAIT_TIMEOUT = 120   # follower: how long to wait for the session row after "Nmap done"
+
+_watchers = {}
+_registry_lock = threading.Lock()
+
+
+def phase_key(phase_name):
+    """Map an nmap phase name ("SYN Stealth Scan", "NSE", ...) to a PHASE_RANGES key."""
+    name = phase_name.lower()
+    if "ping" in name or "arp" in name or "dns" in name:
+        return "discovery"
+    if "service" in name:
+        return "service"
+    if "os detection" in name:
+        return "os"
+    if "nse" in name or "script" in name or "traceroute" in name:
+        return "scripts"
+    return "ports"
+
+
+def _hms_to_seconds(value):
+    hours, minutes, seconds = (int(part) for part in value.split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class ScanWatcher:
+    """Tracks one scan's progress and broadcasts changes to all subscribers."""
+
+    def __init__(self, log_name):
+        self.log_name = log_name
+        self.log_path = os.path.join(SCAN_OUTPUT_DIR, log_name)
+        self.stats = {
+            "percent": 0,
+            "phase": None,
+            "phase_percent": None,
+            "eta_seconds": None,
+            "etc": None,
+            "elapsed_seconds": None,
+            "hosts_completed": None,
+            "hosts_up": None,
+            "hosts_undergoing": None,
+        }
+        self.nmap_done = False
+        self.finished = False
+        self.error = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._follow_mode = False
+        self._follower = None
+
+    @property
+    def percent(self):
+        return self.stats["percent"]
+
+    # ---------------------
+    #  Subscribers
+    # ---------------------
+    def subscribe(self):
+        """
+        Return a queue that receives events:
+        ("progress", stats dict), ("failed", message), ("done", stats dict).
+        """
+        q = queue.Queue()
+        restart = False
+        with self._lock:
+            if (self.percent or self.stats["phase"]) and not self.finished:
+                q.put(("progress", dict(self.stats)))
+            if self.finished:
+                q.put(("failed", self.error) if self.error else ("done", dict(self.stats)))
+            else:
+                self._subscribers.add(q)
+                restart = self._follow_mode and self._follower is None
+        if not self.finished and restart:
+            #  Follower went idle just before this subscriber arrived: revive it
+            with _registry_lock:
+                _watchers.setdefault(self.log_name, self)
+            self.start_following()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _broadcast(self, event):
+        for q in list(self._subscribers):
+            q.put(event)
+
+    # ---------------------
+    #  Progress input
+    # ---------------------
+    def feed(self, text):
+        """Consume new log output (one or more lines) and broadcast any progress change."""
+        with self._lock:
+            if self.finished:
+                return
+
+            before = dict(self.stats)
+            for line in text.splitlines():
+                for marker in FAILURE_MARKERS:
+                    if marker in line:
+                        self._finish_locked(error=line.strip())
+                        return
+                self._apply_line(line.strip())
+
+            if self.stats != before:
+                self._broadcast(("progress", dict(self.stats)))
+
+    def _apply_line(self, line):
+        """Update stats from a single log line (caller holds the lock)."""
+        stats = self.stats
+
+        if line.startswith(QUEUED_MARKER):
+            stats["phase"] = "queued"
+            return
+
+        if line.startswith(SHARD_PREFIX):
+            return  # Already counted in the combined [PROGRESS] lines
+
+        if line.startswith(PROGRESS_MARKER):
+            try:
+                combined = json.loads(line[len(PROGRESS_MARKER):])
+            except ValueError:
+                return
+            percent = combined.pop("percent", 0)
+            stats.update(combined)
+            self._raise_percent(percent)
+            return
+
+        match = STATS_RE.search(line)
+        if match:
+            stats["elapsed_seconds"] = _hms_to_seconds(match.group(1))
+            stats["hosts_completed"] = int(match.group(2))
+            stats["hosts_up"] = int(match.group(3))
+            stats["hosts_undergoing"] = int(match.group(4))
+            self._set_phase(match.group(5).strip())
+            return
+
+        match = TIMING_RE.search(line)
+        if match:
+            phase, phase_percent, etc, remaining = match.groups()
+            phase_percent = min(float(phase_percent), 100.0)
+            stats["phase"] = phase.strip()
+            stats["phase_percent"] = phase_percent
+            stats["etc"] = etc
+            stats["eta_seconds"] = _hms_to_seconds(remaining) if remaining else None
+            self._raise_percent(self._overall_percent(phase, phase_percent))
+            return
+
+        for marker, stage_percent in STAGES:
+            if marker in line:
+                self._raise_percent(stage_percent)
+                if line.startswith("Initiating "):
+                    self._set_phase(line[len("Initiating "):].split(" at ")[0])
+                else:
+                    self._set_phase(stats["phase"], force_reset=True)
+
+        if line.startswith("Nmap done"):
+            self.nmap_done = True
+
+    def _set_phase(self, phase, force_reset=False):
+        """Switch the current phase; per-phase percent/ETA reset when it changes."""
+        if force_reset or (phase or "").lower() != (self.stats["phase"] or "").lower():
+            self.stats.update(phase_percent=None, eta_seconds=None, etc=None)
+        self.stats["phase"] = phase
+
+    def _overall_percent(self, phase, phase_percent):
+        """
+        Convert a phase-local percent into an overall percent.
+        Hosts already completed count as fully done, hosts still undergoing
+        the phase count by how far that phase has got.
+        """
+        start, end = PHASE_RANGES[phase_key(phase)]
+        within_host = start + (end - start) * phase_percent / 100
+
+        completed = self.stats["hosts_completed"] or 0
+        undergoing = self.stats["hosts_undergoing"] or 0
+        if completed and undergoing:
+            done_weight = PHASE_RANGES["scripts"][1]
+            return (completed * done_weight + undergoing * within_host) / (completed + undergoing)
+        return within_host
+
+    def _raise_percent(self, value):
+        #  Progress never moves backwards (nmap restarts phases per host group)
+        value = round(min(value, 95), 1)
+        if value > self.stats["percent"]:
+            self.stats["percent"] = value
+
+    def finish(self, error=None):
+        """Mark the scan complete (results ingested) or failed and release subscribers."""
+        with self._lock:
+            self._finish_locked(error)
+
+    def _finish_locked(self, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        self.error = error
+        if not error:
+            self.stats.update(percent=100, phase="done", phase_percent=100.0, eta_seconds=0)
+        self._broadcast(("failed", error) if error else ("done", dict(self.stats)))
+        self._subscribers.clear()
+        with _registry_lock:
+            if _watchers.get(self.log_name) is self:
+                del _watchers[self.log_name]
+
+    # ---------------------
+    #  Follower mode (scan owned by another process)
+    # ---------------------
+    def start_following(self):
+        with self._lock:
+            self._follow_mode = True
+            if self._follower is not None:
+                return
+            self._follower = threading.Thread(target=self._follow, name=f"progress-{self.log_name}", daemon=True)
+        self._follower.start()
+
+    def _follow(self):
+        position = 0
+        started = last_growth = last_watched = time.time()
+        nmap_done_at = None
+
+        while not self.finished:
+            try:
+                size = os.path.getsize(self.log_path)
+            except OSError:
+                if time.time() - started > FOLLOW_MISSING_TIMEOUT:
+                    self.finish(error="Scan log not found")
+                    break
+                size = 0
+
+            #  Nobody is listening any more: drop this watcher quietly
+            if self._subscribers:
+                last_watched = time.time()
+            elif time.time() - last_watched > FOLLOW_UNWATCHED_GRACE and self._stop_following():
+                break
+
+            if size > position:
+                with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+                    f.seek(position)
+                    chunk = f.read()
+                    position = f.tell()
+                self.feed(chunk)
+                last_growth = time.time()
+            elif time.time() - last_growth > FOLLOW_IDLE_TIMEOUT:
+                self.finish(error="Scan log stopped updating")
+                break
+
+            #  Nmap finished in the other worker: done once its session row exists
+            if self.nmap_done and not self.finished:
+                nmap_done_at = nmap_done_at or time.time()
+                if _session_ingested(self.log_path) or time.time() - nmap_done_at > INGEST_WAIT_TIMEOUT:
+                    self.finish()
+                    break
+
+            time.sleep(FOLLOW_INTERVAL)
+
+    def _stop_following(self):
+        """Stop the follower if still unwatched. Returns True if it stopped."""
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._follower = None
+            with _registry_lock:
+                if _watchers.get(self.log_name) is self:
+                    del _watchers[self.log_name]
+        return True
+
+
+# ---------------------
+#  Registry
+# ---------------------
+def register_scan(log_name):
+    """Create the watcher for a scan started in this process (publisher mode)."""
+    watcher = ScanWatcher(log_name)
+    with _registry_lock:
+        _watchers[log_name] = watcher
+    return watcher
+
+
+def get_watcher(log_name):
+    """
+    Get the shared watcher for a scan log, starting a single file follower
+    if the scan is not running in this process.
+    """
+    with _registry_lock:
+        watcher = _watchers.get(log_name)
+        if watcher is None:
+            watcher = ScanWatcher(log_name)
+            _watchers[log_name] = watcher
+            follow = True
+        else:
+            follow = False
+    if follow:
+        watcher.start_following()
+    return watcher
+
+
+def is_valid_log_name(log_name):
+    """Only plain scan log filenames (no paths) may be watched."""
+    return (
+        log_name == os.path.basename(log_name)
+        and log_name.startswith("log_")
+        and log_name.endswith(".txt")
+    )
+
+
+def _session_ingested(log_path):
+    """True once parse_and_insert has created the session for this log."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM scan_sessions WHERE log_path = ? LIMIT 1", (log_path,))
+        found = cursor.fetchone() is not None
+        conn.close()
+        return found
+    except sqlite3.Error as e:
+        logger.warning(f"Progress follower could not check session for {log_path}: {e}")
+        return False
@@ -0,0 +1,80 @@
+# app/utils/scan_resume.py
+# ---------------------
+# Resuming interrupted scans from their partial XML output
+# ---------------------
+#
+# nmap --resume only works from normal (-oN) or grepable (-oG) output and
+# cannot continue an XML file, so resumption is done the same way nmap does
+# it internally: hosts already written to the interrupted run's XML are kept
+# (saved as .partialN.xml) and the rerun excludes them. The partial files are
+# merged into the final XML with the rerun's output.
+
+import os
+import glob
+import xml.etree.ElementTree as ET
+
+
+def salvage_partial_xml(xml_path):
+    """
+    Turn the interrupted run's temp XML files (single or per shard) into
+    valid partial documents holding only completed hosts.
+    Returns: number of hosts salvaged
+    """
+    salvaged = 0
+    index = len(partial_xml_paths(xml_path))
+    for tmp_path in sorted(glob.glob(glob.escape(xml_path) + ".tmp") + glob.glob(glob.escape(xml_path) + ".shard*.tmp")):
+        try:
+            with open(tmp_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            continue
+
+        #  nmap writes each <host> once it is finished: cut after the last one
+        end = text.rfind("</host>")
+        if end != -1:
+            document = text[:end + len("</host>")] + "\n</nmaprun>\n"
+            try:
+                hosts = ET.fromstring(document).findall("host")
+            except ET.ParseError:
+                hosts = []
+            if hosts:
+                index += 1
+                with open(f"{xml_path}.partial{index}.xml", "w", encoding="utf-8") as f:
+                    f.write(document)
+                salvaged += len(hosts)
+        os.remove(tmp_path)
+    return salvaged
+
+
+def partial_xml_paths(xml_path):
+    """Partial XML files saved from earlier interrupted runs of this job."""
+    return sorted(glob.glob(glob.escape(xml_path) + ".partial*.xml"))
+
+
+def completed_hosts(xml_path):
+    """IPs already finished by earlier interrupted runs (to exclude from the rerun)."""
+    hosts = set()
+    for path in partial_xml_paths(xml_path):
+        for host in ET.parse(path).getroot().findall("host"):
+            addr = host.find("address[@addrtype='ipv4']")
+            if addr is None:
+                addr = host.find("address[@addrtype='ipv6']")
+            if addr is not None:
+                hosts.add(addr.attrib.get("addr"))
+    return hosts
+
+
+def write_exclude_file(xml_path, hosts):
+    """Write an nmap --excludefile for the completed hosts. Returns: its path."""
+    path = xml_path + ".exclude"
+    with open(path, "w") as f:
+        f.write("\n".join(sorted(hosts)) + "\n")
+    return path
+
+
+def cleanup_resume_files(xml_path):
+    for path in partial_xml_paths(xml_path) + [xml_path + ".exclude"]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
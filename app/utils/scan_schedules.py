@@ -0,0 +1,269 @@
+# app/utils/scan_schedules.py
+# ---------------------
+# Recurring scan schedules: a small in-process scheduler that queues scan jobs
+# ---------------------
+#
+# Every web worker runs the scheduler thread. A due schedule is claimed by
+# moving its next_run_at forward with a conditional UPDATE, so only one
+# worker fires each run. Each run (or skip) is recorded in schedule_runs
+# with its latency: how late the run fired compared to when it was due.
+#
+# next_run_at is the jittered fire time; nominal_run_at is the same slot
+# without jitter, which the next interval is counted from so random jitter
+# never accumulates into drift.
+
+import time
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from app.config import DB_PATH, SCAN_SCHEDULER_INTERVAL
+from app.utils.scanner_presets import get_presets
+from app.utils.scan_jobs import enqueue_job, get_job
+from app.utils.scan_shards import validate_target
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL_SECONDS = 60
+LATENCY_WINDOW = 20  # recent runs used for the average latency and skip count
+
+SCHEDULE_COLUMNS = (
+    "id", "name", "category", "target", "interval_seconds", "jitter_seconds",
+    "priority", "enabled", "next_run_at", "last_job_id", "created_at", "nominal_run_at"
+)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _connect():
+    return sqlite3.connect(DB_PATH, timeout=10.0)
+
+
+def _format_time(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(sep=" ", timespec="seconds") if epoch else None
+
+
+def _next_run(nominal, interval, jitter, now):
+    """
+    Next slot: one interval after the last nominal (unjittered) time, so
+    jitter never accumulates (no drift), and never in the past.
+    Returns: (nominal time, fire time with jitter)
+    """
+    nominal += interval
+    if nominal <= now:
+        nominal = now + interval  # Fell behind: skip missed runs instead of bursting
+    return nominal, nominal + random.uniform(0, jitter)
+
+
+# ---------------------
+#  Schedule management
+# ---------------------
+def create_schedule(name, category, target, interval_seconds, jitter_seconds=0, priority=0):
+    """
+    Add a recurring scan. The first run is one jitter window from now.
+    Raises ValueError for an unknown category, too short an interval or an invalid target.
+    Returns: new schedule id
+    """
+    if category not in get_presets():
+        raise ValueError(f"Unknown scan category: {category}")
+    if interval_seconds < MIN_INTERVAL_SECONDS:
+        raise ValueError(f"Interval must be at least {MIN_INTERVAL_SECONDS} seconds")
+    target = validate_target(target)
+
+    now = time.time()
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO scan_schedules
+            (name, category, target, interval_seconds, jitter_seconds, priority, enabled,
+             next_run_at, nominal_run_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+    """, (
+        name or category, category, target, interval_seconds, max(jitter_seconds, 0), priority,
+        now + random.uniform(0, max(jitter_seconds, 0)), now, datetime.now().isoformat(timespec="seconds")
+    ))
+    schedule_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    logger.info(f"Created schedule #{schedule_id}: {category} -> {target} every {interval_seconds}s")
+    return schedule_id
+
+
+def set_schedule_enabled(schedule_id, enabled):
+    """Pause or resume a schedule. Resuming fires it within one jitter window."""
+    conn = _connect()
+    cursor = conn.cursor()
+    if enabled:
+        cursor.execute("""
+            UPDATE scan_schedules
+            SET enabled = 1, next_run_at = MAX(next_run_at, ?1),
+                nominal_run_at = MAX(COALESCE(nominal_run_at, next_run_at), ?1)
+            WHERE id = ?2
+        """, (time.time(), schedule_id))
+    else:
+        cursor.execute("UPDATE scan_schedules SET enabled = 0 WHERE id = ?", (schedule_id,))
+    changed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return changed
+
+
+def delete_schedule(schedule_id):
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM schedule_runs WHERE schedule_id = ?", (schedule_id,))
+    cursor.execute("DELETE FROM scan_schedules WHERE id = ?", (schedule_id,))
+    deleted = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def list_schedules():
+    """
+    All schedules with run statistics over the last LATENCY_WINDOW runs.
+    Returns: list of dicts (schedule columns plus last_latency, avg_latency,
+             max_latency, recent_skips, last_job_status, last_start_delay)
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(SCHEDULE_COLUMNS)} FROM scan_schedules ORDER BY id")
+    schedules = [dict(zip(SCHEDULE_COLUMNS, row)) for row in cursor.fetchall()]
+
+    for schedule in schedules:
+        cursor.execute("""
+            SELECT due_at, latency_seconds, skipped FROM schedule_runs
+            WHERE schedule_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (schedule["id"], LATENCY_WINDOW))
+        runs = cursor.fetchall()
+        fired = [latency for _, latency, skipped in runs if not skipped]
+        schedule.update(
+            next_run=_format_time(schedule["next_run_at"]),
+            runs=len(runs),
+            recent_skips=sum(skipped for _, _, skipped in runs),
+            last_latency=round(runs[0][1], 1) if runs else None,
+            avg_latency=round(sum(fired) / len(fired), 1) if fired else None,
+            max_latency=round(max(fired), 1) if fired else None,
+            last_job_status=None,
+            last_start_delay=None,
+        )
+
+        #  Queue wait of the last job: due time -> nmap actually started
+        job = get_job(schedule["last_job_id"]) if schedule["last_job_id"] else None
+        if job:
+            schedule["last_job_status"] = job["status"]
+            cursor.execute("""
+                SELECT due_at FROM schedule_runs WHERE job_id = ? LIMIT 1
+            """, (job["id"],))
+            row = cursor.fetchone()
+            if row and job["started_at"]:
+                started = datetime.fromisoformat(job["started_at"]).timestamp()
+                schedule["last_start_delay"] = round(max(started - row[0], 0), 1)
+
+    conn.close()
+    return schedules
+
+
+# ---------------------
+#  Firing due schedules
+# ---------------------
+def run_due_schedules(now=None):
+    """
+    Queue a job for every enabled schedule that is due. A run is skipped
+    (and recorded as such) while the schedule's previous job is still
+    queued or running.
+    Returns: number of jobs queued
+    """
+    now = time.time() if now is None else now
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {', '.join(SCHEDULE_COLUMNS)} FROM scan_schedules
+        WHERE enabled = 1 AND next_run_at <= ?
+        ORDER BY next_run_at
+    """, (now,))
+    due = [dict(zip(SCHEDULE_COLUMNS, row)) for row in cursor.fetchall()]
+    conn.close()
+
+    queued = 0
+    for schedule in due:
+        if _fire(schedule, now):
+            queued += 1
+    return queued
+
+
+def _fire(schedule, now):
+    due_at = schedule["next_run_at"]
+    nominal = due_at if schedule["nominal_run_at"] is None else schedule["nominal_run_at"]
+    nominal, next_run = _next_run(nominal, schedule["interval_seconds"], schedule["jitter_seconds"], now)
+
+    #  Claim this run: only the worker that moves next_run_at forward fires it
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE scan_schedules SET next_run_at = ?, nominal_run_at = ?
+        WHERE id = ? AND next_run_at = ? AND enabled = 1
+    """, (next_run, nominal, schedule["id"], due_at))
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    if not claimed:
+        return False
+
+    previous = get_job(schedule["last_job_id"]) if schedule["last_job_id"] else None
+    skipped = previous is not None and previous["status"] in ("queued", "running")
+    job_id = None
+
+    if skipped:
+        logger.warning(
+            f"Schedule #{schedule['id']} ({schedule['name']}) skipped: job #{previous['id']} is still {previous['status']}"
+        )
+    else:
+        try:
+            job_id = enqueue_job(schedule["category"], schedule["target"], priority=schedule["priority"])["id"]
+        except Exception as e:
+            logger.exception(f"Schedule #{schedule['id']} could not queue a scan: {e}")
+            return False
+
+    fired_at = time.time()
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO schedule_runs (schedule_id, due_at, fired_at, latency_seconds, job_id, skipped)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (schedule["id"], due_at, fired_at, max(fired_at - due_at, 0), job_id, int(skipped)))
+    if job_id:
+        cursor.execute("UPDATE scan_schedules SET last_job_id = ? WHERE id = ?", (job_id, schedule["id"]))
+    conn.commit()
+    conn.close()
+    return job_id is not None
+
+
+# ---------------------
+#  Scheduler thread (one per web worker)
+# ---------------------
+def _scheduler_loop(interval):
+    while True:
+        try:
+            run_due_schedules()
+        except Exception as e:
+            logger.exception(f"Scan scheduler error: {e}")
+        time.sleep(interval)
+
+
+def start_scheduler(interval=None):
+    """Start this process's scheduler thread (idempotent)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(
+                target=_scheduler_loop, args=(SCAN_SCHEDULER_INTERVAL if interval is None else interval,),
+                name="scan-scheduler", daemon=True
+            )
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,294 @@
+# app/utils/scan_shards.py
+# ---------------------
+# Sharded scanning: split a large target, run one nmap per shard, merge the XML
+# ---------------------
+#
+# Shard output is written to the job's single log with a "[shard i/N]" prefix.
+# Progress from all shards is combined into "[PROGRESS] {json}" lines, so SSE
+# followers in other workers see the same aggregated progress as the runner.
+
+import re
+import json
+import math
+import ipaddress
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+
+from app.config import SCAN_SHARD_MIN_ADDRESSES
+from app.utils.scan_progress import ScanWatcher, SHARD_PREFIX, PROGRESS_MARKER
+
+
+# ---------------------
+#  Target splitting
+# ---------------------
+#  Target tokens nmap is given besides IPs/CIDRs: hostnames (optionally with a
+#  /prefix) and IPv4 octet ranges such as 10.0.0.1-50 or 192.168.1,2.*
+_HOSTNAME = re.compile(
+    r"(?!-)[A-Za-z0-9-]{1,63}(?<!-)(\.(?!-)[A-Za-z0-9-]{1,63}(?<!-))*\.?(/\d{1,3})?"
+)
+_OCTET = r"(\*|\d{1,3}(-\d{1,3})?(,\d{1,3}(-\d{1,3})?)*)"
+_OCTET_RANGE = re.compile(rf"{_OCTET}(\.{_OCTET}){{3}}")
+
+
+def validate_target(target):
+    """
+    Check that every token of a target spec is an IP/CIDR, a hostname or an
+    octet range, so a stored target can never inject nmap options (-iL, -oN,
+    --script, ...).
+    Raises ValueError naming the first bad token.
+    Returns: the target normalized to single spaces
+    """
+    tokens = (target or "").split()
+    if not tokens:
+        raise ValueError("Target is required")
+    for token in tokens:
+        if token.startswith("-"):
+            raise ValueError(f"Invalid target '{token}': options are not allowed in the target")
+        try:
+            ipaddress.ip_network(token, strict=False)
+            continue
+        except ValueError:
+            pass
+        if not (_HOSTNAME.fullmatch(token) or _OCTET_RANGE.fullmatch(token)):
+            raise ValueError(f"Invalid target '{token}': expected an IP, CIDR, hostname or octet range")
+    return " ".join(tokens)
+
+
+def _octet_values(spec):
+    """Allowed values of one octet of an octet range ("*", "1-50", "1,3,10-12")."""
+    if spec == "*":
+        return range(256)
+    values = set()
+    for part in spec.split(","):
+        low, _, high = part.partition("-")
+        values.update(range(int(low), int(high or low) + 1))
+    return values
+
+
+def target_matcher(target):
+    """
+    Predicate telling whether an address is covered by a target spec:
+    inside one of its IPs/CIDRs or octet ranges (hostnames match only
+    themselves).
+    Returns: function(address) -> bool
+    """
+    networks, ranges, names = [], [], set()
+    for token in target.split():
+        try:
+            networks.append(ipaddress.ip_network(token, strict=False))
+            continue
+        except ValueError:
+            pass
+        if _OCTET_RANGE.fullmatch(token):
+            ranges.append([_octet_values(spec) for spec in token.split(".")])
+        else:
+            names.add(token.lower())
+
+    def matches(address):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return address.lower() in names
+        if any(ip in network for network in networks):
+            return True
+        if ip.version == 4 and ranges:
+            octets = [int(octet) for octet in str(ip).split(".")]
+            return any(all(octet in allowed for octet, allowed in zip(octets, spec)) for spec in ranges)
+        return False
+
+    return matches
+
+
+def _parse_target(target):
+    """Split a target spec into (ip_network list, other specs such as hostnames or octet ranges)."""
+    networks, others = [], []
+    for spec in target.replace(",", " ").split():
+        try:
+            networks.append(ipaddress.ip_network(spec, strict=False))
+        except ValueError:
+            others.append(spec)
+    return networks, others
+
+
+def target_size(target):
+    """Number of addresses in a target spec (non-CIDR specs count as one)."""
+    networks, others = _parse_target(target)
+    return sum(net.num_addresses for net in networks) + len(others)
+
+
+def split_target(target, shard_count, min_addresses=None):
+    """
+    Split an nmap target spec into up to shard_count shards of similar size.
+    CIDRs and single IPs are split on network boundaries; other specs
+    (hostnames, octet ranges) are kept whole and count as one address.
+    Returns: list of (target spec, address count); a single entry means no sharding.
+    """
+    min_addresses = SCAN_SHARD_MIN_ADDRESSES if min_addresses is None else min_addresses
+    networks, others = _parse_target(target)
+
+    total = sum(net.num_addresses for net in networks) + len(others)
+    count = min(shard_count, total // max(min_addresses, 1))
+    if count <= 1:
+        return [(target, total)]
+
+    #  Power-of-two blocks about half a shard in size, so the greedy fill balances well
+    block = 2 ** int(math.log2(max(total / (count * 2), 1)))
+    pieces = []
+    for net in networks:
+        if net.num_addresses <= block:
+            pieces.append((str(net), net.num_addresses))
+        else:
+            new_prefix = net.max_prefixlen - int(math.log2(block))
+            pieces.extend((str(sub), sub.num_addresses) for sub in net.subnets(new_prefix=new_prefix))
+    pieces.extend((spec, 1) for spec in others)
+
+    #  Greedy balance: biggest piece to the currently lightest shard
+    shards = [[[], 0] for _ in range(count)]
+    for spec, size in sorted(pieces, key=lambda piece: -piece[1]):
+        lightest = min(shards, key=lambda shard: shard[1])
+        lightest[0].append(spec)
+        lightest[1] += size
+    return [(" ".join(specs), size) for specs, size in shards if specs]
+
+
+# ---------------------
+#  Aggregated progress
+# ---------------------
+class ShardProgress:
+    """Tracks each shard with its own ScanWatcher and combines them weighted by size."""
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.watchers = [ScanWatcher(f"shard-{i}") for i in range(len(weights))]
+        self.last = None
+
+    def feed(self, index, line):
+        """Feed one shard's output line. Returns: combined stats if they changed, else None."""
+        self.watchers[index].feed(line)
+        stats = self.combined()
+        if stats != self.last:
+            self.last = stats
+            return stats
+        return None
+
+    def combined(self):
+        shard_stats = [watcher.stats for watcher in self.watchers]
+        total_weight = sum(self.weights) or 1
+
+        def total(key):
+            values = [s[key] for s in shard_stats if s[key] is not None]
+            return sum(values) if values else None
+
+        #  Report the phase of the shard that is furthest behind
+        slowest = min(shard_stats, key=lambda s: s["percent"])
+        etas = [s["eta_seconds"] for s in shard_stats if s["eta_seconds"] is not None]
+        elapsed = [s["elapsed_seconds"] for s in shard_stats if s["elapsed_seconds"] is not None]
+
+        return {
+            "percent": round(sum(s["percent"] * w for s, w in zip(shard_stats, self.weights)) / total_weight, 1),
+            "phase": slowest["phase"],
+            "phase_percent": slowest["phase_percent"],
+            "eta_seconds": max(etas) if etas else None,
+            "etc": None,
+            "elapsed_seconds": max(elapsed) if elapsed else None,
+            "hosts_completed": total("hosts_completed"),
+            "hosts_up": total("hosts_up"),
+            "hosts_undergoing": total("hosts_undergoing"),
+            "shards": len(self.weights),
+            "shards_done": sum(1 for watcher in self.watchers if watcher.nmap_done),
+        }
+
+
+# ---------------------
+#  Parallel execution
+# ---------------------
+def run_shards(commands, weights, log_file, on_line, on_start=None):
+    """
+    Run one nmap process per shard and wait for all of them.
+
+    Args:
+        commands: full nmap command per shard
+        weights: address count per shard (for progress weighting)
+        log_file: open job log; shard lines are prefixed with "[shard i/N]"
+        on_line: called with every line written to the log (progress feed)
+        on_start: called with the process group id once all shards started;
+                  signalling the group stops every shard at once
+    """
+    write_lock = threading.Lock()
+    progress = ShardProgress(weights)
+    count = len(commands)
+
+    def emit(text):
+        log_file.write(text + "\n")
+        log_file.flush()
+        on_line(text)
+
+    #  All shards share one process group (led by the first) for cancellation
+    processes = []
+    for command in commands:
+        group = processes[0].pid if processes else 0
+        processes.append(subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, process_group=group
+        ))
+    if on_start:
+        on_start(processes[0].pid)
+
+    def pump(index, process):
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            with write_lock:
+                emit(f"{SHARD_PREFIX}{index + 1}/{count}] {line}")
+                stats = progress.feed(index, line)
+                if stats:
+                    emit(f"{PROGRESS_MARKER} {json.dumps(stats)}")
+        process.wait()
+
+    readers = [
+        threading.Thread(target=pump, args=(i, process), name=f"scan-shard-{i + 1}", daemon=True)
+        for i, process in enumerate(processes)
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    with write_lock:
+        emit(f"Nmap done: {count} shards finished")
+
+
+# ---------------------
+#  XML merge
+# ---------------------
+def merge_xml(shard_paths, out_path):
+    """
+    Merge shard XML files into one nmap XML document: hosts are concatenated
+    and runstats summed, so parse_and_insert sees a single scan.
+    Raises ET.ParseError if a shard file is invalid.
+    """
+    trees = [ET.parse(path) for path in shard_paths]
+    root = trees[0].getroot()
+    runstats = root.find("runstats")
+    insert_at = list(root).index(runstats) if runstats is not None else len(root)
+
+    for tree in trees[1:]:
+        for host in tree.getroot().findall("host"):
+            root.insert(insert_at, host)
+            insert_at += 1
+
+    if runstats is not None:
+        shard_stats = [tree.getroot().find("runstats") for tree in trees]
+        hosts = runstats.find("hosts")
+        if hosts is not None:
+            for key in ("up", "down", "total"):
+                hosts.set(key, str(sum(
+                    int(s.find("hosts").get(key, 0)) for s in shard_stats if s is not None and s.find("hosts") is not None
+                )))
+        finished = runstats.find("finished")
+        if finished is not None:
+            shard_finished = [s.find("finished") for s in shard_stats if s is not None and s.find("finished") is not None]
+            for key in ("time", "elapsed"):
+                values = [float(f.get(key, 0)) for f in shard_finished]
+                finished.set(key, str(max(values)) if key == "elapsed" else str(int(max(values))))
+
+    ET.ElementTree(root).write(out_path, encoding="utf-8", xml_declaration=True)
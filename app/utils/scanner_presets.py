@@ -1,33 +1,253 @@
 # scanner_presets.py
 
 """
-Nmap scan category presets for different network management purposes.
+Nmap scan category presets for different network management purposes,
+loaded from SCAN_PRESETS_FILE (JSON) and reloaded when the file changes.
+Built-in defaults (DEFAULT_PRESETS) apply until a valid file has loaded.
 
 Each category includes:
 - A user-friendly description
 - A tailored list of Nmap arguments
+- Optional "mode": "delta" (rescan the latest open ports only) or
+  "discovery" (ping sweep; new hosts are queued for the "follow_up" preset)
+- Optional "limits": resource settings enforced by the scan runner
+    min_rate / max_rate    packets per second for the whole job (split across shards)
+    max_parallelism        max probes in flight (per nmap process)
+    host_timeout           give up on a host after this long ("30m", "90s" or seconds)
+    nice                   CPU niceness of the nmap processes (0-19)
+    max_shards             cap on parallel nmap processes for this preset
 """
 
-SCAN_CATEGORIES = {
+import re
+import json
+import logging
+
+from app.config import SCAN_PRESETS_FILE
+from app.utils.config_reload import ReloadableConfig
+
+logger = logging.getLogger(__name__)
+
+MODES = (None, "full", "delta", "discovery")
+LIMIT_KEYS = ("min_rate", "max_rate", "max_parallelism", "host_timeout", "nice", "max_shards")
+HOST_TIMEOUT_RE = re.compile(r"^\d+(ms|s|m|h)?$")
+
+#  Set by the runner (output, targets, progress) or by "limits" instead
+RESERVED_ARGS = (
+    "-oX", "-oN", "-oG", "-oA", "-oS", "-oM", "-iL", "-iR", "--resume", "--stats-every",
+    "--exclude", "--excludefile", "--min-rate", "--max-rate", "--min-parallelism",
+    "--max-parallelism", "--host-timeout"
+)
+
+
+#  Built-in presets (the shipped config/scan_presets.json), used until a valid
+#  preset file loads, so a missing or broken file never leaves zero categories
+DEFAULT_PRESETS = {
     "Inventory Management": {
         "description": "Host discovery, OS, and service fingerprinting",
-        "nmap_args": ["-sS", "-O", "-sV", "-T4"]
+        "nmap_args": ["-sS", "-O", "-sV", "-T4"],
+        "limits": {"max_rate": 1000, "host_timeout": "15m"}
     },
     "Security Auditing": {
         "description": "Detect known vulnerabilities and weak services",
-        "nmap_args": ["-sS", "-sV", "--script=vuln", "-T4"]
+        "nmap_args": ["-sS", "-sV", "--script=vuln", "-T4"],
+        "limits": {"max_rate": 300, "max_parallelism": 50, "host_timeout": "30m", "nice": 10}
     },
     "System Administration": {
         "description": "Firewall path tracing and service versioning",
-        "nmap_args": ["-sS", "-sV", "--script=firewalk", "-T3"]
+        "nmap_args": ["-sS", "-sV", "--script=firewalk", "-T3"],
+        "limits": {"max_rate": 300, "host_timeout": "20m", "nice": 10}
     },
     "Penetration Testing": {
         "description": "OS detection and web app surface analysis",
-        "nmap_args": ["-sS", "-sV", "-O", "--script=http-enum", "-T4"]
+        "nmap_args": ["-sS", "-sV", "-O", "--script=http-enum", "-T4"],
+        "limits": {"max_rate": 500, "host_timeout": "30m", "nice": 10}
     },
     "Compliance Monitoring": {
         "description": "Detect misconfigurations and access issues",
-        "nmap_args": ["-sS", "-sV", "--script=auth,ssl-cert", "-T3"]
+        "nmap_args": ["-sS", "-sV", "--script=auth,ssl-cert", "-T3"],
+        "limits": {"max_rate": 300, "host_timeout": "20m", "nice": 10}
+    },
+    "Delta Rescan": {
+        "description": "Re-verify only the open ports each host's latest scan found",
+        "nmap_args": ["-sS", "-sV", "-Pn", "-T4"],
+        "mode": "delta",
+        "limits": {"max_rate": 1000, "host_timeout": "5m"}
+    },
+    "Discovery Sweep": {
+        "description": "Light ping sweep; new hosts get a full inventory scan",
+        "nmap_args": ["-sn", "-T4"],
+        "mode": "discovery",
+        "follow_up": "Inventory Management",
+        "limits": {"max_rate": 500, "max_shards": 1}
     }
 }
 
+
+class PresetConfigError(ValueError):
+    """Raised when the preset file is unreadable or fails validation (all problems listed)."""
+
+
+# ---------------------
+#  Registry access
+# ---------------------
+def get_presets():
+    """
+    Current presets, reloading the file first if it changed (see config_reload).
+    Until a valid file has loaded, the built-in DEFAULT_PRESETS are used.
+    Returns: {name: preset dict} (treat as read-only)
+    """
+    return _presets.get() or _BUILTIN_PRESETS
+
+
+def get_preset(name):
+    """Returns: preset dict. Raises ValueError for an unknown preset."""
+    presets = get_presets()
+    if name not in presets:
+        raise ValueError(f"Unknown scan preset: {name}")
+    return presets[name]
+
+
+def preset_status():
+    """Returns: dict with 'path', 'loaded_at', the last load 'error' (or None) and 'builtin' (defaults in use)."""
+    presets = _presets.get()
+    return {**_presets.status, "builtin": not presets}
+
+
+def reload_if_changed(path=None):
+    """Reload the preset file if its mtime/size changed. Returns: True if presets were replaced."""
+    return _presets.reload_if_changed(path)
+
+
+# ---------------------
+#  Loading + validation
+# ---------------------
+def load_presets(path):
+    """Read and validate a preset file. Raises PresetConfigError."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PresetConfigError(f"Cannot read {path}: {e}")
+    return validate_presets(data)
+
+
+def validate_presets(data):
+    """
+    Check the {"presets": {name: {...}}} structure.
+    Returns: {name: preset} with normalised limits. Raises PresetConfigError listing every problem.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("presets"), dict) or not data["presets"]:
+        raise PresetConfigError('Expected {"presets": {"<name>": {...}, ...}} with at least one preset')
+
+    errors = []
+    presets = {}
+    for name, preset in data["presets"].items():
+        where = f"preset '{name}'"
+        if not isinstance(preset, dict):
+            errors.append(f"{where}: must be an object")
+            continue
+
+        unknown = set(preset) - {"description", "nmap_args", "mode", "follow_up", "limits"}
+        if unknown:
+            errors.append(f"{where}: unknown keys {sorted(unknown)}")
+        if not isinstance(preset.get("description"), str):
+            errors.append(f"{where}: 'description' must be a string")
+
+        args = preset.get("nmap_args")
+        if not isinstance(args, list) or not args or not all(isinstance(arg, str) and arg for arg in args):
+            errors.append(f"{where}: 'nmap_args' must be a non-empty list of strings")
+        else:
+            reserved = [arg for arg in args if arg.split("=", 1)[0] in RESERVED_ARGS]
+            if reserved:
+                errors.append(f"{where}: {reserved} are set by the scan runner or 'limits'")
+
+        if preset.get("mode") not in MODES:
+            errors.append(f"{where}: 'mode' must be one of {[m for m in MODES if m]}")
+        follow_up = preset.get("follow_up")
+        if follow_up is not None and follow_up not in data["presets"]:
+            errors.append(f"{where}: 'follow_up' preset '{follow_up}' does not exist")
+
+        limits, limit_errors = _validate_limits(preset.get("limits", {}))
+        errors.extend(f"{where}: {message}" for message in limit_errors)
+
+        presets[name] = {**preset, "limits": limits}
+
+    if errors:
+        raise PresetConfigError("; ".join(errors))
+    return presets
+
+
+def _validate_limits(limits):
+    """Returns: (normalised limits, list of error messages)"""
+    if not isinstance(limits, dict):
+        return {}, ["'limits' must be an object"]
+
+    errors = []
+    unknown = set(limits) - set(LIMIT_KEYS)
+    if unknown:
+        errors.append(f"unknown limits {sorted(unknown)}")
+
+    def positive(key, integer=False):
+        value = limits.get(key)
+        if value is None:
+            return
+        valid_type = isinstance(value, int) if integer else isinstance(value, (int, float))
+        if isinstance(value, bool) or not valid_type or value <= 0:
+            errors.append(f"'{key}' must be a positive {'integer' if integer else 'number'}")
+
+    positive("min_rate")
+    positive("max_rate")
+    positive("max_parallelism", integer=True)
+    positive("max_shards", integer=True)
+
+    if not errors and limits.get("min_rate") and limits.get("max_rate") and limits["min_rate"] > limits["max_rate"]:
+        errors.append("'min_rate' cannot exceed 'max_rate'")
+
+    host_timeout = limits.get("host_timeout")
+    if host_timeout is not None and not HOST_TIMEOUT_RE.match(str(host_timeout)):
+        errors.append("'host_timeout' must be seconds or a duration like '90s', '30m', '2h'")
+
+    nice = limits.get("nice")
+    if nice is not None and (isinstance(nice, bool) or not isinstance(nice, int) or not 0 <= nice <= 19):
+        errors.append("'nice' must be an integer from 0 to 19")
+
+    return {key: value for key, value in limits.items() if key in LIMIT_KEYS}, errors
+
+
+_BUILTIN_PRESETS = validate_presets({"presets": DEFAULT_PRESETS})
+_presets = ReloadableConfig(
+    SCAN_PRESETS_FILE, load_presets, PresetConfigError, {}, "scan preset file",
+    lambda presets: f"{len(presets)} scan presets"
+)
+
+
+# ---------------------
+#  Enforcement
+# ---------------------
+def limit_args(limits, shards=1):
+    """
+    nmap arguments for a preset's limits. Rates are for the whole job, so
+    each of the job's shards gets an equal share.
+    Returns: list of arguments
+    """
+    args = []
+    shards = max(shards, 1)
+    if limits.get("min_rate"):
+        args += ["--min-rate", _rate(limits["min_rate"] / shards)]
+    if limits.get("max_rate"):
+        args += ["--max-rate", _rate(limits["max_rate"] / shards)]
+    if limits.get("max_parallelism"):
+        args += ["--max-parallelism", str(limits["max_parallelism"])]
+    if limits.get("host_timeout") is not None:
+        args += ["--host-timeout", str(limits["host_timeout"])]
+    return args
+
+
+def nice_prefix(limits):
+    """Command prefix that runs nmap at the preset's CPU niceness (empty if unset)."""
+    nice = limits.get("nice")
+    return ["nice", "-n", str(nice)] if nice else []
+
+
+def _rate(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
@@ -0,0 +1,354 @@
+# app/utils/tag_neighbors.py
+# ---------------------
+# Tag suggestions learned from hosts operators already tagged
+# ---------------------
+#
+# Every host is a set of features from its open ports: "22/tcp" per port and
+# "svc:ssh" per service name. Hosts with a global device or service tag are
+# indexed from their latest session with open ports (a later ping sweep or
+# a narrow scan that found nothing does not erase them); an untagged host
+# gets the tags of its nearest tagged hosts by Jaccard (|A & B| / |A | B|)
+# or cosine (|A & B| / sqrt(|A| * |B|)) similarity.
+#
+# The index is an inverted list: for each feature, the (sorted) ids of the
+# tagged hosts that have it, stored CSR-style in two NumPy arrays. A block of
+# queries (e.g. every host of a session) concatenates the lists of its
+# features and counts them with one bincount, which gives the intersection
+# size with every tagged host without comparing feature sets. The few common
+# features (ssh, 80/tcp, ...) that make up most postings are kept as a dense
+# 0/1 matrix instead and counted with one matrix product per block.
+# Similarities and top-k are vectorized over the whole block; hosts with
+# identical port/service sets are searched once.
+#
+# Confidence of a suggested tag is the summed similarity of the neighbours
+# voting for it, divided by k: five identical hosts with the same tag give
+# 1.0, a single half-similar neighbour gives 0.1 (with k = 5).
+#
+# The index is rebuilt when scan sessions or global tags change (session
+# versions are bumped on every tag edit, see bump_session_versions).
+
+import time
+import sqlite3
+import logging
+import threading
+
+import numpy as np
+
+from app.config import DB_PATH, TAG_NEIGHBOR_METRIC, TAG_NEIGHBOR_K, TAG_NEIGHBOR_MIN_CONFIDENCE
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("jaccard", "cosine")
+MIN_SIMILARITY = 0.2  # Neighbours below this do not vote
+DENSE_SHARE = 32  # Features on at least 1/32 of tagged hosts go in the dense matrix...
+DENSE_MAX_FEATURES = 128  # ...up to this many (128 x tagged hosts floats)
+BLOCK_CELLS = 1_000_000  # Queries per search block x tagged hosts (4 MB of similarities)
+
+
+def host_features(rows):
+    """
+    Feature sets per host from open port rows.
+    Args:
+        rows: iterable of (ip, port, protocol, service)
+    Returns: dict { ip: set of "port/protocol" and "svc:service" strings }
+    """
+    features = {}
+    for ip, port, protocol, service in rows:
+        host = features.setdefault(ip, set())
+        host.add(f"{port}/{protocol or 'tcp'}")
+        if service and service != "unknown":
+            host.add(f"svc:{service.lower()}")
+    return features
+
+
+class NeighborIndex:
+    """Inverted feature index over tagged hosts, queried for nearest neighbours."""
+
+    def __init__(self, hosts=(), signature=None, metric=TAG_NEIGHBOR_METRIC, k=TAG_NEIGHBOR_K):
+        """
+        Args:
+            hosts: iterable of (ip, features, device_tag, service_tag)
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown similarity metric '{metric}' (use {' or '.join(METRICS)})")
+        self.signature, self.metric, self.k = signature, metric, max(1, int(k))
+        started = time.perf_counter()
+
+        self.ips, sizes, devices, services = [], [], [], []
+        self.vocab, label_ids = {}, {}
+        pairs = []  # (feature id, host id)
+        for ip, features, device, service in hosts:
+            if not features or not (device or service):
+                continue
+            host_id = len(self.ips)
+            self.ips.append(ip)
+            sizes.append(len(features))
+            devices.append(label_ids.setdefault(device, len(label_ids)) if device else -1)
+            services.append(label_ids.setdefault(service, len(label_ids)) if service else -1)
+            for feature in features:
+                pairs.append((self.vocab.setdefault(feature, len(self.vocab)), host_id))
+        self.labels = [None] * len(label_ids)
+        for label, label_id in label_ids.items():
+            self.labels[label_id] = label
+
+        self.host_ids = {ip: host_id for host_id, ip in enumerate(self.ips)}
+        self.sizes = np.array(sizes, dtype=np.float32)
+        self.device_list, self.service_list = devices, services
+
+        # CSR postings: hosts of feature f are postings[indptr[f]:indptr[f + 1]], sorted by host id
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+        self.postings = pairs[order, 1]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(pairs[:, 0], minlength=len(self.vocab)))))
+
+        # Common features (ssh, 80/tcp, ...) hold most postings: keep them as a dense 0/1 matrix
+        # multiplied per query block instead, and count only the rare ones from the postings
+        frequency = np.diff(self.indptr)
+        common = np.argsort(-frequency, kind="stable")[:DENSE_MAX_FEATURES]
+        common = common[frequency[common] * DENSE_SHARE >= max(len(self.ips), 1)]
+        self.dense_column = np.full(len(self.vocab), -1, dtype=np.int64)
+        self.dense_column[common] = np.arange(len(common))
+        self.dense = np.zeros((len(common), len(self.ips)), dtype=np.float32)
+        for column, feature_id in enumerate(common):
+            self.dense[column, self.postings[self.indptr[feature_id]:self.indptr[feature_id + 1]]] = 1.0
+        self.build_seconds = time.perf_counter() - started
+
+    def __len__(self):
+        return len(self.ips)
+
+    def _nearest_many(self, feature_sets, count):
+        """
+        Up to count most similar tagged hosts for each feature set, searched in
+        blocks: a matrix product (common features) plus one bincount over the
+        postings (rare features) gives the (queries x tagged hosts) intersection
+        sizes, and top-k is a row-wise argpartition.
+        Returns: list of (host ids, similarities), most similar first
+        """
+        n = len(self.ips)
+        count = min(count, n)
+        if not count:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in feature_sets]
+
+        # (query, feature id) pairs for all queries, in query order
+        rows, feature_ids = [], []
+        for row, features in enumerate(feature_sets):
+            for feature in features:
+                feature_id = self.vocab.get(feature)
+                if feature_id is not None:
+                    rows.append(row)
+                    feature_ids.append(feature_id)
+        rows, feature_ids = np.array(rows, dtype=np.int64), np.array(feature_ids, dtype=np.int64)
+        query_sizes = np.array([len(features) for features in feature_sets], dtype=np.float32)
+
+        block = max(1, BLOCK_CELLS // n)
+        results = []
+        for start in range(0, len(feature_sets), block):
+            stop = min(start + block, len(feature_sets))
+            lo, hi = np.searchsorted(rows, [start, stop])
+
+            block_rows, block_features = rows[lo:hi] - start, feature_ids[lo:hi]
+            columns = self.dense_column[block_features]
+            dense = columns >= 0
+
+            # Common features: (queries x common features) @ (common features x tagged hosts)
+            queries = np.zeros((stop - start, len(self.dense)), dtype=np.float32)
+            queries[block_rows[dense], columns[dense]] = 1.0
+            shared = queries @ self.dense
+
+            # Rare features: concatenated postings of every (query, feature) pair, offset by query row
+            block_rows, block_features = block_rows[~dense], block_features[~dense]
+            starts, lengths = self.indptr[block_features], np.diff(self.indptr)[block_features]
+            offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+            hits = self.postings[np.arange(lengths.sum()) + offsets] + np.repeat(block_rows * n, lengths)
+            shared += np.bincount(hits, minlength=(stop - start) * n).reshape(stop - start, n)
+            if self.metric == "jaccard":
+                denominator = query_sizes[start:stop, None] + self.sizes
+                denominator -= shared
+            else:
+                denominator = np.sqrt(query_sizes[start:stop, None] * self.sizes)
+            similarity = np.divide(shared, denominator, out=shared)
+
+            top = np.argpartition(-similarity, count - 1, axis=1)[:, :count]
+            top_similarity = np.take_along_axis(similarity, top, axis=1)
+            order = np.argsort(-top_similarity, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_similarity = np.take_along_axis(top_similarity, order, axis=1)
+            for row in range(stop - start):
+                keep = top_similarity[row] >= MIN_SIMILARITY
+                results.append((top[row][keep], top_similarity[row][keep]))
+        return results
+
+    def neighbors_many(self, hosts):
+        """
+        Nearest tagged hosts for many hosts; a tagged host never counts as its own
+        neighbour, and hosts with identical features are searched once.
+        Args:
+            hosts: dict { ip: features }
+        Returns: dict { ip: (host ids, similarities) } of up to k neighbours, most similar first
+        """
+        keys = {ip: frozenset(features) for ip, features in hosts.items()}
+        unique = list(set(keys.values()))
+        found = dict(zip(unique, self._nearest_many(unique, self.k + 1)))  # One spare for the host itself
+
+        result = {}
+        for ip, key in keys.items():
+            candidates, similarity = found[key]
+            own_id = self.host_ids.get(ip)
+            if own_id is not None:
+                keep = candidates != own_id
+                candidates, similarity = candidates[keep], similarity[keep]
+            result[ip] = (candidates[:self.k], similarity[:self.k])
+        return result
+
+    def _vote(self, label_ids, similarity, divisor):
+        weights = {}
+        for label_id, weight in zip(label_ids, similarity):
+            if label_id >= 0:
+                weights[label_id] = weights.get(label_id, 0.0) + weight
+        if not weights:
+            return "", 0.0
+        best = max(weights, key=weights.get)  # Ties go to the label of the most similar neighbour
+        return self.labels[best], round(weights[best] / divisor, 3)
+
+    def _suggestion(self, ip, candidates, similarity):
+        #  k is tiny: plain lists beat NumPy calls here
+        candidates, similarity = candidates.tolist(), similarity.tolist()
+        divisor = min(self.k, max(len(self.ips) - (ip in self.host_ids), 1))
+        device, device_confidence = self._vote([self.device_list[c] for c in candidates], similarity, divisor)
+        service, service_confidence = self._vote([self.service_list[c] for c in candidates], similarity, divisor)
+        return {
+            "device": device, "device_confidence": device_confidence,
+            "service": service, "service_confidence": service_confidence,
+            "neighbors": [(self.ips[c], round(s, 3)) for c, s in zip(candidates, similarity)],
+        }
+
+    def suggest(self, ip, features):
+        """
+        Learned tags for one host.
+        Returns: dict with 'device'/'service' ("" if none), their confidences (0-1)
+                 and 'neighbors' [(ip, similarity)]
+        """
+        return self._suggestion(ip, *self.neighbors_many({ip: features})[ip])
+
+    def suggest_session(self, session_id, ips=None, cursor=None):
+        """Returns: dict { ip: suggest() result } for every host (or those in ips) with open ports in the session."""
+        own = cursor is None
+        if own:
+            conn = sqlite3.connect(DB_PATH)
+            cursor = conn.cursor()
+        cursor.execute("""
+            SELECT ip, port, protocol, service FROM scan_results
+            WHERE session_id = ? AND state = 'open'
+        """, (session_id,))
+        features = host_features(cursor.fetchall())
+        if own:
+            conn.close()
+        if not self.ips:
+            return {}
+        if ips is not None:
+            features = {ip: host for ip, host in features.items() if ip in ips}
+        found = self.neighbors_many(features)
+        return {ip: self._suggestion(ip, *found[ip]) for ip in features}
+
+    def stats(self):
+        return {
+            "hosts": len(self.ips), "features": len(self.vocab), "postings": int(len(self.postings)),
+            "metric": self.metric, "k": self.k, "build_ms": round(self.build_seconds * 1000, 1),
+        }
+
+
+def fill_suggestions(suggested, learned, min_confidence=TAG_NEIGHBOR_MIN_CONFIDENCE):
+    """
+    Fill empty rule-based suggestions from learned ones that are confident enough.
+    Args:
+        suggested: dict { ip: (device_tag, service_tag) } from suggest_tags, updated in place
+        learned: dict { ip: suggest() result }
+    Returns: set of IPs whose suggestion now includes a learned tag
+    """
+    filled = set()
+    for ip, (device, service) in suggested.items():
+        match = learned.get(ip)
+        if not match:
+            continue
+        if not device and match["device"] and match["device_confidence"] >= min_confidence:
+            device = match["device"]
+            filled.add(ip)
+        if not service and match["service"] and match["service_confidence"] >= min_confidence:
+            service = match["service"]
+            filled.add(ip)
+        suggested[ip] = (device, service)
+    return filled
+
+
+# ---------------------
+#  Building from the database
+# ---------------------
+def _signature(cursor):
+    """Changes whenever a session is added/removed or any tag edit bumps a session version."""
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(version), 0), MAX(id) FROM scan_sessions")
+    sessions = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*), MAX(rowid) FROM global_tags")
+    return sessions + cursor.fetchone()
+
+
+def build_neighbor_index(cursor, signature=None):
+    """Index every tagged host (by IP, latest global tag row wins) from its latest session with open ports."""
+    cursor.execute("""
+        SELECT ip, device_tag, service_tag FROM global_tags
+        WHERE COALESCE(device_tag, '') != '' OR COALESCE(service_tag, '') != ''
+        ORDER BY rowid
+    """)
+    tagged = {ip: (device or "", service or "") for ip, device, service in cursor.fetchall()}
+    cursor.execute("""
+        SELECT r.ip, r.port, r.protocol, r.service
+        FROM (
+            SELECT ip, MAX(session_id) AS session_id FROM scan_results
+            WHERE state = 'open'
+              AND session_id IN (SELECT id FROM scan_sessions)
+              AND ip IN (
+                  SELECT ip FROM global_tags
+                  WHERE COALESCE(device_tag, '') != '' OR COALESCE(service_tag, '') != ''
+              )
+            GROUP BY ip
+        ) latest
+        JOIN scan_results r ON r.ip = latest.ip AND r.session_id = latest.session_id
+        WHERE r.state = 'open'
+    """)
+    features = host_features(cursor.fetchall())
+    return NeighborIndex(
+        ((ip, features[ip], *tagged[ip]) for ip in sorted(features) if ip in tagged),
+        signature=signature,
+    )
+
+
+_lock = threading.Lock()
+_index = NeighborIndex()
+
+
+def neighbor_signature():
+    """State the learned suggestions are built from, without (re)building the index (for cache validators)."""
+    conn = sqlite3.connect(DB_PATH)
+    signature = _signature(conn.cursor())
+    conn.close()
+    return signature
+
+
+def get_neighbor_index(cursor=None):
+    """Current index of tagged hosts, rebuilt first if sessions or tags changed since it was built."""
+    global _index
+    own = cursor is None
+    if own:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+    try:
+        signature = _signature(cursor)
+        if signature != _index.signature:
+            with _lock:
+                if signature != _index.signature:
+                    _index = build_neighbor_index(cursor, signature)
+                    logger.info(f"Tag neighbour index: {len(_index)} tagged hosts, "
+                                f"{len(_index.vocab)} features in {_index.build_seconds * 1000:.1f} ms")
+    finally:
+        if own:
+            conn.close()
+    return _index
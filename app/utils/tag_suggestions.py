@@ -1,4 +1,4 @@
-# app/utils/tagging_suggestions.py
+# app/utils/tag_suggestions.py
 
 # ----------------------------------------
 # 🔍 suggest_tags()
@@ -8,87 +8,216 @@
 # - Open port or known service
 # - MAC vendor string
 # - OS fingerprint match string
+#
+# The heuristics are rules in TAG_RULES_FILE (JSON), one ordered list per
+# section; within a section the first matching rule wins, and a device tag
+# set by an earlier section is kept:
+#
+#   ip_suffix     {"suffix": "1", "device": "Gateway"}          last IPv4 octet
+#   port_service  {"services": [...], "ports": [...], "device": ..., "service": ...}
+#   vendor / os   {"contains": [...]} (any) or {"contains_all": [...]}, "device": ...
+#
+# Rules are compiled once per file version: suffixes, ports and services
+# into dicts, and all vendor (or OS) substrings into one regex whose hits
+# select the candidate rules. Results per vendor/OS string are memoized.
 # ----------------------------------------
 
-def suggest_tags(ip, port, service, mac_vendor=None, os_match=None):
-    device_tag = ""
-    service_tag = ""
-
-    # ----------------------------------------
-    # 🌐 IP-based Heuristics
-    # ----------------------------------------
-    if ip.endswith(".1"):
-        device_tag = "Gateway"
-    elif ip.endswith(".100"):
-        device_tag = "Main Host"
-
-    # ----------------------------------------
-    # 📡 Port/Service-based Heuristics
-    # ----------------------------------------
-    if service in ["printer"] or port in [9100]:
-        device_tag = device_tag or "Printer"
-        service_tag = service_tag or "Printing"
-
-    elif service in ["http", "https"] or port in [80, 443]:
-        device_tag = device_tag or "Web Server"
-        service_tag = service_tag or "Web Service"
-
-    elif service == "ssh" or port == 22:
-        device_tag = device_tag or "Linux Server"
-        service_tag = service_tag or "Remote Access"
-
-    elif service == "smb" or port == 445:
-        service_tag = service_tag or "File Sharing"
-
-    elif service in ["rdp", "ms-wbt-server"] or port == 3389:
-        device_tag = device_tag or "Windows Server"
-        service_tag = service_tag or "Remote Desktop"
-
-    elif service in ["mysql", "postgresql"] or port in [3306, 5432]:
-        service_tag = service_tag or "Database"
-
-    elif service == "snmp" or port == 161:
-        service_tag = service_tag or "Monitoring"
-
-    # ----------------------------------------
-    # 🏭 MAC Vendor-based Heuristics
-    # ----------------------------------------
-    if mac_vendor:
-        vendor = mac_vendor.lower()
-        if "hp" in vendor and "printer" in vendor:
-            device_tag = device_tag or "Printer"
-        elif "hp" in vendor:
-            device_tag = device_tag or "HP Device"
-        elif "cisco" in vendor:
-            device_tag = device_tag or "Router"
-        elif "ubiquiti" in vendor:
-            device_tag = device_tag or "Access Point"
-        elif "apple" in vendor:
-            device_tag = device_tag or "Apple Device"
-        elif "dell" in vendor:
-            device_tag = device_tag or "Desktop"
-        elif "raspberry" in vendor:
-            device_tag = device_tag or "IoT Device"
-        elif "mikrotik" in vendor:
-            device_tag = device_tag or "Router"
-
-    # ----------------------------------------
-    # 🧠 OS Fingerprint Heuristics
-    # ----------------------------------------
-    if os_match:
-        os_lower = os_match.lower()
-        if "windows" in os_lower:
-            device_tag = device_tag or "Windows Host"
-        elif "linux" in os_lower or "ubuntu" in os_lower:
-            device_tag = device_tag or "Linux Host"
-        elif "routeros" in os_lower or "mikrotik" in os_lower:
-            device_tag = device_tag or "Router"
-        elif "nas" in os_lower:
-            device_tag = device_tag or "NAS Device"
-        elif "pfsense" in os_lower or "openbsd" in os_lower:
-            device_tag = device_tag or "Firewall"
-        elif "android" in os_lower:
-            device_tag = device_tag or "Mobile Device"
-
-    return device_tag, service_tag
+import os
+import re
+import json
+import hashlib
+import logging
 
+from app.config import TAG_RULES_FILE
+from app.utils.config_reload import ReloadableConfig
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("ip_suffix", "port_service", "vendor", "os")
+MEMO_SIZE = 4096
+
+
+class TagRuleError(ValueError):
+    """Raised when the tag rule file is unreadable or fails validation (all problems listed)."""
+
+
+class _SubstringRules:
+    """Ordered "contains" rules over one lowercased string, matched with a single regex."""
+
+    def __init__(self, rules):
+        self.rules = [
+            (frozenset(rule.get("contains_all") or rule.get("contains")), "contains_all" in rule, rule["device"])
+            for rule in rules
+        ]
+        needles = sorted({needle for needed, _all, _device in self.rules for needle in needed}, key=len, reverse=True)
+        #  Lookahead finds overlapping hits; a hit also implies every needle that is its prefix
+        self.regex = re.compile("(?=(" + "|".join(re.escape(n) for n in needles) + "))") if needles else None
+        self.implied = {needle: {n for n in needles if needle.startswith(n)} for needle in needles}
+        self.rules_by_needle = {}
+        for index, (needed, _all, _device) in enumerate(self.rules):
+            for needle in needed:
+                self.rules_by_needle.setdefault(needle, []).append(index)
+        self.memo = {}
+
+    def device(self, text):
+        """Device tag of the first rule matching text (any case), or ""."""
+        device = self.memo.get(text)
+        if device is not None:
+            return device
+        device = ""
+        if self.regex is not None:
+            hits = self.regex.findall(text.lower())
+            found = set().union(*map(self.implied.__getitem__, hits)) if hits else ()
+            for index in sorted({i for needle in found for i in self.rules_by_needle[needle]}):
+                needed, match_all, rule_device = self.rules[index]
+                if not match_all or needed <= found:
+                    device = rule_device
+                    break
+        if len(self.memo) >= MEMO_SIZE:
+            self.memo.clear()
+        self.memo[text] = device
+        return device
+
+
+class TagSuggester:
+    """Tag rules compiled into dict lookups and substring regexes."""
+
+    def __init__(self, rules=None):
+        rules = rules or {}
+        self.by_suffix = {}
+        for rule in rules.get("ip_suffix", ()):
+            self.by_suffix.setdefault(rule["suffix"], rule["device"])
+
+        #  First rule (in file order) wins: keep the lowest index per port and per service
+        self.port_rules = [(rule.get("device", ""), rule.get("service", "")) for rule in rules.get("port_service", ())]
+        self.by_port, self.by_service = {}, {}
+        for index, rule in enumerate(rules.get("port_service", ())):
+            for port in rule.get("ports", ()):
+                self.by_port.setdefault(port, index)
+            for service in rule.get("services", ()):
+                self.by_service.setdefault(service, index)
+        self.no_rule = len(self.port_rules)
+        self.port_rules.append(("", ""))  # Sentinel for "no port/service rule"
+
+        self.vendor_rules = _SubstringRules(rules.get("vendor", ()))
+        self.os_rules = _SubstringRules(rules.get("os", ()))
+        self.rule_count = sum(len(rules.get(section, ())) for section in SECTIONS)
+        #  Content hash, the same in every worker (part of cached pages' ETags)
+        self.fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16] if rules else "none"
+
+    def suggest(self, ip, port, service, mac_vendor=None, os_match=None):
+        device_tag = self.by_suffix.get(ip[ip.rfind(".") + 1:], "") if self.by_suffix and "." in ip else ""
+
+        index = self.by_service.get(service, self.no_rule)
+        port_index = self.by_port.get(port, self.no_rule)
+        rule_device, service_tag = self.port_rules[port_index if port_index < index else index]
+        device_tag = device_tag or rule_device
+
+        if mac_vendor and not device_tag:
+            device_tag = self.vendor_rules.device(mac_vendor)
+        if os_match and not device_tag:
+            device_tag = self.os_rules.device(os_match)
+        return device_tag, service_tag
+
+
+def suggest_tags(ip, port, service, mac_vendor=None, os_match=None, suggester=None):
+    """
+    Suggested (device_tag, service_tag) for one host/port; "" where no rule applies.
+    Pass suggester (get_tag_suggester()) when tagging many rows to skip the reload check.
+    """
+    return (suggester or get_tag_suggester()).suggest(ip, port, service, mac_vendor, os_match)
+
+
+# ---------------------
+#  Loading + validation
+# ---------------------
+def load_tag_rules(path):
+    """Read and compile a tag rule file. A missing file means no suggestions. Raises TagRuleError."""
+    if not os.path.exists(path):
+        return TagSuggester()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise TagRuleError(f"Cannot read {path}: {e}")
+    return compile_tag_rules(data)
+
+
+def _strings(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(v, str) and v for v in value)
+
+
+def compile_tag_rules(data):
+    """Validate the rule sections and compile them. Raises TagRuleError listing every problem."""
+    if not isinstance(data, dict):
+        raise TagRuleError(f"Expected an object with sections {', '.join(SECTIONS)}")
+
+    errors = [f"unknown section '{key}'" for key in data if key not in SECTIONS]
+    for section in SECTIONS:
+        rules = data.get(section, [])
+        if not isinstance(rules, list):
+            errors.append(f"{section}: must be a list of rules")
+            continue
+        for index, rule in enumerate(rules):
+            where = f"{section} rule #{index + 1}"
+            if not isinstance(rule, dict):
+                errors.append(f"{where}: must be an object")
+                continue
+            tags = [rule.get(key) for key in ("device", "service") if key in rule]
+            if not tags or not all(isinstance(tag, str) and tag for tag in tags):
+                errors.append(f"{where}: needs a non-empty 'device'" + (" or 'service'" if section == "port_service" else ""))
+
+            if section == "ip_suffix":
+                allowed = {"suffix", "device"}
+                if not isinstance(rule.get("suffix"), str) or not rule["suffix"].isdigit():
+                    errors.append(f"{where}: 'suffix' must be the last IPv4 octet as a string, e.g. \"1\"")
+            elif section == "port_service":
+                allowed = {"services", "ports", "device", "service"}
+                ports = rule.get("ports", [])
+                if not isinstance(ports, list) or not all(
+                    isinstance(p, int) and not isinstance(p, bool) and 0 <= p <= 65535 for p in ports
+                ):
+                    errors.append(f"{where}: 'ports' must be a list of port numbers")
+                if "services" in rule and not _strings(rule["services"]):
+                    errors.append(f"{where}: 'services' must be a list of service names")
+                if not rule.get("ports") and not rule.get("services"):
+                    errors.append(f"{where}: needs 'ports' or 'services'")
+            else:
+                allowed = {"contains", "contains_all", "device"}
+                keys = [key for key in ("contains", "contains_all") if key in rule]
+                if len(keys) != 1 or not _strings(rule[keys[0]]):
+                    errors.append(f"{where}: needs one of 'contains' or 'contains_all' (list of strings)")
+                elif any(needle != needle.lower() for needle in rule[keys[0]]):
+                    errors.append(f"{where}: substrings must be lowercase")
+            unknown = set(rule) - allowed
+            if unknown:
+                errors.append(f"{where}: unknown keys {sorted(unknown)}")
+
+    if errors:
+        raise TagRuleError("; ".join(errors))
+    return TagSuggester(data)
+
+
+# ---------------------
+#  Registry access
+# ---------------------
+_rules = ReloadableConfig(
+    TAG_RULES_FILE, load_tag_rules, TagRuleError, TagSuggester(), "tag rule file",
+    lambda suggester: f"{suggester.rule_count} tag rules"
+)
+
+
+def get_tag_suggester():
+    """Current compiled tag rules, reloading the file first if it changed (see config_reload)."""
+    return _rules.get()
+
+
+def tag_rule_status():
+    """Returns: dict with 'path', 'loaded_at', the last load 'error' (or None) and the rule count."""
+    suggester = _rules.get()
+    return {**_rules.status, "rules": suggester.rule_count}
+
+
+def reload_if_changed(path=None):
+    """Reload the tag rule file if its mtime/size changed. Returns: True if rules were replaced."""
+    return _rules.reload_if_changed(path)
@@ -0,0 +1,410 @@
+# app/utils/vuln_index.py
+# ---------------------
+# Offline CVE index from imported NVD JSON feeds, matched at ingest
+# ---------------------
+#
+# import_feed() loads an NVD feed (the 1.1 "CVE_Items" files or NVD API 2.0
+# "vulnerabilities" pages, optionally .gz) into two tables:
+#   cves            one row per CVE (CVSS score, severity, summary)
+#   cve_cpe_ranges  one row per vulnerable application CPE: vendor, product,
+#                   an exact version or a start/end version range
+#
+# VulnIndex answers "which CVEs affect this vendor/product/version" for every
+# open port at ingest. The ranges of a (vendor, product) are read once from
+# cve_cpe_ranges (indexed by product, vendor) and kept in memory as an exact
+# version dict plus a start-sorted range list searched with bisect, so repeat
+# lookups are dict hits. A row's service CPE ("cpe:/a:openbsd:openssh:7.4")
+# is used when nmap reports one, else the product name is matched against
+# NVD product names ("OpenSSH" -> "openssh").
+#
+# Configurations are flattened: a CPE marked vulnerable counts even when NVD
+# also requires a platform (e.g. "on Windows"), so matches lean inclusive.
+
+import re
+import gzip
+import json
+import time
+import bisect
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from app.config import DB_PATH
+from app.utils.risk_utils import VULN_RISK_WEIGHTS
+from app.utils.db_utils import bump_session_versions
+from app.utils.host_risk import record_session_risk
+
+logger = logging.getLogger(__name__)
+
+VERSION_RE = re.compile(r"\d+(?:\.\d+)*")
+ANNOTATE_BATCH_ROWS = 50_000
+
+
+def version_tuple(text):
+    """Leading numeric version: "7.4p1" -> (7, 4), "2.4.29" -> (2, 4, 29), "2.4.0" -> (2, 4); None if there is none."""
+    match = VERSION_RE.search(text or "")
+    if not match:
+        return None
+    parts = [int(part) for part in match.group().split(".")]
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()  # "2.4.0" == "2.4"
+    return tuple(parts)
+
+
+def parse_cpe(uri):
+    """
+    Split a CPE 2.2 URI ("cpe:/a:vendor:product:version") or 2.3 string
+    ("cpe:2.3:a:vendor:product:version:...").
+    Returns: (part, vendor, product, version) lowercased, version None for "*"/"-"; None if not a CPE
+    """
+    uri = (uri or "").strip().lower()
+    if uri.startswith("cpe:2.3:"):
+        fields = re.split(r"(?<!\\):", uri[8:])
+    elif uri.startswith("cpe:/"):
+        fields = uri[5:].split(":")
+    else:
+        return None
+    fields = [field.replace("\\", "") for field in fields] + [""] * 4
+    part, vendor, product, version = fields[:4]
+    if not vendor or not product:
+        return None
+    return part, vendor, product, (None if version in ("", "*", "-") else version)
+
+
+def severity_for(score):
+    """CVSS v3 severity band for a base score."""
+    if score is None:
+        return None
+    if score >= 9.0:
+        return "CRITICAL"
+    if score >= 7.0:
+        return "HIGH"
+    if score >= 4.0:
+        return "MEDIUM"
+    return "LOW"
+
+
+def vuln_score(cves):
+    """Risk bonus for a row's matched CVEs: the weight of the worst severity."""
+    return max((VULN_RISK_WEIGHTS.get(severity, 0) for _cve, _score, severity in cves), default=0)
+
+
+# ---------------------
+#  Feed import
+# ---------------------
+def _node_matches(nodes):
+    """Vulnerable CPE matches of NVD configuration nodes (1.1 "cpe_match" or 2.0 "cpeMatch"), children included."""
+    for node in nodes or ():
+        for match in node.get("cpe_match") or node.get("cpeMatch") or ():
+            if match.get("vulnerable", True):
+                yield match
+        yield from _node_matches(node.get("children"))
+
+
+def _feed_items(data):
+    """
+    CVEs of a 1.1 feed or 2.0 API response.
+    Yields: (cve_id, cvss, severity, published, summary, cpe matches)
+    """
+    for item in data.get("CVE_Items") or ():
+        cve = item.get("cve", {})
+        impact = item.get("impact", {})
+        v3 = impact.get("baseMetricV3", {}).get("cvssV3", {})
+        v2 = impact.get("baseMetricV2", {})
+        score = v3.get("baseScore", v2.get("cvssV2", {}).get("baseScore"))
+        severity = v3.get("baseSeverity") or v2.get("severity")
+        summary = next((d.get("value") for d in cve.get("description", {}).get("description_data", [])), "")
+        nodes = item.get("configurations", {}).get("nodes")
+        yield (cve.get("CVE_data_meta", {}).get("ID"), score, severity,
+               item.get("publishedDate"), summary, _node_matches(nodes))
+
+    for item in data.get("vulnerabilities") or ():
+        cve = item.get("cve", {})
+        score = severity = None
+        for key in ("cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+            metrics = cve.get("metrics", {}).get(key)
+            if metrics:
+                score = metrics[0].get("cvssData", {}).get("baseScore")
+                severity = metrics[0].get("cvssData", {}).get("baseSeverity") or metrics[0].get("baseSeverity")
+                break
+        summary = next((d.get("value") for d in cve.get("descriptions", []) if d.get("lang") == "en"), "")
+        nodes = [node for config in cve.get("configurations", []) for node in config.get("nodes", [])]
+        yield cve.get("id"), score, severity, cve.get("published"), summary, _node_matches(nodes)
+
+
+def _range_rows(cve_id, matches):
+    """cve_cpe_ranges rows for the application CPEs of one CVE."""
+    rows = set()
+    for match in matches:
+        cpe = parse_cpe(match.get("cpe23Uri") or match.get("criteria"))
+        if not cpe or cpe[0] != "a":
+            continue
+        _part, vendor, product, version = cpe
+        start_incl, start_excl = match.get("versionStartIncluding"), match.get("versionStartExcluding")
+        end_incl, end_excl = match.get("versionEndIncluding"), match.get("versionEndExcluding")
+        if any((start_incl, start_excl, end_incl, end_excl)):
+            version = None  # The range bounds describe the versions
+        rows.add((vendor, product, version, start_incl, start_excl, end_incl, end_excl, cve_id))
+    return rows
+
+
+def import_feed(path):
+    """
+    Import one NVD JSON feed file (.json or .json.gz). CVEs already in the
+    index are replaced, so overlapping or updated feeds can be imported again.
+    Returns: dict with cves, ranges and seconds
+    """
+    started = time.perf_counter()
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    cve_count = range_count = 0
+    for cve_id, score, severity, published, summary, matches in _feed_items(data):
+        if not cve_id:
+            continue
+        severity = (severity or severity_for(score) or "").upper() or None
+        cursor.execute("""
+            INSERT OR REPLACE INTO cves (cve_id, cvss, severity, published, summary)
+            VALUES (?, ?, ?, ?, ?)
+        """, (cve_id, score, severity, published, summary))
+        cursor.execute("DELETE FROM cve_cpe_ranges WHERE cve_id = ?", (cve_id,))
+        rows = _range_rows(cve_id, matches)
+        cursor.executemany("""
+            INSERT INTO cve_cpe_ranges (
+                vendor, product, version, start_including, start_excluding,
+                end_including, end_excluding, cve_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        cve_count += 1
+        range_count += len(rows)
+
+    cursor.execute("""
+        INSERT INTO vuln_feeds (path, imported_at, cves, ranges) VALUES (?, ?, ?, ?)
+    """, (path, datetime.now().isoformat(timespec="seconds"), cve_count, range_count))
+    conn.commit()
+    conn.close()
+    stats = {"cves": cve_count, "ranges": range_count, "seconds": round(time.perf_counter() - started, 2)}
+    logger.info(f"Imported {cve_count} CVEs ({range_count} CPE ranges) from {path}")
+    return stats
+
+
+# ---------------------
+#  In-memory index
+# ---------------------
+class _ProductRanges:
+    """Exact-version CVEs by version tuple, plus version ranges sorted by lower bound."""
+    __slots__ = ("exact", "any_version", "starts", "ranges")
+
+    def __init__(self, rows, cves):
+        self.exact, self.any_version, ranges = {}, [], []
+        for version, start_incl, start_excl, end_incl, end_excl, cve_id in rows:
+            cve = cves[cve_id]
+            if version is not None:
+                key = version_tuple(version)
+                if key is not None:
+                    self.exact.setdefault(key, []).append(cve)
+            elif not any((start_incl, start_excl, end_incl, end_excl)):
+                self.any_version.append(cve)
+            else:
+                start = version_tuple(start_incl or start_excl) or ()
+                end = version_tuple(end_incl or end_excl)
+                ranges.append((start, bool(start_excl), end, bool(end_excl), cve))
+        ranges.sort(key=lambda r: r[0])
+        self.starts = [r[0] for r in ranges]
+        self.ranges = ranges
+
+    def lookup(self, key):
+        found = list(self.any_version)
+        found += self.exact.get(key, ())
+        for start, start_excl, end, end_excl, cve in self.ranges[:bisect.bisect_right(self.starts, key)]:
+            if start_excl and key == start:
+                continue
+            if end is not None and (key > end or (end_excl and key == end)):
+                continue
+            found.append(cve)
+        return found
+
+
+class VulnIndex:
+    """
+    CVE lookups by (vendor, product, version). Product ranges are loaded
+    from SQLite on first use and cached; counts lookups and time spent.
+    """
+
+    def __init__(self, feed_version=None):
+        self.feed_version = feed_version
+        self._products = {}   # (vendor, product) -> _ProductRanges
+        self._vendors = {}    # NVD product name -> vendors that ship it
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.nanoseconds = 0
+
+    def _load(self, vendor, product):
+        conn = sqlite3.connect(DB_PATH)
+        rows = conn.execute("""
+            SELECT r.version, r.start_including, r.start_excluding, r.end_including, r.end_excluding,
+                   r.cve_id, c.cvss, c.severity
+            FROM cve_cpe_ranges r JOIN cves c ON c.cve_id = r.cve_id
+            WHERE r.vendor = ? AND r.product = ?
+        """, (vendor, product)).fetchall()
+        conn.close()
+        cves = {row[5]: (row[5], row[6], row[7]) for row in rows}
+        return _ProductRanges([row[:6] for row in rows], cves)
+
+    def _vendors_of(self, product):
+        if product not in self._vendors:
+            conn = sqlite3.connect(DB_PATH)
+            vendors = conn.execute(
+                "SELECT DISTINCT vendor FROM cve_cpe_ranges WHERE product = ?", (product,)
+            ).fetchall()
+            conn.close()
+            self._vendors[product] = tuple(sorted(row[0] for row in vendors))
+        return self._vendors[product]
+
+    def match(self, cpe=None, product=None, version=None):
+        """
+        CVEs affecting one service: by its CPE (vendor/product, and version when
+        the CPE has one), else by nmap's product name. Unknown versions match nothing.
+        Returns: list of (cve_id, cvss, severity), highest score first
+        """
+        if self.feed_version is None:
+            return []
+        started = time.perf_counter_ns()
+        keys = []
+        parsed = parse_cpe(cpe)
+        if parsed and parsed[0] == "a":
+            _part, vendor, name, cpe_version = parsed
+            keys = [(vendor, name)]
+            version = cpe_version or version
+        elif product:
+            name = re.sub(r"[\s/]+", "_", product.strip().lower())
+            keys = [(vendor, name) for vendor in self._vendors_of(name)]
+
+        found = {}
+        key = version_tuple(version)
+        if key is not None:
+            for vendor_product in keys:
+                ranges = self._products.get(vendor_product)
+                if ranges is None:
+                    with self._lock:
+                        ranges = self._products.get(vendor_product) or self._load(*vendor_product)
+                        self._products[vendor_product] = ranges
+                for cve in ranges.lookup(key):
+                    found[cve[0]] = cve
+
+        self.lookups += 1
+        self.nanoseconds += time.perf_counter_ns() - started
+        return sorted(found.values(), key=lambda cve: (-(cve[1] or 0), cve[0]))
+
+    def stats(self):
+        """Returns: dict with products cached, lookups and microseconds per lookup"""
+        return {
+            "products_cached": len(self._products),
+            "lookups": self.lookups,
+            "us_per_lookup": round(self.nanoseconds / self.lookups / 1000, 2) if self.lookups else None,
+        }
+
+
+# ---------------------
+#  Registry access
+# ---------------------
+_index_lock = threading.Lock()
+_index = VulnIndex()
+
+
+def _feed_version():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute("SELECT MAX(id) FROM vuln_feeds").fetchone()
+    except sqlite3.OperationalError:
+        row = None  # Database from before the vulnerability tables
+    conn.close()
+    return row[0] if row else None
+
+
+def get_vuln_index():
+    """Current index; a new feed import starts a fresh one (cached product ranges are dropped)."""
+    global _index
+    version = _feed_version()
+    if version != _index.feed_version:
+        with _index_lock:
+            if version != _index.feed_version:
+                _index = VulnIndex(version)
+    return _index
+
+
+def vuln_status():
+    """Returns: dict with feeds imported, CVE and range counts, the last import and lookup stats."""
+    index = get_vuln_index()
+    conn = sqlite3.connect(DB_PATH)
+    feeds, last_import = conn.execute("SELECT COUNT(*), MAX(imported_at) FROM vuln_feeds").fetchone()
+    cves = conn.execute("SELECT COUNT(*) FROM cves").fetchone()[0]
+    ranges = conn.execute("SELECT COUNT(*) FROM cve_cpe_ranges").fetchone()[0]
+    conn.close()
+    return {"feeds": feeds, "last_import": last_import, "cves": cves, "ranges": ranges, **index.stats()}
+
+
+# ---------------------
+#  Re-annotating stored results
+# ---------------------
+def annotate_results(batch_rows=ANNOTATE_BATCH_ROWS, progress=None):
+    """
+    Re-match every stored open port against the current index (after a
+    feed import) and move the CVE part of risk_score with it. Sessions with
+    changed rows get their host risk totals rebuilt and caches invalidated.
+
+    Args:
+        progress: optional callback(rows_done, rows_total)
+    Returns: dict with rows checked, rows changed, sessions and seconds
+    """
+    started = time.perf_counter()
+    index = get_vuln_index()
+    conn = sqlite3.connect(DB_PATH, timeout=30.0)
+    cursor = conn.cursor()
+    candidates = "state = 'open' AND (COALESCE(service_cpe, '') != '' OR COALESCE(product, '') != '')"
+    cursor.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM scan_results WHERE {candidates}")
+    total, first_id, last_id = cursor.fetchone()
+
+    checked = changed = 0
+    sessions = set()
+    if total:
+        for low in range(first_id, last_id + 1, batch_rows):
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT id, session_id, service_cpe, product, version, cve_ids, COALESCE(vuln_score, 0)
+                FROM scan_results
+                WHERE id BETWEEN ? AND ? AND {candidates}
+            """, (low, low + batch_rows - 1))
+            updates = []
+            for row_id, session_id, cpe, product, version, old_ids, old_score in cursor.fetchall():
+                cves = index.match(cpe, product, version)
+                cve_ids = ",".join(cve[0] for cve in cves) or None
+                score = vuln_score(cves)
+                if cve_ids != old_ids or score != old_score:
+                    updates.append((cve_ids, score, score - old_score, row_id))
+                    sessions.add(session_id)
+                checked += 1
+            cursor.executemany("""
+                UPDATE scan_results SET cve_ids = ?, vuln_score = ?, risk_score = risk_score + ?
+                WHERE id = ?
+            """, updates)
+            changed += len(updates)
+            conn.commit()
+            if progress:
+                progress(checked, total)
+
+    cursor.execute("SELECT id FROM scan_sessions")
+    for session_id in sorted(sessions & {row[0] for row in cursor.fetchall()}):
+        bump_session_versions(cursor, session_id=session_id)
+        record_session_risk(cursor, session_id)
+    conn.commit()
+    conn.close()
+    return {
+        "rows": checked, "changed": changed, "sessions": len(sessions),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
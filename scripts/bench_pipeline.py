@@ -0,0 +1,231 @@
+# bench_pipeline.py
+
+"""
+End-to-end benchmark of the scan pipeline, with scripts/fake_nmap.py as the
+nmap binary: POST /run_scan -> queued job -> dispatcher -> nmap -> progress
+stream -> XML -> parse_and_insert -> scan session.
+
+Queues --jobs scans of --hosts live hosts each against a scratch database
+and scan directory, follows every job's progress the way the SSE stream
+does, and reports per job:
+    queue_wait    POST /run_scan until the dispatcher started the job
+    first_event   POST until the first progress event reached a subscriber
+    to_session    POST until the job is done and its session is stored
+plus throughput: hosts stored per second of wall time over all jobs.
+
+Usage:
+    python scripts/bench_pipeline.py
+    python scripts/bench_pipeline.py --jobs 8 --hosts 2000 --concurrent 2
+    python scripts/bench_pipeline.py --rate 50 --shards 4
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+BENCH_DIR = os.path.join(BASE_DIR, "benchmarks")
+FAKE_NMAP = os.path.join(BASE_DIR, "scripts", "fake_nmap.py")
+FINISHED = ("done", "failed", "cancelled")
+
+
+def _target(hosts):
+    """Smallest /16.. /30 network with room for four addresses per live host."""
+    prefix = 30
+    while prefix > 16 and 2 ** (32 - prefix) < hosts * 4:
+        prefix -= 1
+    return f"10.200.0.0/{prefix}"
+
+
+def _follow(log_name, timings):
+    """Subscribe like the SSE stream does; record when the first progress event arrives."""
+    from app.utils.scan_progress import get_watcher
+
+    events = get_watcher(log_name).subscribe()
+    while True:
+        try:
+            kind, payload = events.get(timeout=1)
+        except queue.Empty:
+            if "finished" in timings:
+                return
+            continue
+        if kind == "progress":
+            if payload["phase"] != "queued":
+                timings.setdefault("first_event", time.perf_counter())
+        else:
+            return
+
+
+def _wait(jobs, timeout):
+    """Poll every job together so start times are seen as they happen; returns {job id: final job}."""
+    from app.utils.scan_jobs import get_job
+
+    deadline = time.perf_counter() + timeout
+    pending = {job_id: timings for job_id, timings, _ in jobs}
+    finished = {}
+    while pending:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"Job(s) {sorted(pending)} did not finish within {timeout}s")
+        for job_id, timings in list(pending.items()):
+            job = get_job(job_id)
+            now = time.perf_counter()
+            if job["status"] != "queued":
+                timings.setdefault("started", now)
+            if job["status"] in FINISHED:
+                timings["finished"] = now
+                finished[job_id] = job
+                del pending[job_id]
+        time.sleep(0.02)
+    return finished
+
+
+def _hosts_stored(session_id):
+    from app.config import DB_PATH
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(DISTINCT ip) FROM scan_results WHERE session_id = ?", (session_id,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "median": round(statistics.median(values), 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def run(args):
+    client = args.app.test_client()
+    jobs = []
+    started = time.perf_counter()
+    for _ in range(args.jobs):
+        queued_at = time.perf_counter()
+        response = client.post("/run_scan", data={"category": args.category})
+        if response.status_code != 200:
+            raise RuntimeError(f"/run_scan failed ({response.status_code}): {response.get_data(as_text=True)[:200]}")
+        body = response.get_json()
+        timings = {"queued": queued_at}
+        follower = threading.Thread(target=_follow, args=(body["log"], timings), daemon=True)
+        follower.start()
+        jobs.append((body["job_id"], timings, follower))
+
+    finished = _wait(jobs, args.timeout)
+    results = []
+    for job_id, timings, follower in jobs:
+        job = finished[job_id]
+        follower.join(timeout=5)
+        hosts = _hosts_stored(job["session_id"]) if job["session_id"] else 0
+        results.append({
+            "job_id": job_id,
+            "status": job["status"],
+            "error": job.get("error"),
+            "hosts": hosts,
+            "queue_wait": round(timings["started"] - timings["queued"], 3),
+            "first_event": round(timings["first_event"] - timings["queued"], 3) if "first_event" in timings else None,
+            "to_session": round(timings["finished"] - timings["queued"], 3),
+        })
+    wall = max(timings["finished"] for _, timings, _ in jobs) - started
+
+    total_hosts = sum(r["hosts"] for r in results)
+    return {
+        "jobs": results,
+        "wall_seconds": round(wall, 3),
+        "hosts_stored": total_hosts,
+        "hosts_per_second": round(total_hosts / wall, 1) if wall else None,
+        "failed": sum(1 for r in results if r["status"] != "done"),
+        "queue_wait": _summary([r["queue_wait"] for r in results]),
+        "first_event": _summary([r["first_event"] for r in results if r["first_event"] is not None]),
+        "to_session": _summary([r["to_session"] for r in results if r["status"] == "done"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark queue-to-session latency and ingest throughput with the fake nmap.")
+    parser.add_argument("--jobs", type=int, default=4, help="scans to queue")
+    parser.add_argument("--hosts", type=int, default=500, help="live hosts per scan")
+    parser.add_argument("--category", default="Inventory Management", help="scan preset to run")
+    parser.add_argument("--rate", type=float, default=0, help="fake nmap hosts per second (0 = no delays)")
+    parser.add_argument("--shards", type=int, default=1, help="nmap processes per scan (SCAN_SHARDS)")
+    parser.add_argument("--concurrent", type=int, default=2, help="scans running at once (SCAN_MAX_CONCURRENT)")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for all jobs to finish")
+    parser.add_argument("--output", help="results file (default: benchmarks/pipeline_<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+    args.shards = max(args.shards, 1)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    #  Everything runs against a scratch database and scan directory; must be set before the app is imported
+    scratch = tempfile.mkdtemp(prefix="nmap_bench_pipeline_")
+    os.environ["NMAP_DB_PATH"] = os.path.join(scratch, "bench.db")
+    os.environ["NMAP_BINARY"] = f"{sys.executable} {FAKE_NMAP}"
+    os.environ["SCAN_TARGET"] = _target(args.hosts)
+    os.environ["SCAN_SHARDS"] = str(args.shards)
+    os.environ["SCAN_SHARD_MIN_ADDRESSES"] = "1"
+    os.environ["SCAN_MAX_CONCURRENT"] = str(args.concurrent)
+    os.environ["SCAN_DISPATCH_INTERVAL"] = "0.1"
+    os.environ["SCAN_DISPATCHER_ENABLED"] = "1"
+    os.environ["SCAN_SCHEDULER_ENABLED"] = "0"
+    os.environ["FAKE_NMAP_HOSTS"] = str(max(args.hosts // args.shards, 1))
+    os.environ["FAKE_NMAP_RATE"] = str(args.rate)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.makedirs(os.path.join(scratch, "logs"))
+    os.chdir(scratch)  # Scan logs and XML go to ./scans, app logs to ./logs
+
+    from app import create_app
+    args.app = create_app()
+
+    print(f"📊 {args.jobs} x {args.category} scan(s) of {args.hosts} hosts ({os.environ['SCAN_TARGET']}, "
+          f"{args.shards} shard(s), {args.concurrent} at once)")
+    try:
+        results = run(args)
+    finally:
+        if args.keep:
+            print(f"📁 Scratch files kept in {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    for job in results["jobs"]:
+        first_event = "-" if job["first_event"] is None else f"{job['first_event']:.3f}s"
+        print(f"   #{job['job_id']} {job['status']:<9} {job['hosts']:>6} hosts   queue_wait {job['queue_wait']:.3f}s   "
+              f"first_event {first_event}   to_session {job['to_session']:.3f}s")
+    print(f"   {results['hosts_stored']} hosts in {results['wall_seconds']:.3f}s = {results['hosts_per_second']} hosts/s")
+
+    output_data = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: getattr(args, key) for key in ("jobs", "hosts", "category", "rate", "shards", "concurrent")},
+        "results": results,
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    output = args.output or os.path.join(BENCH_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+    if results["failed"]:
+        print(f"❌ {results['failed']} job(s) did not finish")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_tag_suggestions.py
+
+"""
+Micro-benchmark for suggest_tags(): per-call cost of the compiled tag rules
+(config/tag_rules.json or TAG_RULES_FILE) over a realistic mix of hosts.
+
+Cases:
+    repeated   vendor/OS strings from a small set, as in real scans (memo hits)
+    unique     every vendor/OS string is new (regex path on every call)
+    reload     no suggester passed, so each call also checks the rule file
+
+Usage:
+    python scripts/bench_tag_suggestions.py
+    python scripts/bench_tag_suggestions.py --calls 500000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+os.environ.setdefault("SECRET_KEY", "benchmark")  # Importing the app package needs one
+
+from fake_nmap import SERVICES, OS_MATCHES, MAC_VENDORS  # noqa: E402
+from app.utils.tag_suggestions import suggest_tags, get_tag_suggester, tag_rule_status  # noqa: E402
+
+EXTRA_VENDORS = ["Hewlett Packard", "HP Printer Division", "Cisco Systems", "Ubiquiti Networks", "Apple", "Dell", None]
+EXTRA_OS = ["Ubuntu Linux", "MikroTik RouterOS 6.x", "pfSense 2.5", "Android 11", "Synology NAS", None]
+
+
+def _inputs(count, unique, seed=1):
+    rng = random.Random(seed)
+    vendors = [name for _prefix, name in MAC_VENDORS] + EXTRA_VENDORS
+    systems = [name for name, _cpe in OS_MATCHES] + EXTRA_OS
+    rows = []
+    for i in range(count):
+        _protocol, port, service, *_rest = rng.choice(SERVICES)
+        vendor, os_match = rng.choice(vendors), rng.choice(systems)
+        if unique:
+            vendor = f"{vendor or 'Unknown'} {i}"
+            os_match = f"{os_match or 'Unknown'} {i}"
+        rows.append((f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", port, service, vendor, os_match))
+    return rows
+
+
+def _time(rows, suggester):
+    started = time.perf_counter_ns()
+    for ip, port, service, vendor, os_match in rows:
+        suggest_tags(ip, port, service, vendor, os_match, suggester=suggester)
+    return (time.perf_counter_ns() - started) / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call cost of suggest_tags().")
+    parser.add_argument("--calls", type=int, default=200_000, help="calls per case")
+    args = parser.parse_args()
+
+    suggester = get_tag_suggester()
+    status = tag_rule_status()
+    if status["error"]:
+        print(f"❌ {status['error']}")
+        sys.exit(1)
+    print(f"📐 {status['rules']} tag rules from {status['path']}")
+
+    repeated = _inputs(args.calls, unique=False)
+    unique = _inputs(args.calls, unique=True)
+    _time(repeated[:1000], suggester)  # Warm up
+
+    for name, rows, with_suggester in (("repeated", repeated, True), ("unique", unique, True), ("reload", repeated, False)):
+        ns = _time(rows, suggester if with_suggester else None)
+        print(f"   {name:<9} {ns / 1000:7.2f} µs/call  ({1e9 / ns:,.0f} calls/s)")
+
+
+if __name__ == "__main__":
+    main()
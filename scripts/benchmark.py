@@ -0,0 +1,223 @@
+# benchmark.py
+
+"""
+Benchmark suite for the ingest, summary, diff and report paths.
+
+For each scale (number of hosts) two synthetic scans are generated, the
+second with some churn, and loaded into a scratch database (NMAP_DB_PATH).
+Then these are timed:
+    parse_and_insert   ingest of the first scan XML
+    get_scan_summary   summary aggregates for one session
+    compute_diff       diff of the two sessions
+    scan_detail        the /scan/<id> page, end to end through Flask
+    export_pdf         export rows + template + WeasyPrint render (what the PDF job does)
+
+Read benchmarks run --repeat times and report the median. Results are saved
+as JSON; with a baseline file, any benchmark slower than the baseline by
+more than --threshold (and by more than --min-delta seconds) is flagged and
+the exit status is 1.
+
+Usage:
+    python scripts/benchmark.py --hosts 1000,10000
+    python scripts/benchmark.py --hosts 1000 --save-baseline
+    python scripts/benchmark.py --hosts 100000 --skip export_pdf,scan_detail
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCH_DIR = os.path.join(BASE_DIR, "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+BENCHMARKS = ("parse_and_insert", "get_scan_summary", "compute_diff", "scan_detail", "export_pdf")
+
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+
+def _timed(fn, repeat):
+    """Run fn repeat times. Returns: (median seconds, all timings, last result)"""
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), timings, result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------
+#  Benchmarks for one scale
+# ---------------------
+def run_scale(hosts, args, scratch):
+    """Generate, ingest and time everything for one scan size. Returns: {benchmark: result dict}"""
+    from synthetic_xml import write_scan
+    from app.utils.parse2_nmap import parse_and_insert
+    from app.utils.db_utils import get_scan_summary, compute_diff, get_export_rows
+
+    results = {}
+    first = os.path.join(scratch, f"scan_Bench{hosts}_2024-01-01T00-00-00.xml")
+    second = os.path.join(scratch, f"scan_Bench{hosts}_2024-01-02T00-00-00.xml")
+    started = time.perf_counter()
+    write_scan(first, hosts, ports_per_host=args.ports, script_ratio=args.scripts)
+    write_scan(second, hosts, ports_per_host=args.ports, script_ratio=args.scripts, churn=args.churn)
+    print(f"   generated 2 x {hosts} hosts in {time.perf_counter() - started:.1f}s")
+
+    def record(name, seconds, timings, **extra):
+        results[name] = {"seconds": round(seconds, 4), "runs": [round(t, 4) for t in timings], **extra}
+        print(f"   {name:<18} {seconds:9.3f}s")
+
+    #  Ingest runs once per file: every run adds a session
+    seconds, timings, old_id = _timed(lambda: parse_and_insert(first), 1)
+    size_mb = os.path.getsize(first) / 1024 / 1024
+    record("parse_and_insert", seconds, timings, xml_mb=round(size_mb, 2))
+    new_id = parse_and_insert(second)
+
+    if "get_scan_summary" not in args.skip:
+        record("get_scan_summary", *_timed(lambda: get_scan_summary(old_id), args.repeat)[:2])
+
+    if "compute_diff" not in args.skip:
+        record("compute_diff", *_timed(lambda: compute_diff(old_id, new_id), args.repeat)[:2])
+
+    if "scan_detail" not in args.skip:
+        client = args.app.test_client()
+
+        def detail():
+            response = client.get(f"/scan/{old_id}")
+            assert response.status_code == 200, response.status_code
+            return len(response.data)
+        seconds, timings, size = _timed(detail, args.repeat)
+        record("scan_detail", seconds, timings, html_kb=round(size / 1024, 1))
+
+    if "export_pdf" not in args.skip:
+        from flask import render_template
+        from weasyprint import HTML
+
+        def export():
+            rows = get_export_rows(old_id)
+            with args.app.app_context():
+                rendered = render_template(
+                    "export_pdf.html", session_id=old_id, rows=rows, datetime_now=datetime.now().strftime("%Y-%m-%d %H:%M")
+                )
+            HTML(string=rendered).write_pdf(os.path.join(scratch, "export.pdf"))
+        record("export_pdf", *_timed(export, max(1, args.repeat // 3))[:2])
+
+    return results
+
+
+# ---------------------
+#  Baseline comparison
+# ---------------------
+def compare(results, baseline, threshold, min_delta):
+    """
+    Benchmarks slower than the baseline by more than threshold (fraction)
+    and min_delta seconds, at scales both runs have.
+    Returns: list of regression dicts
+    """
+    regressions = []
+    for scale, benchmarks in results["scales"].items():
+        for name, result in benchmarks.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(name)
+            if not before:
+                continue
+            ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            if ratio > 1 + threshold and result["seconds"] - before["seconds"] > min_delta:
+                regressions.append({
+                    "scale": scale, "benchmark": name, "baseline": before["seconds"],
+                    "seconds": result["seconds"], "ratio": round(ratio, 2)
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, summary, diff and report rendering.")
+    parser.add_argument("--hosts", default="1000,10000", help="comma-separated scan sizes (hosts)")
+    parser.add_argument("--ports", type=float, default=5, help="average open ports per host")
+    parser.add_argument("--scripts", type=float, default=0.3, help="share of ports with script output")
+    parser.add_argument("--churn", type=float, default=0.1, help="share of hosts changed in the second scan")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per read benchmark (median is reported)")
+    parser.add_argument("--skip", default="", help=f"comma-separated benchmarks to skip: {', '.join(BENCHMARKS[1:])}")
+    parser.add_argument("--output", help="results file (default: benchmarks/bench_<timestamp>.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns smaller than this (seconds)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+    args.skip = {name.strip() for name in args.skip.split(",") if name.strip()}
+    args.repeat = max(args.repeat, 1)
+    scales = [int(value) for value in args.hosts.split(",") if value.strip()]
+
+    #  Everything runs against a scratch database; must be set before the app is imported
+    scratch = tempfile.mkdtemp(prefix="nmap_bench_")
+    os.environ["NMAP_DB_PATH"] = os.path.join(scratch, "bench.db")
+    os.environ["SCAN_DISPATCHER_ENABLED"] = "0"
+    os.environ["SCAN_SCHEDULER_ENABLED"] = "0"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from app import create_app
+    args.app = create_app()
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"ports": args.ports, "scripts": args.scripts, "churn": args.churn, "repeat": args.repeat},
+        "scales": {},
+    }
+    try:
+        for hosts in scales:
+            print(f"📊 {hosts} hosts")
+            results["scales"][str(hosts)] = run_scale(hosts, args, scratch)
+    finally:
+        if args.keep:
+            print(f"📁 Scratch files kept in {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    output = args.output or os.path.join(BENCH_DIR, f"bench_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        results["baseline"] = {"path": args.baseline, "commit": baseline.get("commit"), "regressions": regressions}
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+    if args.save_baseline:
+        shutil.copy(output, args.baseline)
+        print(f"📌 Baseline updated: {args.baseline}")
+    elif regressions:
+        for r in regressions:
+            print(f"❌ Regression: {r['benchmark']} @ {r['scale']} hosts: "
+                  f"{r['baseline']:.3f}s -> {r['seconds']:.3f}s (x{r['ratio']})")
+        sys.exit(1)
+    elif "baseline" in results:
+        print("✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
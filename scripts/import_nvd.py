@@ -0,0 +1,67 @@
+# import_nvd.py
+
+"""
+Import NVD JSON vulnerability feeds into the offline CVE index, then
+re-match stored scan results against it (CVE ids and the CVE part of
+risk_score).
+
+Feeds are the NVD 1.1 yearly/modified files (nvdcve-1.1-2023.json.gz) or
+saved NVD API 2.0 responses; download them on a connected machine and copy
+them over. New scans are matched at ingest.
+
+Usage:
+    python scripts/import_nvd.py nvdcve-1.1-*.json.gz
+    python scripts/import_nvd.py nvdcve-1.1-modified.json.gz --no-annotate
+    python scripts/import_nvd.py --annotate-only
+"""
+
+import os
+import sys
+import argparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.config import DB_PATH  # noqa: E402
+from app.utils.db_utils import init_db  # noqa: E402
+from app.utils.vuln_index import import_feed, annotate_results, vuln_status  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import NVD JSON feeds into the offline CVE index.")
+    parser.add_argument("feeds", nargs="*", help="NVD feed files (.json or .json.gz)")
+    parser.add_argument("--no-annotate", action="store_true", help="do not re-match stored scan results")
+    parser.add_argument("--annotate-only", action="store_true", help="only re-match stored scan results")
+    args = parser.parse_args()
+    if not args.feeds and not args.annotate_only:
+        parser.error("give at least one feed file, or --annotate-only")
+
+    print(f"📂 Using database at: {DB_PATH}")
+    if not os.path.exists(DB_PATH):
+        print("❌ ERROR: Database file not found.")
+        sys.exit(1)
+    init_db()  # Adds the CVE tables and columns to older databases
+
+    for path in [] if args.annotate_only else args.feeds:
+        try:
+            stats = import_feed(path)
+        except (OSError, ValueError) as e:
+            print(f"❌ Cannot import {path}: {e}")
+            sys.exit(1)
+        print(f"✅ {os.path.basename(path)}: {stats['cves']:,} CVEs, {stats['ranges']:,} CPE ranges in {stats['seconds']}s")
+
+    status = vuln_status()
+    print(f"🔎 Index: {status['cves']:,} CVEs, {status['ranges']:,} CPE ranges from {status['feeds']} feed(s)")
+    if args.no_annotate:
+        return
+
+    def progress(done, total):
+        print(f"   {done:,}/{total:,} rows", end="\r", flush=True)
+
+    stats = annotate_results(progress=progress)
+    print(f"✅ Matched {stats['rows']:,} open ports: {stats['changed']:,} changed in "
+          f"{stats['sessions']} session(s) in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# rescore_risk.py
+
+"""
+Re-score stored scan results after PORT_RISK_WEIGHTS / SERVICE_RISK_WEIGHTS /
+VULN_RISK_WEIGHTS or the risk rules (config/risk_rules.json) change. Only rows scored with
+older weights/rules are updated, unless --force.
+
+Usage:
+    python scripts/rescore_risk.py            # stale rows only
+    python scripts/rescore_risk.py --check    # report how many rows are stale
+    python scripts/rescore_risk.py --force    # every row
+"""
+
+import os
+import sys
+import argparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.config import DB_PATH  # noqa: E402
+from app.utils.db_utils import init_db  # noqa: E402
+from app.utils.risk_rescore import rescore_results, stale_row_count, weights_fingerprint, RESCORE_BATCH_ROWS  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute risk scores with the current risk weights.")
+    parser.add_argument("--force", action="store_true", help="re-score every row, not only stale ones")
+    parser.add_argument("--check", action="store_true", help="only report the number of stale rows")
+    parser.add_argument("--batch-rows", type=int, default=RESCORE_BATCH_ROWS, help="rows per transaction")
+    args = parser.parse_args()
+
+    print(f"📂 Using database at: {DB_PATH}")
+    if not os.path.exists(DB_PATH):
+        print("❌ ERROR: Database file not found.")
+        sys.exit(1)
+    init_db()  # Adds risk_version and the weight tables to older databases
+
+    stale = stale_row_count()
+    print(f"🔎 Risk weights {weights_fingerprint()}: {stale:,} row(s) scored with other weights")
+    if args.check:
+        sys.exit(1 if stale else 0)
+
+    def progress(done, total):
+        print(f"   {done:,}/{total:,} rows", end="\r", flush=True)
+
+    stats = rescore_results(force=args.force, batch_rows=max(args.batch_rows, 1), progress=progress)
+    print(f"✅ Re-scored {stats['rows']:,} rows in {stats['sessions']} session(s) "
+          f"in {stats['seconds']}s ({stats['rows_per_minute']:,} rows/min), weights version {stats['version']}")
+    if stats["rule_rows"]:
+        print(f"📐 Risk rules evaluated on {stats['rule_rows']:,} candidate rows ({stats['rule_us_per_row']} µs/row)")
+
+
+if __name__ == "__main__":
+    main()
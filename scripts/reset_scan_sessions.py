@@ -16,6 +16,7 @@ DB_PATH = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "nmap_results.db"))
 TABLES_TO_RESET = [
     "scan_sessions",
     "scan_results",
+    "host_risk",
     "uploads",
     "tags",
     "global_tags",
@@ -0,0 +1,116 @@
+# synthetic_xml.py
+
+"""
+Generate synthetic Nmap XML scans for benchmarks and load tests.
+
+Hosts look like fake_nmap.py's (same MAC vendors, OS matches and common
+services), plus random high ports and NSE script output so larger scans
+have realistic variety. Output is deterministic for a given seed; a
+second scan with --churn changes a share of the hosts, for diff tests.
+
+Usage:
+    python scripts/synthetic_xml.py --hosts 10000 --out scans/scan_Bench_2024-01-01T00-00-00.xml
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import ipaddress
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from fake_nmap import SERVICES, OS_MATCHES, MAC_VENDORS, host_xml  # noqa: E402
+
+XML_OPTIONS = {"-sV": True, "-O": True, "--script": True}
+
+HIGH_PORT_SERVICES = [
+    ("http-alt", "Jetty", "9.4.43"),
+    ("unknown", "", ""),
+    ("rtsp", "", ""),
+    ("upnp", "MiniUPnP", "2.2.1"),
+    ("ssl/http", "Node.js Express framework", ""),
+]
+
+SCRIPT_OUTPUTS = [
+    "http-title: Login page",
+    "ssl-cert: Subject: commonName=device.local; Not valid after: 2031-01-01",
+    "ssh-hostkey: 2048 aa:bb:cc:dd (RSA)",
+    "VULNERABLE: State: LIKELY VULNERABLE; weak cipher suites enabled",
+    "smb-os-discovery: OS: Windows 10 Pro; Workgroup: WORKGROUP",
+    "banner: 220 FTP server ready",
+]
+
+
+def build_hosts(count, ports_per_host=5, script_ratio=0.3, seed=1, churn=0.0, network="10.0.0.0/8"):
+    """
+    Synthetic host dicts (the structure fake_nmap.host_xml writes).
+    churn: share of hosts whose services differ from the same seed without churn
+    """
+    base = ipaddress.ip_network(network, strict=False)
+    hosts = []
+    for index in range(count):
+        ip = str(base.network_address + index + 1)
+        rng = random.Random(f"{seed}:{ip}")
+        services_rng = random.Random(f"{seed}:{ip}:churn") if rng.random() < churn else rng
+
+        prefix, vendor = rng.choice(MAC_VENDORS)
+        ports = {}
+        count_ports = max(1, int(services_rng.gauss(ports_per_host, ports_per_host / 3) + 0.5))
+        for _ in range(count_ports):
+            if services_rng.random() < 0.7:
+                protocol, port, service, product, version, script = services_rng.choice(SERVICES)
+            else:
+                protocol, port = "tcp", services_rng.randrange(1024, 65536)
+                service, product, version = services_rng.choice(HIGH_PORT_SERVICES)
+                script = ""
+            if not script and services_rng.random() < script_ratio:
+                script = services_rng.choice(SCRIPT_OUTPUTS)
+            ports[(protocol, port)] = (protocol, port, service, product, version, script)
+
+        hosts.append({
+            "ip": ip,
+            "mac": f"{prefix}:" + ":".join(f"{rng.randrange(256):02X}" for _ in range(3)),
+            "vendor": vendor,
+            "hostname": f"host-{ip.replace('.', '-')}.lan",
+            "os": rng.choice(OS_MATCHES),
+            "uptime": rng.randrange(600, 90 * 86400),
+            "ports": sorted(ports.values(), key=lambda p: (p[0], p[1])),
+        })
+    return hosts
+
+
+def write_scan(path, count, **kwargs):
+    """Write a complete scan XML. Returns: path"""
+    hosts = build_hosts(count, **kwargs)
+    started = int(time.time())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<nmaprun scanner="nmap" args="nmap -sV -O --script=default" start="{started}" '
+                f'version="7.94" xmloutputversion="1.05">\n')
+        for host in hosts:
+            f.write(host_xml(host, XML_OPTIONS) + "\n")
+        f.write(f'<runstats><finished time="{int(time.time())}" exit="success"/>'
+                f'<hosts up="{count}" down="0" total="{count}"/></runstats>\n</nmaprun>\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Nmap XML scan.")
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--ports", type=float, default=5, help="average open ports per host")
+    parser.add_argument("--scripts", type=float, default=0.3, help="share of ports with script output")
+    parser.add_argument("--seed", default="1")
+    parser.add_argument("--churn", type=float, default=0.0, help="share of hosts with re-rolled services")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    started = time.time()
+    write_scan(args.out, args.hosts, ports_per_host=args.ports, script_ratio=args.scripts,
+               seed=args.seed, churn=args.churn)
+    size = os.path.getsize(args.out) / 1024 / 1024
+    print(f"✅ Wrote {args.hosts} hosts to {args.out} ({size:.1f} MB) in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
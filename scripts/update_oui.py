@@ -0,0 +1,98 @@
+# update_oui.py
+
+"""
+Rebuild the MAC vendor file (config/oui.tsv.gz or OUI_FILE) from the IEEE
+OUI registries, then fill the vendor of stored scan results that have a MAC
+but no vendor. The app picks up the new file without a restart; new scans
+are filled at ingest.
+
+Sources are the IEEE MA-L, MA-M and MA-S CSVs (downloaded by default) or
+local copies of them / nmap's nmap-mac-prefixes for offline machines.
+
+Usage:
+    python scripts/update_oui.py
+    python scripts/update_oui.py --from oui.csv mam.csv oui36.csv
+    python scripts/update_oui.py --from /usr/share/nmap/nmap-mac-prefixes --no-backfill
+    python scripts/update_oui.py --backfill-only
+"""
+
+import os
+import sys
+import argparse
+import urllib.request
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BASE_DIR)
+
+from app.config import DB_PATH, OUI_FILE  # noqa: E402
+from app.utils.db_utils import init_db  # noqa: E402
+from app.utils.oui_vendors import OuiIndex, parse_registry, write_oui_file, backfill_vendors, oui_status  # noqa: E402
+
+IEEE_URLS = (
+    "https://standards-oui.ieee.org/oui/oui.csv",      # MA-L, 24-bit
+    "https://standards-oui.ieee.org/oui28/mam.csv",    # MA-M, 28-bit
+    "https://standards-oui.ieee.org/oui36/oui36.csv",  # MA-S, 36-bit
+)
+
+
+def _read_source(source):
+    if source.startswith(("http://", "https://")):
+        # The IEEE site rejects urllib's default user agent
+        req = urllib.request.Request(source, headers={"User-Agent": "nmap-dashboard-oui-update"})
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            return resp.read().decode("utf-8", errors="replace")
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the MAC vendor (OUI) file and backfill vendors.")
+    parser.add_argument("--from", dest="sources", nargs="+", metavar="FILE",
+                        help="local IEEE CSVs or nmap-mac-prefixes instead of downloading")
+    parser.add_argument("--output", default=OUI_FILE, help=f"file to write (default {OUI_FILE})")
+    parser.add_argument("--no-backfill", action="store_true", help="do not fill vendors of stored scan results")
+    parser.add_argument("--backfill-only", action="store_true", help="only fill vendors of stored scan results")
+    args = parser.parse_args()
+
+    if not args.backfill_only:
+        index = OuiIndex()
+        sources = args.sources or IEEE_URLS
+        for source in sources:
+            try:
+                before = len(index)
+                for prefix, vendor in parse_registry(_read_source(source)):
+                    index.add(prefix, vendor)
+            except OSError as e:
+                print(f"❌ Cannot read {source}: {e}")
+                sys.exit(1)
+            print(f"✅ {source}: {len(index) - before:,} blocks")
+        if not len(index):
+            print("❌ No OUI blocks found; the output file was not changed.")
+            sys.exit(1)
+        write_oui_file(args.output, index, sources)
+        counts = ", ".join(f"{bits}: {count:,}" for bits, count in index.counts().items())
+        print(f"📝 Wrote {len(index):,} blocks ({counts}) to {args.output}")
+
+    if args.no_backfill:
+        return
+    print(f"📂 Using database at: {DB_PATH}")
+    if not os.path.exists(DB_PATH):
+        print("❌ ERROR: Database file not found.")
+        sys.exit(1)
+    init_db()
+
+    status = oui_status()
+    if status["error"]:
+        print(f"❌ {status['error']}")
+        sys.exit(1)
+
+    def progress(done, total):
+        print(f"   {done:,}/{total:,} rows", end="\r", flush=True)
+
+    stats = backfill_vendors(progress=progress)
+    print(f"✅ Checked {stats['rows']:,} rows without a vendor: {stats['filled']:,} filled in "
+          f"{stats['sessions']} session(s) in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()